@@ -0,0 +1,157 @@
+import os
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+from typing import Dict, List, Tuple, Union
+
+from path import ADJUST_PRICE_PATH
+
+
+class AdjustPriceMatrix:
+    """
+    - 全部股票后复权价格矩阵.预测者网站的原始数据包含adjust_price(后复权价)和close列,move_raw_data_to_target_path整理数据时
+    没有保留.get_all_stocks_rising_value_ranks为此要对每只股票下载一次日线,自称"消耗较大,一般不要使用".
+    - 本类把原始数据中的adjust_price和close整理为日期×股票的float32矩阵,以.npy格式保存在data-package/adjust-price目录,
+    读取时使用内存映射,计算两个日期之间的涨跌幅只需要读取两行数据,一次向量化运算完成全部股票的排名,不需要联网.
+    - 停牌日沿用前一交易日的价格;上市之前为NaN,期间起点早于上市日时以上市首日价格为起点,
+    与calculate_period_rising_value取最接近日期的做法一致.
+    - 矩阵截止于原始数据的下载日期,之后的期间仍需使用PriceStore.(2026-10-19)
+    """
+
+
+    def __init__(self, store_path: str = ADJUST_PRICE_PATH):
+        self.__store_path = store_path
+        self.__codes: np.ndarray = np.array([], dtype='U6')
+        self.__dates: np.ndarray = np.array([], dtype='datetime64[D]')
+        self.__adjust_price: Union[np.ndarray, None] = None  # 日期×股票,停牌日已向前填充
+        self.__close: Union[np.ndarray, None] = None
+        self.__first_row: np.ndarray = np.array([], dtype='int32')  # 每只股票第一个有价格的行,没有数据为-1
+
+        if os.path.exists(os.path.join(self.__store_path, 'codes.npy')):
+            self.load()
+
+
+    def exists(self) -> bool:
+        """ 判断矩阵是否已经建立 """
+
+        return self.__adjust_price is not None
+
+
+    def load(self) -> None:
+        """ 以内存映射方式载入矩阵 """
+
+        self.__codes = np.load(os.path.join(self.__store_path, 'codes.npy'))
+        self.__dates = np.load(os.path.join(self.__store_path, 'dates.npy'))
+        self.__first_row = np.load(os.path.join(self.__store_path, 'first_row.npy'))
+        self.__adjust_price = np.load(os.path.join(self.__store_path, 'adjust_price.npy'), mmap_mode='r')
+        self.__close = np.load(os.path.join(self.__store_path, 'close.npy'), mmap_mode='r')
+
+
+    def build_from_raw_data(self, raw_data: str) -> None:
+        """
+        从预测者网站下载的原始数据建立矩阵,move_raw_data_to_target_path整理原始数据时调用.
+
+        :param raw_data: 原始数据文件夹路径,为绝对路径,文件名形如sh600000.csv.
+        :return: None
+        """
+
+        adjust_price_dict, close_dict = {}, {}
+        for file in sorted(os.listdir(raw_data)):
+            if not file.endswith('.csv'):
+                continue
+            df = pd.read_csv(os.path.join(raw_data, file), usecols=['date', 'close', 'adjust_price'])
+            df['date'] = pd.to_datetime(df['date'].astype(str))
+            df = df.drop_duplicates(subset=['date']).set_index('date').sort_index()
+            code = file[2:8]
+            adjust_price_dict[code] = df['adjust_price'].astype('float64')
+            close_dict[code] = df['close'].astype('float64')
+
+        adjust_price_df = DataFrame(adjust_price_dict).sort_index()
+        close_df = DataFrame(close_dict).reindex(index=adjust_price_df.index, columns=adjust_price_df.columns)
+
+        # 记录上市首日所在行,然后向前填充停牌日
+        valid = adjust_price_df.notna().to_numpy()
+        first_row = np.where(valid.any(axis=0), valid.argmax(axis=0), -1).astype('int32')
+
+        if not os.path.exists(self.__store_path):
+            os.mkdir(self.__store_path)
+        np.save(os.path.join(self.__store_path, 'codes.npy'), adjust_price_df.columns.to_numpy(dtype='U6'))
+        np.save(os.path.join(self.__store_path, 'dates.npy'), adjust_price_df.index.to_numpy().astype('datetime64[D]'))
+        np.save(os.path.join(self.__store_path, 'first_row.npy'), first_row)
+        np.save(os.path.join(self.__store_path, 'adjust_price.npy'), adjust_price_df.ffill().to_numpy(dtype='float32'))
+        np.save(os.path.join(self.__store_path, 'close.npy'), close_df.ffill().to_numpy(dtype='float32'))
+
+        self.load()
+
+
+    def get_date_range(self) -> Tuple[str, str]:
+        """ 返回矩阵覆盖的第一个和最后一个交易日 """
+
+        return str(self.__dates[0]), str(self.__dates[-1])
+
+
+    def __get_asof_row(self, date: str) -> int:
+        """ 返回date当日或之前最近一个交易日所在的行,早于全部数据时返回0 """
+
+        row = int(np.searchsorted(self.__dates, np.datetime64(date[0:10], 'D'), side='right')) - 1
+
+        return max(row, 0)
+
+
+    def calculate_period_rising_values(self, start_date: str, end_date: str) -> np.ndarray:
+        """
+        一次计算全部股票start_date至end_date的涨跌幅,返回与股票代码对齐的数组.
+        终点时尚未上市的股票为NaN.日期为yyyy-mm-dd型字符串.
+        """
+
+        start_row, end_row = self.__get_asof_row(start_date), self.__get_asof_row(end_date)
+        start_price = np.array(self.__adjust_price[start_row], dtype='float64')
+        end_price = np.array(self.__adjust_price[end_row], dtype='float64')
+
+        # 起点时尚未上市而终点前已经上市的股票,以上市首日价格为起点
+        late = np.isnan(start_price) & (self.__first_row >= 0) & (self.__first_row <= end_row)
+        if late.any():
+            late_columns = np.nonzero(late)[0]
+            start_price[late_columns] = [self.__adjust_price[self.__first_row[col], col] for col in late_columns]
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            rising = np.round(end_price / start_price - 1, 4)
+
+        return np.where(np.isfinite(rising), rising, np.nan)
+
+
+    def get_rising_value_ranks(self, start_date: str, end_date: str, top_k: Union[int, None] = None,
+                               code_class: Union[Dict[str, str], None] = None,
+                               universe: Union[List[str], None] = None) -> Union[List[Tuple], Dict[str, List[Tuple]]]:
+        """
+        返回全部股票指定期间涨跌幅的降序排名.
+
+        :param start_date: 开始日期,yyyy-mm-dd型字符串.
+        :param end_date: 结束日期,yyyy-mm-dd型字符串.
+        :param top_k: 只返回前top_k名(分行业时为每个行业的前top_k名),为None时返回全部.
+        :param code_class: 不含后缀的股票代码到申万一级行业的映射,提供时按行业分别排名.
+        :param universe: 参与排名的股票代码(不含后缀),一般为申万清单;原始数据中还有清单以外的代码,
+        退市股票的价格也被向前填充到矩阵末尾,需要排除.为None时使用矩阵中的全部股票.
+        :return: 不分行业时为[(code, rising_value), ...];分行业时为{行业: [(code, rising_value), ...]}.
+        """
+
+        rising = self.calculate_period_rising_values(start_date=start_date, end_date=end_date)
+        valid = ~np.isnan(rising)
+        if universe is not None:
+            valid &= np.isin(self.__codes, np.array(list(universe), dtype='U6'))
+        codes, rising = self.__codes[valid], rising[valid]
+        order = np.argsort(-rising, kind='stable')
+        codes, rising = codes[order], rising[order]
+
+        if code_class is None:
+            ranks = list(zip(codes.tolist(), rising.tolist()))
+            return ranks[:top_k] if top_k is not None else ranks
+
+        classes = np.array([code_class.get(code, '') for code in codes.tolist()], dtype=object)
+        result = {}
+        for stock_class in sorted(set(code_class.values())):
+            selected = classes == stock_class
+            ranks = list(zip(codes[selected].tolist(), rising[selected].tolist()))
+            result[stock_class] = ranks[:top_k] if top_k is not None else ranks
+
+        return result
@@ -0,0 +1,210 @@
+import os
+import sqlite3
+import datetime
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+from typing import Callable, Dict, List, Tuple, Union
+
+from path import MANIFEST_SQLITE3, trade_record_path
+from tradecalendar import TradeCalendar, get_trade_calendar
+from manifest import DatasetManifest, get_manifest
+from recordschema import TRADE_RECORD_COLUMNS, METRIC_COLUMNS, read_trade_record, write_trade_record
+
+
+MERGE_WITHIN = 20  # 两段缺失之间相隔不超过该交易日数时合并为一次请求,多下载的已有日期直接忽略
+VALUATION_INDICATOR = 'kline,pe,pb,ps,pcf,market_capital'  # 雪球日线附带的估值指标
+KLINE_COLUMNS = {'market_capital': '总市值', 'pb': 'PB', 'pe': 'PE', 'ps': 'PS', 'pcf': 'PC'}
+
+
+def group_ranges(missing: List[str], trading_days: List[str], merge_within: int = MERGE_WITHIN) -> List[Tuple[str, str]]:
+    """
+    把缺失的交易日合并为尽量少的区间[(begin, end)],两段缺失之间相隔不超过merge_within个交易日时合并.
+
+    :param missing: 缺失的交易日,yyyy-mm-dd型字符串.
+    :param trading_days: 升序排列的交易日,须包含全部缺失日期.
+    """
+
+    if not missing:
+        return []
+    positions = np.searchsorted(np.array(trading_days), np.array(sorted(missing)))
+    ranges, start, previous = [], positions[0], positions[0]
+    for position in positions[1:]:
+        if position - previous > merge_within + 1:
+            ranges.append((trading_days[start], trading_days[previous]))
+            start = position
+        previous = position
+    ranges.append((trading_days[start], trading_days[previous]))
+
+    return ranges
+
+
+def parse_valuation_kline(result: Dict) -> DataFrame:
+    """
+    把带估值指标的雪球kline.json解析为日期、总市值、PB、PE、PS、PC六列,缺少总市值的日期不保留.
+    cookie过期等错误的响应没有data或error_code不为0,抛出ValueError,不能当作没有数据.
+    """
+
+    if result.get('error_code') not in (None, 0) or result.get('data') is None:
+        raise ValueError(f"雪球日线请求失败: {result.get('error_description') or result.get('error_code')}")
+    data = result['data']
+    columns = data.get('column') or []
+    df = DataFrame(data.get('item') or [], columns=columns)
+    if df.empty or 'timestamp' not in df.columns:
+        return DataFrame(columns=['日期'] + list(KLINE_COLUMNS.values()))
+
+    result_df = DataFrame({'日期': [datetime.datetime.fromtimestamp(stamp / 1000).strftime('%Y-%m-%d') for stamp in df['timestamp']]})
+    for source, target in KLINE_COLUMNS.items():
+        result_df[target] = pd.to_numeric(df[source], errors='coerce') if source in df.columns else np.nan
+
+    return result_df.dropna(subset=['总市值'])
+
+
+class BackfillPlanner:
+    """
+    - 交易记录的缺口检测和补全.update_trade_record_cvs只插入"昨日"一行,周末判断错误、某次运行失败或数据源出错时
+    漏掉的日期永远不会补上.
+    - find_missing以交易日历为准,检查每只股票从文件首日(上市日)或since起到最近一个交易日之间缺少的交易日;
+    数据清单中行数等于该区间交易日数(扣除已记录的停牌日)且已更新至最近交易日的股票不打开文件.
+    - plan把缺失日期按MERGE_WITHIN合并为尽量少的雪球日线请求区间,补全一周的漏更新每只股票只需要一次请求.
+    - fill下载带估值指标(总市值、PE、PB、PS、市现率)的日线插入缺失行,DIVIDEND按最近的已有行以总市值折算
+    (与add_dividend_rate_to_CSV的折算方法相同);请求成功且前后交易日都有数据、唯独该日没有数据的日期(停牌)
+    记入no-trade-days表,以后不再请求;请求出错时抛出异常,缺口留待下次补全.
+    - 补全的PE、PS、PC为雪球口径(TTM),与日常更新写入的数值口径可能略有差异.(2026-10-19)
+    """
+
+
+    def __init__(self, downloader: Callable[..., Dict], calendar: Union[TradeCalendar, None] = None,
+                 manifest: Union[DatasetManifest, None] = None, record_path: str = trade_record_path,
+                 db_path: str = MANIFEST_SQLITE3):
+        """
+        :param downloader: 日线下载函数,参数为code、begin、end和indicator,
+        一般为StockData.download_period_statistic_value_from_xueqiu.
+        """
+
+        self.__downloader = downloader
+        self.__calendar = calendar or get_trade_calendar()
+        self.__manifest = manifest or get_manifest()
+        self.__record_path = record_path
+        self.__db_path = db_path
+
+        con = sqlite3.connect(self.__db_path, timeout=30)
+        with con:
+            sql = """
+            CREATE TABLE IF NOT EXISTS 'no-trade-days' (
+            code TEXT NOT NULL,
+            date TEXT NOT NULL,
+            PRIMARY KEY (code, date)
+            ) WITHOUT ROWID
+            """
+            con.execute(sql)
+        con.close()
+
+
+    def __get_no_trade_days(self, code: str) -> set:
+        con = sqlite3.connect(self.__db_path, timeout=30)
+        with con:
+            result = {row[0] for row in con.execute(""" SELECT date FROM 'no-trade-days' WHERE code=? """, (code,)).fetchall()}
+        con.close()
+
+        return result
+
+
+    def get_window(self, first_date: str, since: Union[str, None] = None) -> Tuple[str, str]:
+        """ 检查区间:起点为文件首日、since和日历覆盖首日中最晚者,终点为今天之前最近的交易日 """
+
+        covered_begin = f'{min(self.__calendar.get_covered_years())}-01-01'
+        begin = max(item for item in [first_date, since, covered_begin] if item)
+        end = self.__calendar.get_previous_trading_day()
+
+        return begin, end
+
+
+    def find_missing(self, code: str, stock_class: str, since: Union[str, None] = None) -> List[str]:
+        """ 返回一只股票缺少的交易日,升序排列;没有交易记录文件时返回空列表 """
+
+        csv_file = os.path.join(self.__record_path, stock_class, f'{code}.csv')
+        if not os.path.exists(csv_file):
+            return []
+
+        no_trade_days = self.__get_no_trade_days(code)
+        item = self.__manifest.get(code)
+        if item and item['first_date'] and item['path'] == os.path.abspath(csv_file):
+            begin, end = self.get_window(first_date=item['first_date'], since=since)
+            # 文件中没有已记录的停牌日,应有行数为区间交易日数减去其中的停牌日数
+            expected = (self.__calendar.count_trading_days(item['first_date'], item['last_date'])
+                        - sum(1 for date in no_trade_days if item['first_date'] <= date <= item['last_date']))
+            if (item['last_date'] >= end and item['first_date'] >= f'{min(self.__calendar.get_covered_years())}-01-01'
+                    and expected == item['rows']):
+                return []  # 行数与应有的交易日数相同,没有缺口
+
+        dates = read_trade_record(csv_file, usecols=['日期'], parse_dates=False)['日期'].dropna()
+        if dates.empty:
+            return []
+        begin, end = self.get_window(first_date=dates.min(), since=since)
+        if begin > end:
+            return []
+        present = set(dates) | no_trade_days
+
+        return [date for date in self.__calendar.get_trading_days(begin, end) if date not in present]
+
+
+    def plan(self, code: str, stock_class: str, since: Union[str, None] = None) -> Dict:
+        """ 返回一只股票的补全计划{'code', 'stockclass', 'missing': 缺失日期, 'ranges': 请求区间} """
+
+        missing = self.find_missing(code=code, stock_class=stock_class, since=since)
+        ranges = []
+        if missing:
+            trading_days = self.__calendar.get_trading_days(missing[0], missing[-1])
+            ranges = group_ranges(missing=missing, trading_days=trading_days)
+
+        return {'code': code, 'stockclass': stock_class, 'missing': missing, 'ranges': ranges}
+
+
+    def fill(self, plan: Dict) -> int:
+        """ 按补全计划下载并插入缺失行,返回插入的行数 """
+
+        if not plan['missing']:
+            return 0
+        code, missing = plan['code'], set(plan['missing'])
+        latest = self.__calendar.get_previous_trading_day()
+        frames, no_trade_days = [], []
+        for begin, end in plan['ranges']:
+            # 区间两端各多请求一个交易日(已有的日期不会重复插入),前后都有数据时才能确认中间没有数据的日期为停牌日
+            request_begin = self.__calendar.get_previous_trading_day(begin)
+            request_end = min(self.__calendar.get_next_trading_day(end), latest)
+            df = parse_valuation_kline(self.__downloader(code=code, begin=request_begin, end=request_end, indicator=VALUATION_INDICATOR))
+            frames.append(df)
+            if not df.empty:
+                first, last, dates = df['日期'].min(), df['日期'].max(), set(df['日期'])
+                no_trade_days += [date for date in sorted(missing) if begin <= date <= end and first < date < last and date not in dates]
+        downloaded = pd.concat(frames, ignore_index=True) if frames else DataFrame()
+        new_rows = downloaded[downloaded['日期'].isin(missing)].drop_duplicates(subset=['日期']) if not downloaded.empty else downloaded
+
+        # 请求成功且前后都有数据、唯独该日没有数据的日期为停牌日,以后不再请求;其余没有数据的日期下次继续请求
+        if no_trade_days:
+            con = sqlite3.connect(self.__db_path, timeout=30)
+            with con:
+                con.executemany(""" INSERT OR IGNORE INTO 'no-trade-days' VALUES (?, ?) """, [(code, date) for date in no_trade_days])
+            con.close()
+        if new_rows.empty:
+            return 0
+
+        csv_file = os.path.join(self.__record_path, plan['stockclass'], f'{code}.csv')
+        df = read_trade_record(csv_file, parse_dates=False)
+        existing = df.sort_values(by='日期').reset_index(drop=True)
+        position = np.clip(np.searchsorted(existing['日期'].to_numpy(dtype=str), new_rows['日期'].to_numpy(dtype=str)), 0, len(existing) - 1)
+        reference = existing.iloc[position].reset_index(drop=True)  # 日期之后最近的已有行,没有时为最后一行
+        new_rows = new_rows.reset_index(drop=True)
+        new_rows['股票代码'] = reference['股票代码']
+        new_rows['名称'] = reference['名称'].astype(str)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            scale = np.where(new_rows['总市值'] > 0, reference['总市值'] / new_rows['总市值'], 1.00)
+        new_rows['DIVIDEND'] = (reference['DIVIDEND'] * scale).fillna(0.00)
+        new_rows[METRIC_COLUMNS] = new_rows[METRIC_COLUMNS].fillna(0.00).round(2)
+
+        df = pd.concat([df, new_rows[TRADE_RECORD_COLUMNS]], ignore_index=True)
+        df = df.sort_values(by='日期', ascending=False).reset_index(drop=True)
+        write_trade_record(df, csv_file)
+
+        return len(new_rows)
@@ -0,0 +1,230 @@
+import os
+import json
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+from typing import Dict, List, Tuple, Union
+
+from path import COMPACT_RECORD_PATH, trade_record_path
+from recordschema import TRADE_RECORD_COLUMNS, read_trade_record, write_trade_record
+
+
+DENOMINATORS = {'PB': '净资产', 'PE': '净利润', 'PS': '总营收', 'PC': '经营活动净流量'}  # 估值 = 总市值 / 分母
+DECIMALS = 2  # CSV文件中估值保留的小数位数
+EPOCH = np.datetime64('1970-01-01', 'D')
+
+
+def _run_length(values: np.ndarray) -> Tuple[np.ndarray, List]:
+    """ 游程编码,返回每段的起始行和取值 """
+
+    if len(values) == 0:
+        return np.array([], dtype='int32'), []
+    same = (values[1:] == values[:-1]) | (pd.isna(values[1:]) & pd.isna(values[:-1]))
+    changed = np.concatenate([[True], ~same])
+    starts = np.flatnonzero(changed).astype('int32')
+
+    return starts, [values[start] for start in starts]
+
+
+def _expand(starts: np.ndarray, values: np.ndarray, length: int) -> np.ndarray:
+    """ 游程解码 """
+
+    counts = np.diff(np.append(starts, length))
+
+    return np.repeat(values, counts)
+
+
+def _fit_segments(total_value: np.ndarray, ratio: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    为一列估值寻找最少的分母分段:CSV中的估值保留两位小数,每行的真实分母落在总市值/(估值±0.005)之间,
+    相邻各行的区间有交集时属于同一段(同一报告期),取交集的中点作为该段分母.无法确定分母的行(总市值或估值为0、缺失)
+    合为一段,分母为NaN,由例外值记录.
+    """
+
+    half = 0.5 * 10 ** -DECIMALS * 0.999  # 略小于半个最小单位,避开舍入边界
+    with np.errstate(divide='ignore', invalid='ignore'):
+        a, b = total_value / (ratio - half), total_value / (ratio + half)
+    lows, highs = np.minimum(a, b), np.maximum(a, b)
+    valid = np.isfinite(lows) & np.isfinite(highs) & (np.abs(ratio) > half) & (total_value != 0)
+
+    starts, denominators = [], []
+    low, high, open_segment = -np.inf, np.inf, False
+    for row in range(len(ratio)):
+        if valid[row] and open_segment and max(low, lows[row]) <= min(high, highs[row]):
+            low, high = max(low, lows[row]), min(high, highs[row])
+            continue
+        if not valid[row] and starts and not open_segment:  # 连续无法确定分母的行共用一段
+            continue
+        if open_segment:
+            denominators[-1] = (low + high) / 2
+        starts.append(row)
+        denominators.append(np.nan)
+        open_segment = bool(valid[row])
+        low, high = (lows[row], highs[row]) if open_segment else (-np.inf, np.inf)
+    if open_segment:
+        denominators[-1] = (low + high) / 2
+
+    return np.array(starts, dtype='int32'), np.array(denominators, dtype='float64')
+
+
+def _materialise(total_value: np.ndarray, starts: np.ndarray, denominators: np.ndarray) -> np.ndarray:
+    """ 由总市值和分母分段计算估值,保留两位小数 """
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.round(total_value / _expand(starts, denominators, len(total_value)), DECIMALS)
+
+
+def encode_trade_record(df: DataFrame) -> Dict[str, np.ndarray]:
+    """
+    把read_trade_record(parse_dates=True)读取的交易记录编码为紧凑格式的数组字典.
+    股票代码和名称按游程保存在meta中;日期为int32天数;总市值和DIVIDEND逐行保存;PB/PE/PS/PC保存分母分段,
+    由分段计算后与原值不同的行另存例外值,解码结果与原文件相同.
+    """
+
+    length = len(df)
+    total_value = df['总市值'].to_numpy(dtype='float64')
+    arrays = {
+        'dates': ((df['日期'].to_numpy().astype('datetime64[D]') - EPOCH).astype('int32')),
+        '总市值': total_value,
+        'DIVIDEND': df['DIVIDEND'].to_numpy(dtype='float64'),
+    }
+    code_starts, codes = _run_length(df['股票代码'].astype(str).to_numpy())
+    name_starts, names = _run_length(df['名称'].astype(str).to_numpy())
+    arrays['code_starts'], arrays['name_starts'] = code_starts, name_starts
+
+    for column in DENOMINATORS:
+        ratio = df[column].to_numpy(dtype='float64')
+        starts, denominators = _fit_segments(total_value=total_value, ratio=ratio)
+        restored = _materialise(total_value, starts, denominators)
+        differs = ~((restored == ratio) | (np.isnan(restored) & np.isnan(ratio)))
+        arrays[f'{column}_starts'], arrays[f'{column}_denominators'] = starts, denominators
+        arrays[f'{column}_override_rows'] = np.flatnonzero(differs).astype('int32')
+        arrays[f'{column}_override_values'] = ratio[differs]
+
+    meta = {'rows': length, 'codes': codes, 'names': names}
+    arrays['meta'] = np.array(json.dumps(meta, ensure_ascii=False))
+
+    return arrays
+
+
+def decode_trade_record(arrays: Dict[str, np.ndarray]) -> DataFrame:
+    """ 把紧凑格式还原为交易记录,列和类型与read_trade_record相同 """
+
+    meta = json.loads(str(arrays['meta']))
+    length = meta['rows']
+    total_value = arrays['总市值']
+    df = DataFrame({
+        '日期': pd.to_datetime(arrays['dates'].astype('datetime64[D]')),
+        '股票代码': _expand(arrays['code_starts'], np.array(meta['codes'], dtype=object), length),
+        '名称': pd.Categorical(_expand(arrays['name_starts'], np.array(meta['names'], dtype=object), length)),
+        '总市值': total_value,
+    })
+    for column in DENOMINATORS:
+        ratio = _materialise(total_value, arrays[f'{column}_starts'], arrays[f'{column}_denominators'])
+        ratio[arrays[f'{column}_override_rows']] = arrays[f'{column}_override_values']
+        df[column] = ratio
+    df['DIVIDEND'] = arrays['DIVIDEND']
+
+    return df[TRADE_RECORD_COLUMNS]
+
+
+def compact_trade_record(args: Tuple[str, str]) -> Tuple[int, int]:
+    """ 进程池任务:把一个CSV文件转换为紧凑格式,args为(csv文件, npz文件),返回(原文件字节数, 新文件字节数) """
+
+    csv_file, npz_file = args
+    arrays = encode_trade_record(read_trade_record(csv_file))
+    np.savez_compressed(npz_file, **arrays)
+
+    return os.path.getsize(csv_file), os.path.getsize(npz_file)
+
+
+class CompactRecordStore:
+    """
+    - 交易记录的紧凑存储格式.CSV文件每行重复带引号的股票代码和名称,PE、PS、PC的分母(净利润、总营收、经营活动净流量)
+    一年才变化一次,净资产一个季度变化一次,每行却都以文本保存计算后的估值.
+    - 本类每只股票保存一个data-package/compact-record/<代码>.npz文件:股票代码和名称只保存变化的位置,
+    分母按报告期分段保存(由CSV中的估值反推,不需要联网),PB/PE/PS/PC在读取时由总市值计算.
+    反推不出分母的行(估值为0或缺失、日更时写入的未取整估值)保存原值,读取结果与CSV文件相同.
+    - restate按新的分母重算一个期间的估值(如年报更正),不需要重新下载交易记录.
+    - CSV文件仍是日常更新的主数据,本格式由COMPACT-TRADE-CSV命令从CSV生成.(2026-10-19)
+    """
+
+
+    def __init__(self, store_path: str = COMPACT_RECORD_PATH, record_path: str = trade_record_path):
+        self.__store_path = store_path
+        self.__record_path = record_path
+        os.makedirs(self.__store_path, exist_ok=True)
+
+
+    def get_file(self, code: str) -> str:
+        return os.path.join(self.__store_path, f'{code}.npz')
+
+
+    def exists(self, code: str) -> bool:
+        return os.path.exists(self.get_file(code))
+
+
+    def __load(self, code: str) -> Dict[str, np.ndarray]:
+        with np.load(self.get_file(code)) as data:
+            return {key: data[key] for key in data.files}
+
+
+    def convert(self, code: str, stock_class: str) -> Tuple[int, int]:
+        """ 由CSV文件生成紧凑格式,返回(原文件字节数, 新文件字节数) """
+
+        csv_file = os.path.join(self.__record_path, stock_class, f'{code}.csv')
+
+        return compact_trade_record((csv_file, self.get_file(code)))
+
+
+    def read(self, code: str) -> DataFrame:
+        """ 读取紧凑格式的交易记录,列和类型与read_trade_record相同,按日期降序排列 """
+
+        return decode_trade_record(self.__load(code))
+
+
+    def export_csv(self, code: str, csv_file: str) -> None:
+        """ 还原为CSV文件 """
+
+        write_trade_record(self.read(code), csv_file)
+
+
+    def get_denominators(self, code: str, column: str) -> DataFrame:
+        """
+        返回一列估值的分母分段:start_date、end_date(均含)和denominator(分母,单位与总市值相同),
+        按日期降序排列;denominator为NaN的段由保存的原值给出.
+        """
+
+        arrays = self.__load(code)
+        dates = arrays['dates'].astype('datetime64[D]')
+        starts = arrays[f'{column}_starts']
+        ends = np.append(starts[1:], len(dates)) - 1
+
+        return DataFrame({'start_date': dates[ends], 'end_date': dates[starts], 'denominator': arrays[f'{column}_denominators']})
+
+
+    def restate(self, code: str, column: str, start_date: str, end_date: str, denominator: float) -> int:
+        """
+        以新的分母重算start_date至end_date(yyyy-mm-dd,均含)期间的估值,覆盖该期间保存的原值,返回重算的行数.
+
+        :param column: PB、PE、PS或PC.
+        :param denominator: 新的净资产、净利润、总营收或经营活动净流量.
+        """
+
+        if column not in DENOMINATORS:
+            raise ValueError(f'column应为{list(DENOMINATORS)}之一.')
+        arrays = self.__load(code)
+        length = len(arrays['dates'])
+        dates = arrays['dates'].astype('datetime64[D]')
+        selected = (dates >= np.datetime64(start_date, 'D')) & (dates <= np.datetime64(end_date, 'D'))
+
+        denominators = _expand(arrays[f'{column}_starts'], arrays[f'{column}_denominators'], length)
+        denominators[selected] = denominator
+        starts, values = _run_length(denominators)
+        arrays[f'{column}_starts'], arrays[f'{column}_denominators'] = starts, np.array(values, dtype='float64')
+        keep = ~selected[arrays[f'{column}_override_rows']]
+        arrays[f'{column}_override_rows'] = arrays[f'{column}_override_rows'][keep]
+        arrays[f'{column}_override_values'] = arrays[f'{column}_override_values'][keep]
+        np.savez_compressed(self.get_file(code), **arrays)
+
+        return int(selected.sum())
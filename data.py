@@ -1,10 +1,13 @@
 import random
+import bisect
 import os
 import re
 import sys
 import sqlite3
 import datetime
 import time
+import shutil
+import threading
 import pandas as pd
 from pandas import DataFrame
 import numpy as np
@@ -20,8 +23,30 @@ from path import (
     finance_report_path, sql_path, trade_record_path, header_xueqiu, headers_163, headers_chinabond, headers_cninfo, 
     headers_sina, headers_10jqka, SW_STOCK_LIST, CNINFO_STOCK_LIST
 )
+from mos import StockMOS
+from roematrix import ROEMatrix, get_roe_matrix, refresh_roe_matrix
+from roestore import get_roe_store
+from yieldcurve import get_yield_curve, refresh_yield_curve
+from tradecalendar import TradeCalendar, get_trade_calendar
+from pricestore import PriceStore
+from adjustprice import AdjustPriceMatrix
+from valuation import ValuationPercentile
+from industry import IndustryAggregate
+from executor import BatchExecutor, IO_BOUND, CPU_BOUND, shutdown_process_pools
+from scheduler import mount_host_limits
+from journal import BatchJournal
+from metrics import get_metrics
+from profiler import PROFILE_MODE, get_profiler, profile_methods
+from snapshot import SnapshotBackup
+from stocklist import StockListReconciler
+from manifest import DatasetManifest, get_manifest
+from backfill import BackfillPlanner
+from queryservice import QueryService
+from compactrecord import CompactRecordStore, compact_trade_record
+from recordschema import read_trade_record, write_trade_record, TRADE_RECORD_COLUMNS, METRIC_COLUMNS
     
 
+@profile_methods
 class StockData:
     """
     - 用于管理股票代码、下载数据、计算指标、初始化数据库和更新数据库.
@@ -34,12 +59,14 @@ class StockData:
     - 其他需要重复下载的update_...方法更名为update_...copy_from_CSV,原update_...系列函数全部保留.(2023-04-28)
 
     - TODO: 检查当申万股票池清单发生变化时,如何更新数据库的资料.(2023-06-02)
+    - 已由reconcile_stock_list实现:比较新旧清单,增量调整交易记录目录和全部数据表,初始化新上市股票.(2026-10-19)
     """
 
 
     def __init__(self, stock_list_path: str = SW_STOCK_LIST):
         """ stock_list_path 为绝对路径  """
 
+        self.__stock_list_path = stock_list_path
         self.__sw_stock_list: DataFrame = pd.read_excel(io=stock_list_path)  # 申万股票清单pandas df格式
         self.__cninfo_stock_list: DataFrame = pd.read_excel(io=CNINFO_STOCK_LIST, dtype={'code': str})  # 巨潮资讯网股票清单pandas
         self.__data_package_path = data_package_path
@@ -48,10 +75,14 @@ class StockData:
         self.__trade_record_path = trade_record_path
 
         # 标志cookies状态
-        self.__xueqiu_session = requests.Session()
-        self.__sina_session = requests.Session()
-        self.__cninfo_session = requests.Session()
-        self.__10jqka_session = requests.Session()
+        # 各session挂载HostLimitedAdapter,同一网站的并发请求数受HOST_LIMITS限制(2026-10-19)
+        self.__xueqiu_session = mount_host_limits(requests.Session())
+        self.__sina_session = mount_host_limits(requests.Session())
+        self.__cninfo_session = mount_host_limits(requests.Session())
+        self.__10jqka_session = mount_host_limits(requests.Session())
+        self.__chinabond_session = mount_host_limits(requests.Session())
+        self.__163_session = mount_host_limits(requests.Session())
+        self.__pushplus_session = mount_host_limits(requests.Session())
         
         self.__xueqiu_cookie_existed = False
         self.__sina_cookie_existed =False
@@ -74,6 +105,22 @@ class StockData:
         # 用于设置初始选股条件,为7年ROE值
         self.__init_roe_condition_value = [20]*7
 
+        # 批量计算MOS的引擎,首次使用时载入
+        self.__stock_mos: Union[StockMOS, None] = None
+
+        # 上交所/深交所交易日历
+        self.__trade_calendar: TradeCalendar = get_trade_calendar()
+
+        # 本地日线价格存储,首次使用时创建
+        self.__price_store: Union[PriceStore, None] = None
+
+        # 交易记录缺口检测和补全,首次使用时创建
+        self.__backfill_planner: Union[BackfillPlanner, None] = None
+
+        # 股票综合信息缓存,{code: (缓存时间, 综合信息字典)}
+        self.__comprehensive_cache: Dict[str, Tuple[float, Dict]] = {}
+        self.__comprehensive_lock = threading.Lock()
+
 
     def calculate_average_salary(self, code: str) -> List:
         """
@@ -111,7 +158,7 @@ class StockData:
         # 打开文件
         industry_class = self.get_name_and_class_by_code(code=code)[1]
         trade_record_file = os.path.join(self.__trade_record_path, f'{industry_class}/{code}.csv')
-        trade_record_df = pd.read_csv(filepath_or_buffer=trade_record_file)
+        trade_record_df = read_trade_record(trade_record_file, usecols=['PB'])
 
         max_pb, min_pb, mean_pb = trade_record_df['PB'].max(), trade_record_df['PB'].min(), trade_record_df['PB'].mean()
 
@@ -156,64 +203,18 @@ class StockData:
         # 获取最新股票市净率
         pb = self.get_stock_pb_from_xueqiu(code=code)
         
-        # 获取最近非0的国债到期收益率
-        yield_value = 0  # TODO最终可能为0, 出错
+        # 获取最近非0的国债到期收益率,由YieldCurve缓存二分查找,不再逐日查询数据库(2026-10-19)
         yesterday = datetime.date.today() + datetime.timedelta(days=-1)
-        begin = yesterday + datetime.timedelta(days=-30)
-        date_list = pd.date_range(begin, yesterday)
-        date_str = [str(date)[0:10] for date in date_list]  # 生成日期序列
+        yield_value = get_yield_curve().get_value_asof(date=yesterday, max_days=30)  # TODO最终可能为0, 出错
 
-        con = sqlite3.connect(CURVE_SQLITE3)
-        with con:
-            for date in date_str[::-1]:
-                sql = """ SELECT value1 FROM 'yield-curve' WHERE date1=? """
-                tmp = con.execute(sql, (date,))
-                try:
-                    yield_value =  tmp.fetchone()[0]
-                    if yield_value:
-                        break
-                except TypeError:  # 出现了表中没有的日期
-                    ...
-
-        con = sqlite3.connect(INDICATOR_SQLITE3)
-        with con:
-            sql = """ PRAGMA table_info('roe-all-stocks') """
-            result = con.execute(sql).fetchall()
-
-            # 生成搜索字符串
-            roe_fields = []
-            for tup in result:
-                if ('stock' not in tup[1]) and ('Q2' not in tup[1]):  # 只选取年度字段
-                    roe_fields.append(tup[1])
-            roe_fields = sorted(roe_fields, reverse=True)[0:period]  # 降序后取指定的字段数目
-
-            # 判断是否包括最新的半年roe数据
-            half_exist = False
-            last_year_filed = int(roe_fields[0][1:5])
-            last_half_year_filed = 'Y' + str(last_year_filed + 1) + 'Q2'
-            for filed in result:
-                if last_half_year_filed == filed[1]:
-                    roe_fields.insert(0, last_half_year_filed)
-                    half_exist = True
-                    break
-
-            pre_scode = """"""
-            for idx, filed in enumerate(roe_fields):
-                if idx == len(roe_fields) - 1:  # 最后一项
-                    pre_scode += filed
-                else:
-                    pre_scode += filed+', '
-            sql = f"""SELECT {pre_scode} FROM 'roe-all-stocks' WHERE stockcode=?  """
-
-            code = code + '.SH' if code.startswith('6') else code +'.SZ'
-            tmp = con.execute(sql, (code,)).fetchone()
-            try:
-                if half_exist:
-                    aver_roe = sum(tmp)/(period+0.5)
-                else:
-                    aver_roe = sum(tmp)/period
-            except TypeError:
-                return 88888.88
+        # 平均ROE取自共享的ROEMatrix,不再读取表结构拼接查询语句(2026-10-19)
+        matrix = get_roe_matrix()
+        row = matrix.get_rows([code])[0]
+        if row < 0 or period > len(matrix.get_annual_years()):
+            return 88888.88
+        aver_roe = float(matrix.average_roe(years=period, include_half=True)[row])
+        if not np.isfinite(aver_roe):
+            return 88888.88
 
         # 计算股票安全边际MOS
         inner_pb = aver_roe/yield_value
@@ -222,121 +223,171 @@ class StockData:
         return mos
 
 
-    def calculate_comprehensive_information(self, code: str) -> Dict:
+    def calculate_comprehensive_information(self, code: str, ttl: int = 300) -> Dict:
         """ 
         - 计算并返回股票综合信息,包括:代码、名称、行业、价格、cur_PE、cur_PB、max_pb
         mean_pb、min_pb、MOS、期间涨跌幅、平均薪酬、5年cashflow/profit等
         - 主要用于前端显示股票综合信息.(2023-04-25)
+        - 改为调用calculate_comprehensive_information_batch,结果按ttl秒缓存.(2026-10-19)
         """
 
-        result_dict = {}
-        result_dict['stock_code'] = code+'.SH' if code.startswith('6') else code+'.SZ'
-        result_dict['stock_name'] = self.get_name_and_class_by_code(code=code)[0]
-        result_dict['stock_class'] = self.get_name_and_class_by_code(code=code)[1]
+        return self.calculate_comprehensive_information_batch(codes=[code], ttl=ttl)[code]
 
-        # 涨跌幅
-        today = datetime.date.today()
-        pre_today_1800 = today + datetime.timedelta(days=-365*5)
 
-        tmp = self.download_period_statistic_value_from_xueqiu(code=code, begin=str(pre_today_1800), end=str(today))
+    def calculate_comprehensive_information_batch(self, codes: List[str], ttl: int = 300) -> Dict[str, Dict]:
+        """ 
+        - 批量计算股票综合信息,返回{code: 综合信息字典},字典内容与calculate_comprehensive_information相同.
+        - 原方法对每只股票依次发出十余次网络请求:5年日线、新浪PE、雪球页面两次(另有三次calculate_stock_mos中的PB)
+        和雪球股息率页面,还要打开四个SQLite文件.前端每次显示页面都要逐只调用.
+        - 本方法并发执行相互独立的下载:全部股票的PE合并为一次gtimg请求,雪球页面每只股票只请求一次同时取得PB和股息率,
+        日线由PriceStore增量更新;数据库每个文件只打开一次,以IN查询取得全部股票的数据;MOS由StockMOS一次算出.
+        - 结果按股票代码缓存ttl秒,缓存期内不再重复下载;下载出错的股票不缓存.(2026-10-19)
+
+        :param codes: 股票代码列表,不含后缀.
+        :param ttl: 缓存有效期,单位秒,为0时不使用缓存.
+        :return: {code: 综合信息字典}
+        """
+
+        result = {}
+        now = time.time()
+        with self.__comprehensive_lock:
+            for code in codes:
+                cached = self.__comprehensive_cache.get(code)
+                if cached and now - cached[0] < ttl:
+                    result[code] = cached[1]
+        missing = [code for code in dict.fromkeys(codes) if code not in result]
+        if not missing:
+            return {code: dict(result[code]) for code in codes}  # 返回副本,调用者修改结果不影响缓存
+
+        # 并发下载相互独立的数据
+        price_store = self.get_price_store()
+        with ThreadPoolExecutor(max_workers=min(32, 2*len(missing)+2)) as pool:
+            pe_future = pool.submit(self.get_stocks_PE_from_sina, missing)
+            mos_future = pool.submit(self.get_stock_mos_engine().calculate_mos, missing, (3, 5, 7))
+            table_future = pool.submit(self.__query_comprehensive_tables, missing)
+            xueqiu_futures = {code: pool.submit(self.get_stock_pb_and_dividend_rate_from_xueqiu, code) for code in missing}
+            price_futures = {code: pool.submit(price_store.update, code) for code in missing}
+
+        pe_failed = pe_future.exception() is not None
+        pe_dict = {} if pe_failed else pe_future.result()
+        mos_df = mos_future.result().set_index('stockcode')
+        table_dict = table_future.result()
 
-        value_items = tmp['data']['item']  # 当日涨跌幅
-        result_dict['cur_price'] = value_items[-1][5]
-        result_dict['cur_rising'] = value_items[-1][7]
+        today = datetime.date.today()
+        first_date_this_year = str(today.year)+'-01-01'
+        pre_day_365 = today + datetime.timedelta(days=-365)
+        for code in missing:
+            failed = pe_failed
+            result_dict = {}
+            result_dict['stock_code'] = code+'.SH' if code.startswith('6') else code+'.SZ'
+            result_dict['stock_name'], result_dict['stock_class'] = self.get_name_and_class_by_code(code=code)
+
+            # 涨跌幅,日线取自本地PriceStore
+            latest = price_store.get_latest(code=code)
+            if price_futures[code].exception() is not None or latest is None:
+                failed = True
+            if latest is None:
+                for key in ['cur_price', 'cur_rising', 'this_year_rising', '1_year_rising']:
+                    result_dict[key] = '未能获取'
+            else:
+                _, cur_price, cur_rising = latest
+                result_dict['cur_price'] = cur_price  # 当日涨跌幅
+                result_dict['cur_rising'] = cur_rising
+                result_dict['this_year_rising'] = cur_price / price_store.get_price_asof(code=code, date=first_date_this_year) - 1
+                result_dict['1_year_rising'] = cur_price / price_store.get_price_asof(code=code, date=pre_day_365) - 1
+
+            # pe pb信息
+            result_dict['cur_pe'] = pe_dict.get(code, 0.00)
+            if xueqiu_futures[code].exception() is not None:
+                failed = True
+                pb, dividend_rate = '未能获取', '未能获取'
+            else:
+                pb, dividend_rate = xueqiu_futures[code].result()
+            result_dict['cur_pb'] = pb
+            result_dict['max_pb'], result_dict['min_pb'], result_dict['mean_pb'] = table_dict[code]['history_pb']
 
-        first_date_this_year = datetime.datetime.strptime(str(today.year)+'-01-01', '%Y-%m-%d').date()  # 当年涨跌幅
-        camp_timestamp = self.date_to_timestamp(date=str(first_date_this_year))
-        position = self.get_closest_date_position(camp_timestamp=camp_timestamp, target_list=value_items)
-        result_dict['this_year_rising'] = value_items[-1][5] / value_items[position][5] - 1
+            # mos信息
+            for period in (3, 5, 7):
+                result_dict[f'{period}_mos'] = mos_df.loc[result_dict['stock_code'], f'{period}_mos']
 
-        pre_day_365 = today + datetime.timedelta(days=-365)  # 1年涨跌幅
-        camp_timestamp = self.date_to_timestamp(date=str(pre_day_365))
-        position = self.get_closest_date_position(camp_timestamp=camp_timestamp, target_list=value_items)
-        result_dict['1_year_rising'] = value_items[-1][5] / value_items[position][5] - 1
+            # salary信息 股息率信息 cashflow-profit ratio 信息
+            result_dict['salary'] = table_dict[code]['salary']
+            result_dict['dividend_rate'] = dividend_rate
+            result_dict['cash_to_profit'] = table_dict[code]['cash_to_profit']
 
-        # pe pb信息
-        result_dict['cur_pe'] = self.get_stock_PE_from_sina(code=code)
-        result_dict['cur_pb'] = self.get_stock_pb_from_xueqiu(code=code)
-        con = sqlite3.connect(HISTORY_PB_SQLITE3)
-        with con:
-            sql = """ SELECT maxPB, minPB, meanPB FROM 'history-pb' WHERE stockcode=? """
-            tmp = con.execute(sql, (result_dict['stock_code'],)).fetchone()
-            if not tmp:
-                result_dict['max_pb'] = '未能获取'
-                result_dict['min_pb'] = '未能获取'
-                result_dict['mean_pb'] = '未能获取'
-            else:
-                result_dict['max_pb'] = tmp[0]
-                result_dict['min_pb'] = tmp[1]
-                result_dict['mean_pb'] = tmp[2]
+            result[code] = result_dict
+            if not failed:
+                with self.__comprehensive_lock:
+                    self.__comprehensive_cache[code] = (now, result_dict)
 
-        # mos信息
-        result_dict['3_mos'] = self.calculate_stock_mos(code=code, period=3)
-        result_dict['5_mos'] = self.calculate_stock_mos(code=code, period=5)
-        result_dict['7_mos'] = self.calculate_stock_mos(code=code, period=7)
+        return {code: dict(result[code]) for code in codes}  # 返回副本,调用者修改结果不影响缓存
 
-        # salary信息
-        con = sqlite3.connect(SALARY_SQLITE3)
-        table_name = 'salary-' + str(datetime.datetime.now().year - 1)
-        with con:
-            sql = f""" SELECT average_salary FROM '{table_name}' WHERE stockcode=? """
-            tmp = con.execute(sql, (result_dict['stock_code'],)).fetchone()
-            if tmp:
-                result_dict['salary'] = tmp[0]
-            else:
-                result_dict['salary'] = '无法获取'
 
-        # 股息率信息
-        result_dict['dividend_rate'] = self.get_stock_dividend_rate_from_xueqiu(code=code)
+    def __query_comprehensive_tables(self, codes: List[str]) -> Dict[str, Dict]:
+        """ 
+        以IN查询一次取得history-pb、salary和cashflow-profit表中多只股票的数据,
+        返回{code: {'history_pb': (max, min, mean), 'salary': ..., 'cash_to_profit': ...}},缺失数据的提示与原方法相同.
+        """
+
+        stock_codes = {code: code+'.SH' if code.startswith('6') else code+'.SZ' for code in codes}
+        placeholder = ','.join('?' * len(codes))
+        params = tuple(stock_codes.values())
 
-        # cashflow-profit ratio 信息
-        con = sqlite3.connect(CASHFLOW_PROFIT_SQLITE3)
+        def query(db: str, sql: str) -> Dict:
+            con = sqlite3.connect(db)
+            try:
+                with con:
+                    return {row[0]: row[1:] for row in con.execute(sql, params).fetchall()}
+            except sqlite3.OperationalError:  # 年度表尚未建立
+                return {}
+            finally:
+                con.close()
+
+        history_pb = query(HISTORY_PB_SQLITE3, f""" SELECT stockcode, maxPB, minPB, meanPB FROM 'history-pb' WHERE stockcode IN ({placeholder}) """)
+        table_name = 'salary-' + str(datetime.datetime.now().year - 1)
+        salary = query(SALARY_SQLITE3, f""" SELECT stockcode, average_salary FROM '{table_name}' WHERE stockcode IN ({placeholder}) """)
         last_year = datetime.datetime.now().year - 1
         table_name = str(last_year - 4) + '-' + str(last_year)
-        with con:
-            sql = f"""SELECT cash_to_profit FROM '{table_name}' WHERE stockcode=? """
-            tmp = con.execute(sql, (result_dict['stock_code'], )).fetchone()
-            if tmp:
-                result_dict['cash_to_profit'] = tmp[0]
-            else:
-                result_dict['cash_to_profit'] = '无法获取'
+        cash_to_profit = query(CASHFLOW_PROFIT_SQLITE3, f""" SELECT stockcode, cash_to_profit FROM '{table_name}' WHERE stockcode IN ({placeholder}) """)
 
-        return result_dict
+        result = {}
+        for code, stock_code in stock_codes.items():
+            result[code] = {
+                'history_pb': tuple(history_pb[stock_code]) if stock_code in history_pb else ('未能获取',)*3,
+                'salary': salary[stock_code][0] if stock_code in salary else '无法获取',
+                'cash_to_profit': cash_to_profit[stock_code][0] if stock_code in cash_to_profit else '无法获取',
+            }
+
+        return result
+
+
+    def clear_comprehensive_information_cache(self) -> None:
+        """ 清空综合信息缓存,数据库更新后调用 """
+
+        with self.__comprehensive_lock:
+            self.__comprehensive_cache.clear()
 
 
     def calculate_period_rising_value(self, args: List) -> float:
         """ 
         - 计算股票在指定期间的涨幅, args包含三项元素: 股票代码(不含后缀)、开始日期和结束日期 
         开始日期和结束日期均为yyyy-mm-dd型字符串,这个函数不是很稳定,可能还是有BUG. 
+        - 改用PriceStore后,开始和结束价格取该日当日或之前最近一个交易日的收盘价,不再取前后最接近的交易日,
+        避免结束日期为非交易日时用到之后的价格.(2026-10-19)
+        - 下载或计算出错时抛出异常,不再返回0.00,以免出错的股票以0%参加排名.(2026-10-19)
         """
 
-        rising_value = 0.00
-
         code: str = args[0]
         start_date_str = args[1]
         end_date_str = args[2]
 
         start_date = datetime.datetime.strptime(start_date_str, '%Y-%m-%d').date()
-        end_date = datetime.datetime.strptime(end_date_str, '%Y-%m-%d').date()
-
-        start_date_timestamp = self.date_to_timestamp(start_date_str)
-        end_date_timestamp = self.date_to_timestamp(end_date_str)
-
         start_date_str_download = str(start_date + datetime.timedelta(days=-30))  # 前推30天
 
-        try:
-            tmp = self.download_period_statistic_value_from_xueqiu(code=code, begin=start_date_str_download, end=end_date_str)
-            value_items = tmp['data']['item']
-
-            start_date_position = self.get_closest_date_position(start_date_timestamp, value_items)
-            end_date_position = self.get_closest_date_position(end_date_timestamp, value_items)
-
-            start_price = value_items[start_date_position][5]
-            end_price = value_items[end_date_position][5]
-
-            rising_value = end_price/start_price -1
-        except:
-            ...
+        # 改为从本地PriceStore计算,只增量下载缺少的日线(2026-10-19)
+        price_store = self.get_price_store()
+        price_store.update(code=code, begin=start_date_str_download)
+        rising_value = price_store.calculate_period_rising_value(code=code, start_date=start_date_str, end_date=end_date_str)
 
         return round(rising_value, 4)
 
@@ -567,7 +618,7 @@ class StockData:
         stock_class = self.get_name_and_class_by_code(code=code)[1]
         trade_csv_path = os.path.join(self.__trade_record_path, f'{stock_class}')
         trade_csv_file = os.path.join(trade_csv_path, f'{code}.csv')
-        trade_record_df = pd.read_csv(trade_csv_file)
+        trade_record_df = read_trade_record(trade_csv_file, parse_dates=False)
 
         # 如果没有分红信息 DIVIDEND 列,则添加该列,否则返回.
         if 'DIVIDEND' not in trade_record_df.columns:
@@ -613,15 +664,16 @@ class StockData:
                 trade_record_df.loc[i, 'DIVIDEND'] = dividend_value
 
         # 保存CSV文件
-        trade_record_df.to_csv(trade_csv_file, index=False)
+        write_trade_record(trade_record_df, trade_csv_file)
 
 
-    def download_period_statistic_value_from_xueqiu(self, code: str, begin: str, end: str):
+    def download_period_statistic_value_from_xueqiu(self, code: str, begin: str, end: str, indicator: str = 'kline'):
         """ 
         - 从雪球下载指定期间的股票涨跌幅统计数据, 类型为向前复权.code为不含后缀的代码.
         - begin和end为yyyy-mm-dd日期型字符串.(2023-02-...)
         - 如果需要获取指数的区间数据,和一般股票相比,地址是统一的,参数需要小的调整.
         我最常用的指数是沪深300(SH000300),创业板(SZ399006)和中证500(SH000905)三个指数.(2023-04-11)
+        - indicator可附加估值指标,如'kline,pe,pb,ps,pcf,market_capital',供交易记录补全使用.(2026-10-19)
         """
 
         url = "https://stock.xueqiu.com/v5/stock/chart/kline.json"
@@ -642,7 +694,7 @@ class StockData:
             'end': str(end_stamp),
             'period': 'day',
             'type': 'before',
-            'indicator': 'kline'
+            'indicator': indicator
         }
 
         if not self.__xueqiu_cookie_existed:
@@ -667,7 +719,7 @@ class StockData:
 
         # 准备下载参数
         url = f'http://quotes.money.163.com/f10/gszl_{code}.html'
-        response = requests.get(url=url, headers=self.__headers_163)
+        response = self.__163_session.get(url=url, headers=self.__headers_163)
         table_list = pd.read_html(response.text)
         start_date = table_list[4].iloc[1, 1].replace('-', '')
         end_date = str(datetime.date.today()).replace('-', '')
@@ -680,7 +732,7 @@ class StockData:
             'end': end_date,
             'fields': 'TCAP',  # 总市值参数
         }
-        response = requests.get(url=url, params=params, headers=self.__headers_163)
+        response = self.__163_session.get(url=url, params=params, headers=self.__headers_163)
         response.encoding = 'gbk'  # 解码公司简称中文字符
         with open(f'{file_name}', 'w') as file:
             file.write(response.text)
@@ -715,7 +767,7 @@ class StockData:
             'sortType': '',
             'isHLtitle': 'true'
         }
-        response = requests.post(url=url, data=data, headers=self.__headers_cninfo)
+        response = self.__cninfo_session.post(url=url, data=data, headers=self.__headers_cninfo)
         result = response.json()['announcements']  # 保存了年报文件信息列表
 
         # 获取年度报告文件url
@@ -731,7 +783,7 @@ class StockData:
         
         # 下载并保存年度报告
         print(f'正在下载 {code} - {year} 年报......')
-        content = requests.get(url=pdf_url).content
+        content = self.__cninfo_session.get(url=pdf_url).content
         with open(file_name, 'wb') as file:
             file.write(content)
     
@@ -747,7 +799,7 @@ class StockData:
 
         # 2 如果不存在相应的年报文件,首先获取年报标题列表
         url = f'https://vip.stock.finance.sina.com.cn/corp/go.php/vCB_Bulletin/stockid/{code}/page_type/ndbg.phtml'
-        response = requests.get(url=url)
+        response = self.__sina_session.get(url=url)
         soup = BeautifulSoup(response.text, 'html.parser')
         a_list = soup.select(selector='#con02-7 > table:nth-child(3) ul a')  # 各年年报链接标签
 
@@ -772,38 +824,44 @@ class StockData:
         # 5 下载pdf文件至指定目录
         print(f'正在下载{code} - {year} 年报......')
         url = pdf_a['href']
-        content = requests.get(url=url).content
+        content = self.__sina_session.get(url=url).content
         with open(file_name, 'wb') as f:
             f.write(content)
 
 
-    def get_all_stocks_rising_value_ranks(self, start_date_str: str, end_date_str: str):
+    def get_all_stocks_rising_value_ranks(self, start_date_str: str, end_date_str: str, top_k: Union[int, None] = None, 
+                                          by_industry: bool = False) -> Union[List, Dict]:
         """  
         返回全部股票指定期间内涨幅排名(按照降序排名),返回值包括股票代码和期间涨幅。
         这个函数是对全部股票进行搜索计算,消耗较大, 一般不要使用。
-        """
-
-        result = []
-
-        stock_classes = self.get_stock_classes()
-        for clas in stock_classes:
-            tmp = self.get_stocks_of_specific_class(clas)
-            code_list = [item[0][:6] for item in tmp]
 
-            args_list = []  # 准备参数列表
-            for item in code_list:
-                args = [item, start_date_str, end_date_str]
-                args_list.append(args)
-            
-            with ThreadPoolExecutor() as pool:
-                value = pool.map(self.calculate_period_rising_value, args_list)
+        - 当后复权价格矩阵AdjustPriceMatrix已经覆盖结束日期时,改为离线一次向量化计算全部股票,不再逐只下载日线.
+        - top_k: 只返回前top_k名;by_industry: 为True时按申万一级行业分别排名,返回{行业: [(代码, 涨幅), ...]}.(2026-10-19)
+        - 两种方式都只对申万清单中的股票排名;逐只计算时出错的股票不参加排名.(2026-10-19)
+        """
 
-            for item in zip(code_list, value):  # 组合代码和涨跌幅
-                result.append(item)
-        
+        df = self.__sw_stock_list
+        code_class = dict(zip(df['股票代码'].str[0:6], df['新版一级行业']))  # 只对申万清单中的股票排名
+
+        matrix = AdjustPriceMatrix()
+        if matrix.exists() and end_date_str <= matrix.get_date_range()[1]:
+            return matrix.get_rising_value_ranks(start_date=start_date_str, end_date=end_date_str, top_k=top_k,
+                                                 code_class=code_class if by_industry else None, universe=list(code_class))
+
+        # 矩阵未覆盖结束日期时逐只计算,全部股票一次提交给IO_BOUND执行器,各网站并发数由HostLimitedAdapter限制
+        code_list = [item[0][:6] for clas in self.get_stock_classes() for item in self.get_stocks_of_specific_class(clas)]
+        values = BatchExecutor(kind=IO_BOUND).map_method(self, 'calculate_period_rising_value',
+                                                         [[code, start_date_str, end_date_str] for code in code_list])
+        result = [(code, value) for code, value in zip(code_list, values) if not isinstance(value, Exception)]
         result = sorted(result, key=lambda x: x[1], reverse=True)  # 降序排列
 
-        return result
+        if by_industry:
+            industry_result = {}
+            for code, value in result:
+                industry_result.setdefault(code_class[code], []).append((code, value))
+            return {clas: items[:top_k] for clas, items in industry_result.items()}
+
+        return result[:top_k]
 
 
     @staticmethod
@@ -812,11 +870,68 @@ class StockData:
         从包含时间戳的列表项目找出和目标时间戳最接近的位置
         本函数中, 时间戳在每一个列表项的第一个位置
         第一个参数为要寻找的时间戳, 13位. 第二个参数为在其中寻找的列表.
+        列表按时间升序排列,改用二分查找后只比较左右两个相邻项.(2026-10-19)
         """
 
-        tmp_list = list(map(lambda x: abs(x[0] - camp_timestamp), target_list))
+        timestamps = [item[0] for item in target_list]  # bisect的key参数需要Python 3.10,先取出时间戳列
+        position = bisect.bisect_left(timestamps, camp_timestamp)
+        if position == 0:
+            return 0
+        if position == len(target_list):
+            return len(target_list) - 1
+        before, after = target_list[position-1][0], target_list[position][0]
+
+        return position - 1 if camp_timestamp - before <= after - camp_timestamp else position
+
 
-        return tmp_list.index(min(tmp_list))
+    def get_price_store(self) -> PriceStore:
+        """ 获取本地日线价格存储PriceStore实例,首次调用时创建 """
+
+        if self.__price_store is None:
+            self.__price_store = PriceStore(downloader=self.download_period_statistic_value_from_xueqiu)
+
+        return self.__price_store
+
+
+    def get_stock_mos_engine(self, reload: bool = False) -> StockMOS:
+        """ 
+        获取批量计算MOS的StockMOS实例,首次调用时载入数据,reload为True时重新载入.
+        数据库文件在载入后有变化或已经跨日时也重新载入,长期运行的进程不会一直使用旧数据.(2026-10-19)
+        """
+
+        if self.__stock_mos is None:
+            self.__stock_mos = StockMOS()
+        elif reload or self.__stock_mos.is_stale():
+            self.__stock_mos.reload()
+
+        return self.__stock_mos
+
+
+    def get_backfill_planner(self) -> BackfillPlanner:
+        """ 获取交易记录补全BackfillPlanner实例,首次调用时创建 """
+
+        if self.__backfill_planner is None:
+            self.__backfill_planner = BackfillPlanner(downloader=self.download_period_statistic_value_from_xueqiu,
+                                                      calendar=self.__trade_calendar, record_path=self.__trade_record_path)
+
+        return self.__backfill_planner
+
+
+    def backfill_trade_record(self, code: str, since: Union[str, None] = None):
+        """
+        以交易日历为准补全交易记录CSV文件中缺少的交易日,返回补全的行数;没有缺口时返回'skipped',供BatchJournal记录.
+        缺失日期合并为尽量少的雪球日线请求,详见BackfillPlanner.(2026-10-19)
+
+        :param since: yyyy-mm-dd,只检查该日期以后的缺口,默认从文件首日起检查.
+        """
+
+        stock_class = self.get_name_and_class_by_code(code=code)[1]
+        planner = self.get_backfill_planner()
+        plan = planner.plan(code=code, stock_class=stock_class, since=since)
+        if not plan['missing']:
+            return 'skipped'
+
+        return planner.fill(plan)
 
 
     def get_stock_classes(self) -> List:
@@ -832,20 +947,25 @@ class StockData:
         """
 
         url = "http://www.cninfo.com.cn/new/data/szse_stock.json"
-        response = requests.get(url=url)
+        response = self.__cninfo_session.get(url=url)
         stock_json = response.json()
         df = pd.DataFrame(data=stock_json['stockList'])
 
         return df
 
 
-    def get_latest_record_date(self):
-        """ 从历史交易记录文件查找最新的日期,查找的位置为self.__trade_record_path下第一个文件夹中的第一个文件 """
-        target_path = os.path.join(self.__trade_record_path, self.get_stock_classes()[0])
-        target_file = os.path.join(target_path, os.listdir(target_path)[0])
-        tmp_df = pd.read_csv(target_file, usecols=['日期'])
+    def get_latest_record_date(self) -> Union[str, None]:
+        """ 
+        返回历史交易记录的最新日期.
+        - 原来取self.__trade_record_path下第一个文件夹中os.listdir返回的第一个文件,结果取决于碰巧读到哪只股票.
+        改为数据清单中全部股票末日期的最大值,清单为空时先扫描登记一次.(2026-10-19)
+        """
+
+        manifest = DatasetManifest(record_path=self.__trade_record_path)
+        if manifest.get_latest_date() is None:
+            manifest.scan()
 
-        return tmp_df.loc[0, '日期']
+        return manifest.get_latest_date()
 
 
     def get_init_roe_condition_value(self) -> List:
@@ -878,61 +998,17 @@ class StockData:
         conditon_list = [ [8,] * 7, [12, ] * 7, [15, ] * 7 ]
         message['condition'] = random.choice(conditon_list)
 
-        con = sqlite3.connect(INDICATOR_SQLITE3)
-        with con:
-            # 获取数据库数字型字段
-            sql = """ PRAGMA TABLE_INFO('roe-all-stocks') """
-            fileds = con.execute(sql).fetchall()
-
-            roe_fields = []
-            for filed in fileds:
-                if ('stock' not in filed[1]) and ('Q2' not in filed[1]):  # 只选取年度字段
-                    roe_fields.append(filed[1])
-            roe_fields = sorted(roe_fields, reverse=True)
-            
-            # 生成筛选语句
-            sql = """ SELECT stockcode, stockname, stockclass FROM 'roe-all-stocks' WHERE """
-            for index, filed in enumerate(roe_fields[0:7]):
-                if index == 6:
-                    sql += f""" {filed}>=? """
-                else:
-                    sql += f""" {filed}>=? and """
-
-            # 查询结果
-            tmp = con.execute(sql, message['condition']).fetchall()
-            message['result'] = random.sample(tmp, 3)
+        # 由ROEMatrix一次向量化筛选,不再拼接查询语句(2026-10-19)
+        tmp = get_roe_matrix().select(min_roe=message['condition'], include_half=False)
+        message['result'] = random.sample([item[0:3] for item in tmp], 3)
 
         return message
 
 
     def get_stock_dividend_rate_from_xueqiu(self, code: str):
-        """ 从雪球网获取股票分红率数据 """
-
-        dividend_rate = 0.00
-        if code.startswith('6'):
-            url = f"https://xueqiu.com/S/SH{code}"
-        else:
-            url = f"https://xueqiu.com/S/SZ{code}"   
-        
-        if not self.__xueqiu_cookie_existed:
-            self.__xueqiu_session.get(url='https://xueqiu.com/', headers=self.__headers_xueqiu)
-            self.__xueqiu_cookie_existed = True
-        response = self.__xueqiu_session.get(url=url, headers=self.__headers_xueqiu)
-
-        df_list = pd.read_html(response.text)
-        info_df: DataFrame = df_list[0]
-        for index, row in info_df.iterrows():
-            for item in row:
-                if isinstance(item, str) and ('股息率' in item):
-                    pattern = r'\d*\.?\d+'
-                    didivend_list = re.findall(pattern=pattern, string=item)
-                    try:
-                        if didivend_list:
-                            dividend_rate = float(didivend_list[0])
-                    except ValueError:
-                        ...
+        """ 从雪球网获取股票分红率数据,页面解析与PB共用get_stock_pb_and_dividend_rate_from_xueqiu(2026-10-19) """
 
-        return dividend_rate
+        return self.get_stock_pb_and_dividend_rate_from_xueqiu(code=code)[1]
 
 
     def get_stocks_of_specific_class(self, stock_class: str) -> List:
@@ -946,10 +1022,10 @@ class StockData:
 
         return result
 
-    def get_stock_pb_from_xueqiu(self, code: str) -> float:
-        """ 从雪球网获取股票PB数据 """
+    def get_stock_pb_and_dividend_rate_from_xueqiu(self, code: str) -> Tuple[float, float]:
+        """ 从雪球网股票页面一次获取PB和股息率,同时需要两项数据时避免重复请求同一页面(2026-10-19) """
 
-        stock_pb = 0.00
+        stock_pb, dividend_rate = 0.00, 0.00
 
         if code.startswith('6'):
             url = f"https://xueqiu.com/S/SH{code}"
@@ -961,21 +1037,33 @@ class StockData:
             self.__xueqiu_cookie_existed = True
         response = self.__xueqiu_session.get(url=url, headers=self.__headers_xueqiu)
 
-        # pd.read_html 方法
         df_list = pd.read_html(response.text)
         info_df: DataFrame = df_list[0]
+        pattern = r'\d*\.?\d+'
         for index, row in info_df.iterrows():
             for item in row:
                 if isinstance(item, str) and ('市净率' in item):
-                    pattern = r'\d*\.?\d+'
                     pb_list = re.findall(pattern=pattern, string=item)
                     try:
                         if pb_list:
                             stock_pb = float(pb_list[0])
                     except ValueError:
                         stock_pb = 0
+                if isinstance(item, str) and ('股息率' in item):
+                    didivend_list = re.findall(pattern=pattern, string=item)
+                    try:
+                        if didivend_list:
+                            dividend_rate = float(didivend_list[0])
+                    except ValueError:
+                        ...
+
+        return stock_pb, dividend_rate
+
 
-        return stock_pb
+    def get_stock_pb_from_xueqiu(self, code: str) -> float:
+        """ 从雪球网获取股票PB数据,页面解析与股息率共用get_stock_pb_and_dividend_rate_from_xueqiu(2026-10-19) """
+
+        return self.get_stock_pb_and_dividend_rate_from_xueqiu(code=code)[0]
 
     
     def get_stock_total_value_from_sina(self, code: str) -> float:
@@ -1084,25 +1172,72 @@ class StockData:
         return pe
 
 
+    def get_stocks_PE_from_sina(self, codes: List[str]) -> Dict[str, float]:
+        """ 
+        使用新浪财经接口一次获取多只股票的静态市盈率,返回{code: pe}.
+        gtimg接口支持以逗号分隔多个代码,每行返回一只股票,字段位置与get_stock_PE_from_sina相同.(2026-10-19)
+        """
+
+        result = {code: 0.00 for code in codes}
+        symbols = ','.join(f'sh{code}' if code.startswith('6') else f'sz{code}' for code in codes)
+        url = f'http://qt.gtimg.cn/q={symbols}'
+
+        if not self.__sina_cookie_existed:
+            self.__sina_session.get(url='https://finance.sina.com.cn', headers=self.__headers_sina)
+            self.__sina_cookie_existed = True
+        response = self.__sina_session.get(url=url, headers=self.__headers_sina)
+
+        for line in response.text.split(';'):
+            if '="' not in line:
+                continue
+            symbol, content = line.strip().split('="', 1)
+            try:
+                result[symbol[-6:]] = float(content.split('~')[53])
+            except (IndexError, ValueError, KeyError):
+                ...
+
+        return result
+
+
     def get_yield_data_from_china_bond(self, date_str: str) -> float:
-        """ 从chinabond中债信息网获取指定日期10年期国债到期收益率表格,参数date_str格式为yyyy-mm-dd """
+        """ 
+        - 从chinabond中债信息网获取指定日期10年期国债到期收益率表格,参数date_str格式为yyyy-mm-dd 
+        - 改用复用连接的session请求,用extract_10_year_yield直接提取10年期数值,不再逐日sleep和pd.read_html解析.(2026-10-19)
+        """
         
-        curve_value = 0
-
         url = "https://yield.chinabond.com.cn/cbweb-cbrc-web/cbrc/queryGjqxInfo"
         data = {
             'workTime': date_str,
             'locale': 'cn_ZH',
         }
-        time.sleep(0.05)
-        response = requests.post(url=url, headers=self.__headers_chinabond, data=data)
+        response = self.__chinabond_session.post(url=url, headers=self.__headers_chinabond, data=data)
+
+        return self.extract_10_year_yield(html=response.text)
+
+
+    @staticmethod
+    def extract_10_year_yield(html: str) -> float:
+        """ 
+        从中债信息网返回的收益率表格中提取10年期数值.
+        找到含有'10年'的表头行,记下其所在列,再取下一行同一列的数值.没有数据时返回0,与原pd.read_html方法一致.(2026-10-19)
+        """
+
+        curve_value = 0
+        rows = re.findall(r'<tr[^>]*>(.*?)</tr>', html, flags=re.S | re.I)
+        cells_list = [
+            [re.sub(r'<[^>]+>|&nbsp;|\s', '', cell) for cell in re.findall(r'<t[dh][^>]*>(.*?)</t[dh]>', row, flags=re.S | re.I)] 
+            for row in rows
+        ]
+
+        for index, cells in enumerate(cells_list[:-1]):
+            if '10年' in cells:
+                position = cells.index('10年')
+                try:
+                    curve_value = float(cells_list[index+1][position])
+                except (IndexError, ValueError):
+                    ...
+                break
 
-        try:
-            df_list = pd.read_html(io=response.text)
-            curve_value = float(df_list[0].loc[0, '10年'])
-        except KeyError:
-            ...
-        
         return curve_value
 
 
@@ -1159,33 +1294,21 @@ class StockData:
         stock_code = code + '.SH' if code.startswith('6') else code + '.SZ'
         update_list = [stock_code, stock_name, stock_class]
 
-        sql_file = os.path.join(self.__sql_path, 'roe.sql')
-        con = sqlite3.connect(INDICATOR_SQLITE3)
-        with con:
-            with open(sql_file, 'r') as f:
-                script = f.read()
-                con.executescript(script)  # 创建ROE表
-
-            # 获取2022年半年ROE数据，因本函数是2022年11月份完成的
-            result = self.download_financial_indicator_from_xueqiu(code=code, count=1, type='Q2')
-            for content in result['data']['list']:
-                update_list.append(content['avg_roe'][0])
-
-            # 获取10期ROE数据,如果在其他时间初始化数据库,下面6行代码需要修改。
-            result = self.download_financial_indicator_from_xueqiu(code=code, count=10, type='Q4')
-            for content in result['data']['list']:  # 遍历获取每年roe数据
-                update_list.append(content['avg_roe'][0])
-                
-            if len(update_list) < 14:
-                for index in range(14-len(update_list)):
-                    update_list.append(0)  # 如果不足14列数据，补齐至14列
-
-            sql = """ INSERT INTO 'roe-all-stocks' VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?)  """
-            try:
-                print(f'正在插入 {stock_code} - {stock_name} - {stock_class} ROE 数据......')
-                con.execute(sql, tuple(update_list))
-            except sqlite3.IntegrityError:  # 如果重复插入，略过
-                ...
+        # 数据写入roe-long长表,字段名取自雪球返回的报告名称,不再依赖建库的时间和固定的14列(2026-10-19)
+        rows = []
+
+        # 获取最近一期半年ROE数据
+        result = self.download_financial_indicator_from_xueqiu(code=code, count=1, type='Q2')
+        for content in result['data']['list']:
+            rows.append((stock_code, 'Y'+content['report_name'][0:4]+'Q2', content['avg_roe'][0]))
+
+        # 获取10期ROE数据
+        result = self.download_financial_indicator_from_xueqiu(code=code, count=10, type='Q4')
+        for content in result['data']['list']:  # 遍历获取每年roe数据
+            rows.append((stock_code, 'Y'+content['report_name'][0:4], content['avg_roe'][0]))
+
+        print(f'正在插入 {stock_code} - {stock_name} - {stock_class} ROE 数据......')
+        get_roe_store(INDICATOR_SQLITE3).upsert(rows=rows, stock_info=[tuple(update_list)])
 
 
     def init_roe_table_from_1991(self, code: str): 
@@ -1209,35 +1332,16 @@ class StockData:
         count_season = int(days/365*4)
         count_year = int(days/365)
         
-        # 打开数据库
-        sql_file = os.path.join(self.__sql_path, 'roe-from-1991.sql')
-        con = sqlite3.connect(INDICATOR_ROE_FROM_1991)
-        with con:
-            # 创建ROE表
-            with open(sql_file, 'r') as f:
-                script = f.read()
-                con.executescript(script)  
+        # 数据写入roe-long长表,字段名取自雪球返回的报告名称,不再补齐至35列(2026-10-19)
+        rows = []
+        result = self.download_financial_indicator_from_xueqiu(code=code, count=count_year, type='Q4')  # 覆盖全部
+        for content in result['data']['list']:  # 遍历获取每年roe数据
+            year = int(content['report_name'][0:4])
+            if year >= 1991:
+                rows.append((stock_code, 'Y'+str(year), content['avg_roe'][0]))
 
-            # 获取期间ROE数据,如果没有公布2022年度roe数据,则以0填充。如果在其他时间初始化数据库,下面10行代码需要修改
-            result = self.download_financial_indicator_from_xueqiu(code=code, count=count_year, type='Q4')  # 覆盖全部
-            if result['data']['last_report_name'] != '2022年报':
-                update_list.append(0.00)
-            for content in result['data']['list']:  # 遍历获取每年roe数据
-                update_list.append(content['avg_roe'][0])
-
-            if len(update_list) > 35:
-                update_list = update_list[0:35]
-
-            if len(update_list) < 35:  # 数据库初始表的列数
-                for index in range(35-len(update_list)):
-                    update_list.append(0)  # 如果不足35列数据，补齐至35列
-
-            sql = """ INSERT INTO 'roe-all-stocks-from-1991' VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)  """
-            try:
-                print(f'正在插入 {stock_code} - {stock_name} - {stock_class} ROE 数据......')
-                con.execute(sql, tuple(update_list))
-            except sqlite3.IntegrityError:  # 如果重复插入，略过
-                ...
+        print(f'正在插入 {stock_code} - {stock_name} - {stock_class} ROE 数据......')
+        get_roe_store(INDICATOR_ROE_FROM_1991).upsert(rows=rows, stock_info=[tuple(update_list)])
 
 
     def init_curve_value_table(self, days: int):
@@ -1245,33 +1349,56 @@ class StockData:
         获取10年期国债到期收益率插入yield-curve表中;
         插入的期间从昨天起向前推days天数.
         数据从2006-03-01开始.(2023-04-08)
+
+        - 原方法每个自然日请求一次,逐行在DataFrame顶部插入后再以to_sql(replace)重写整张表,回补多年数据需要数小时.
+        - 现只请求表中尚未包含的交易日,以date1为主键在一个事务中upsert新数据,未取得数值(返回0)的日期不写入,下次可以重新补取.(2026-10-19)
         """
 
         yesterday = datetime.date.today() + datetime.timedelta(days=-1)
         begin = yesterday + datetime.timedelta(days=-days)
-        date_list = pd.date_range(begin, yesterday)
-        date_str = [str(date)[0:10] for date in date_list]  # 生成日期序列
-
-        with ThreadPoolExecutor() as pool:
-            value_list = pool.map(self.get_yield_data_from_china_bond, date_str)
+        date_str = self.__trade_calendar.get_trading_days(begin=begin, end=yesterday)  # 生成交易日序列
 
         con = sqlite3.connect(CURVE_SQLITE3)
         with con:
             with open(os.path.join(self.__sql_path, 'yield-curve.sql'), 'r') as f:
                 script = f.read()
                 con.executescript(script)  # 创建yield-curve表格
+            self.__migrate_curve_table_to_primary_key(con=con)
 
-            sql = """select * from 'yield-curve' """
-            df = pd.read_sql_query(sql, con)
+            sql = """ SELECT date1 FROM 'yield-curve' WHERE date1>=? AND value1!=0 """
+            existed = {row[0] for row in con.execute(sql, (date_str[0] if date_str else str(yesterday),))}
+        date_str = [date for date in date_str if date not in existed]  # 只请求尚未包含的日期
 
-            for date, value in zip(date_str, value_list):  # 在第一行插入日期和值，遇重复日期，略过
-                df.loc[-1] = [date, value]
-                df.index += 1
-                df = df.sort_index()
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            value_list = list(pool.map(self.get_yield_data_from_china_bond, date_str))
 
-            # 删除重复行后保存数据
-            df.drop_duplicates(subset=['date1'], keep='last', inplace=True)
-            df.to_sql(name='yield-curve', con=con, index=False, if_exists='replace')
+        with con:  # 一个事务内upsert全部新数据
+            sql = """ 
+            INSERT INTO 'yield-curve' (date1, value1) VALUES (?, ?) 
+            ON CONFLICT(date1) DO UPDATE SET value1=excluded.value1 
+            """
+            con.executemany(sql, [(date, value) for date, value in zip(date_str, value_list) if value])
+        con.close()
+
+        refresh_yield_curve()  # 刷新已载入的收益率缓存
+
+
+    @staticmethod
+    def __migrate_curve_table_to_primary_key(con: sqlite3.Connection) -> None:
+        """ 
+        yield-curve表曾经由to_sql(replace)重建,date1失去了主键.如果没有主键,重建表并以date1为主键,
+        重复日期保留最后插入的记录,与原drop_duplicates(keep='last')一致.(2026-10-19)
+        """
+
+        columns = con.execute(""" PRAGMA table_info('yield-curve') """).fetchall()
+        if any(column[1] == 'date1' and column[5] for column in columns):
+            return
+
+        con.execute(""" DROP TABLE IF EXISTS 'yield-curve-new' """)  # 上次迁移中断时遗留的临时表
+        con.execute(""" CREATE TABLE 'yield-curve-new' (date1 TEXT NOT NULL PRIMARY KEY, value1 REAL DEFAULT 0) """)
+        con.execute(""" INSERT OR REPLACE INTO 'yield-curve-new' SELECT date1, value1 FROM 'yield-curve' ORDER BY rowid """)
+        con.execute(""" DROP TABLE 'yield-curve' """)
+        con.execute(""" ALTER TABLE 'yield-curve-new' RENAME TO 'yield-curve' """)
 
 
     def init_dividend_rate_table(self, code: str):
@@ -1415,13 +1542,13 @@ class StockData:
         stock_class = self.get_name_and_class_by_code(code=code)[1]
         trade_csv_path = os.path.join(self.__trade_record_path, f'{stock_class}')
         trade_csv_file = os.path.join(trade_csv_path, f'{code}.csv')
-        trade_record_df = pd.read_csv(trade_csv_file)
+        trade_record_df = read_trade_record(trade_csv_file, parse_dates=False)
 
-        # 预处理 删除空行 格式转换
-        trade_record_df = trade_record_df.dropna()
-        if trade_record_df['总市值'].dtype == 'object':
-            trade_record_df['总市值'].replace(to_replace='None', value='0', inplace=True)
-            trade_record_df['总市值'] = trade_record_df['总市值'].astype('float64')
+        # 预处理 删除空行 总市值缺失('None')记为0,读取时已是float64,不再需要格式转换(2026-10-19)
+        # 原来先dropna再把'None'替换为'0',本意是保留总市值缺失的行;pandas 2.0起'None'默认读作NaN,这些行会被dropna删除.
+        # 现在只按其他列删除空行,总市值缺失的行(含空白)保留并记为0,与原来的本意一致.
+        trade_record_df = trade_record_df.dropna(subset=[column for column in trade_record_df.columns if column != '总市值'])
+        trade_record_df['总市值'] = trade_record_df['总市值'].fillna(0.00)
 
         # 计算从1991-01-01至今天需要下载的期数
         today = datetime.datetime.now().today()
@@ -1535,14 +1662,13 @@ class StockData:
         self.add_dividend_rate_to_CSV(code=code, dividend=dividend_dict)
 
         # 保留需要的列,其余删除
-        standard_columns = ['日期', '股票代码', '名称', '总市值', 'PB', 'PE', 'PS', 'PC', 'DIVIDEND']
-        ndf = trade_record_df[standard_columns]
+        ndf = trade_record_df[TRADE_RECORD_COLUMNS].copy()
 
         # ['总市值', 'PB', 'PE', 'PS', 'PC', 'DIVIDEND'] 数字列保留两位小数
-        ndf[['总市值', 'PB', 'PE', 'PS', 'PC', 'DIVIDEND']] = ndf[['总市值', 'PB', 'PE', 'PS', 'PC', 'DIVIDEND']].round(2)
+        ndf[METRIC_COLUMNS] = ndf[METRIC_COLUMNS].round(2)
 
         # 保存文件
-        ndf.to_csv(trade_csv_file, index=False)
+        write_trade_record(ndf, trade_csv_file)
 
 
     def init_average_salary_to_table(self, code_year_args: Tuple[str, int]) -> None:
@@ -1594,6 +1720,62 @@ class StockData:
                 ...
 
 
+    def is_yesterday_trading_day(self) -> bool:
+        """ 
+        判断昨日是否为交易日.每日任务记录的是昨日数据,昨日休市(周末或法定节假日)时无需运行.
+        原来的isoweekday判断没有考虑法定节假日,改用交易日历.(2026-10-19)
+        """
+
+        yesterday = datetime.date.today() + datetime.timedelta(days=-1)
+
+        return self.__trade_calendar.is_trading_day(yesterday)
+
+
+    def reconcile_stock_list(self, new_list_path: str, executor: Union[BatchExecutor, None] = None) -> Dict:
+        """
+        申万股票清单更新后增量调整数据,不需要整体重建.(2026-10-19)
+        - 比较当前清单和新清单,移动行业变化股票的CSV文件、更新全部数据表中的行业和简称、归档退市股票的CSV文件和数据行,
+        详见StockListReconciler.
+        - 以新清单替换当前清单,原清单另存为sw-stock-list-yyyymmdd.xlsx.
+        - 新上市股票初始化ROE、PE-PB、总市值和股息率数据;交易记录CSV文件仍需由原始数据生成.
+        - 重算成分发生变化的行业的每日汇总.
+
+        :param new_list_path: 新清单文件的绝对路径.
+        :param executor: 初始化新上市股票使用的执行器,默认为线程模式.
+        :return: {'plan': 变化计划, 'moved': ..., 'archived': ..., 'updated_rows': ..., 'archived_rows': ..., 'initialized': ...}
+        """
+
+        reconciler = StockListReconciler(record_path=self.__trade_record_path, db_path=self.__data_package_path)
+        plan = reconciler.plan(old_list_path=self.__stock_list_path, new_list_path=new_list_path)
+        result = reconciler.apply(plan)
+
+        # 替换清单,之后get_name_and_class_by_code等方法使用新清单
+        if os.path.abspath(new_list_path) != os.path.abspath(self.__stock_list_path):
+            stamp = datetime.datetime.now().strftime('%Y%m%d')
+            shutil.copy(self.__stock_list_path, self.__stock_list_path.replace('.xlsx', f'-{stamp}.xlsx'))
+            shutil.copy(new_list_path, self.__stock_list_path)
+        self.__sw_stock_list = pd.read_excel(io=self.__stock_list_path)
+        shutdown_process_pools()  # 常驻进程中的实例仍使用原清单,关闭后下次使用时以新清单重建
+
+        # 初始化新上市股票
+        new_codes = [item[0] for item in plan['new']]
+        executor = executor or BatchExecutor(kind=IO_BOUND)
+        failed = set()
+        for method_name in ['init_roe_table', 'init_roe_table_from_1991', 'init_PE_PB_table', 'init_stock_total_value', 'init_dividend_rate_table']:
+            results = executor.map_method(self, method_name, new_codes)
+            failed.update(code for code, item in zip(new_codes, results) if isinstance(item, Exception))
+        result['initialized'] = len(new_codes) - len(failed)
+        refresh_roe_matrix()
+
+        # 重算成分变化的行业汇总
+        classes = [item for item in reconciler.get_affected_classes(plan) if os.path.isdir(os.path.join(self.__trade_record_path, item))]
+        if classes:
+            IndustryAggregate().update(stock_classes=classes, rebuild=True)
+        result['plan'] = plan
+
+        return result
+
+
     def search_IPO_date_from_sina(self, code: str) -> str:
         """ 从新浪获取公司上市日期, 返回yyyy-mm-dd型字符串 """
 
@@ -1647,7 +1829,7 @@ class StockData:
         """
 
         url = f"https://www.pushplus.plus/send?token={self.__pushplus_token}&title={title}&content={content}&template={template}"
-        requests.get(url=url)
+        self.__pushplus_session.get(url=url)
 
 
     def set_cookies_status_to_FALSE(self):
@@ -1749,7 +1931,7 @@ class StockData:
     def update_dividend_rate_table(self, code: str):
         """ 更新最新的现金分红率表 """
 
-        if datetime.datetime.now().isoweekday() in [1, 7]:  # 遇周六和七停止
+        if not self.is_yesterday_trading_day():  # 昨日休市则停止,不发出任何请求
             return
 
         dividend_rate = self.get_stock_dividend_rate_from_xueqiu(code=code)
@@ -1777,13 +1959,13 @@ class StockData:
         :param code: 股票代码, 不含后缀.(2023-04-28)
         """
 
-        if datetime.datetime.now().isoweekday() in [1, 7]:  # 遇周六和七停止
+        if not self.is_yesterday_trading_day():  # 昨日休市则停止,不发出任何请求
             return
 
         # 打开CSV文件,获取最新的PE PB数据(第一行昨日数据)
         stock_class = self.get_name_and_class_by_code(code=code)[1]
         csv_file = os.path.join(self.__trade_record_path, stock_class, f'{code}.csv')
-        csv_df = pd.read_csv(csv_file)
+        csv_df = read_trade_record(csv_file, usecols=['DIVIDEND'], nrows=1)
 
         dividend = csv_df.iloc[0]['DIVIDEND']
 
@@ -1805,7 +1987,7 @@ class StockData:
     def update_history_PB_table(self, code: str):
         """ 更新至最新的历史PB数据 """
 
-        if datetime.datetime.now().isoweekday() in [1, 7]:  # 遇周六和七停止
+        if not self.is_yesterday_trading_day():  # 昨日休市则停止,不发出任何请求
             return
 
         # 准备更新的数据
@@ -1816,7 +1998,7 @@ class StockData:
         
         # 打开数据库,更新已经准备好的数据
         sql_file = os.path.join(self.__sql_path, 'history-pb.sql')
-        con = sqlite3.connect(HISTORY_PB_SQLITE3)
+        con = sqlite3.connect(HISTORY_PB_SQLITE3, timeout=30)  # 在进程池中执行,多个进程同时写入时等待而不是报错(2026-10-19)
         with con:
             with open(sql_file, 'r') as file:
                 script = file.read()
@@ -1826,10 +2008,17 @@ class StockData:
             con.execute(sql, tuple(update_list))
 
 
+    def update_valuation_percentile(self, code: str) -> None:
+        """ 将交易记录CSV中新增的交易日并入PB/PE/PS/PC历史分位,在更新CSV之后执行(2026-10-19) """
+
+        stock_class = self.get_name_and_class_by_code(code=code)[1]
+        ValuationPercentile(record_path=self.__trade_record_path).update(code=code, stock_class=stock_class)
+
+
     def update_PE_PB_table(self, code: str):
         """ 更新至昨日pe和pb """
 
-        if datetime.datetime.now().isoweekday() in [1, 7]:  # 遇周六和七停止
+        if not self.is_yesterday_trading_day():  # 昨日休市则停止,不发出任何请求
             return
 
         # 准备更新的数据
@@ -1860,13 +2049,13 @@ class StockData:
         每日定期执行,从CSV文件中获取最新(昨日)PE PB数据.
         在执行该函数之前,首先应把CSV文件更新至最新数据(至昨日).(2023-04-28)
         """
-        if datetime.datetime.now().isoweekday() in [1, 7]:  # 遇周六和七停止
+        if not self.is_yesterday_trading_day():  # 昨日休市则停止,不发出任何请求
             return
 
         # 打开CSV文件,获取最新的PE PB数据(第一行昨日数据)
         stock_class = self.get_name_and_class_by_code(code=code)[1]
         csv_file = os.path.join(self.__trade_record_path, stock_class, f'{code}.csv')
-        csv_df = pd.read_csv(csv_file)
+        csv_df = read_trade_record(csv_file, usecols=['PB', 'PE'], nrows=1)
 
         pe = csv_df.iloc[0]['PE']
         pb = csv_df.iloc[0]['PB']
@@ -1886,6 +2075,15 @@ class StockData:
             con.execute(sql, tuple(update_list))
 
 
+    def update_price_table(self, code: str):
+        """ 增量更新本地日线价格存储至今天,code为不含后缀的股票代码或三个常用指数代码(2026-10-19) """
+
+        if not self.is_yesterday_trading_day():  # 昨日休市则停止,不发出任何请求
+            return
+
+        self.get_price_store().update(code=code)
+
+
     def update_roe_table(self, code: str):
         """ 
         将最新的年度或者半年ROE数据插入roe_all_stocks表,三个月检查更新一次
@@ -1905,42 +2103,14 @@ class StockData:
         elif '三季报' in last_report_name or '中报' in last_report_name:
             last_filed = 'Y'+last_report_name[:4]+'Q2'
         
-        # 获取roe-all-stocks 表字段中最新的时间
-        con = sqlite3.connect(INDICATOR_SQLITE3)
-        with con:
-            sql = """ SELECT * FROM 'roe-all-stocks' """
-            df = pd.read_sql_query(sql, con)
-
-            # 取出columns分为Q2和Q4两部分,按照降序排列(2023-04-24)
-            q2_col = [item for item in df.columns[3:] if 'Q2' in item]
-            q4_col = [item for item in df.columns[3:] if 'Q2' not in item]
-            q2_col.sort(reverse=True)
-            q4_col.sort(reverse=True)
-
-            # 比较数据库字段和最新的报表时间的年份,判断是否需要插入新的字段(2023-04-24)
-            if 'Q2' in last_filed:
-                contain_last_report = False if (int(last_filed[1:5]) > int(q2_col[0][1:5])) else True
-            else:
-                contain_last_report = False if (int(last_filed[1:5]) > int(q4_col[0][1:5])) else True
-
-            # 插入新的字段
-            if not contain_last_report:
-                df.insert(loc=3, column=last_filed, value=0.00)
-                df.to_sql(name='roe-all-stocks', con=con, if_exists='replace', index=False)
-
-            # 下载更新数据
-            if 'Q2' in last_filed:
-                tmp = self.download_financial_indicator_from_xueqiu(code=code, count=1, type='Q2')
-            else:  # 'Q2' not in last_filed 年度数据上面已经下载过了
-                ...
-                # tmp = self.download_financial_indicator_from_xueqiu(code=code, count=1, type='Q4')
-            last_roe = tmp['data']['list'][0]['avg_roe'][0]
-            stock_code = code + '.SH' if code.startswith('6') else code + '.SZ'
-            sql = f""" UPDATE 'roe-all-stocks' SET {last_filed}=? WHERE stockcode=? """
-            try:
-                con.execute(sql, (last_roe, stock_code))
-            except sqlite3.IntegrityError:
-                ...
+        # 新报告期直接插入roe-long长表,不再读出整表插入新列后重写(2026-10-19)
+        if 'Q2' in last_filed:
+            tmp = self.download_financial_indicator_from_xueqiu(code=code, count=1, type='Q2')
+        else:  # 'Q2' not in last_filed 年度数据上面已经下载过了
+            ...
+        last_roe = tmp['data']['list'][0]['avg_roe'][0]
+        stock_code = code + '.SH' if code.startswith('6') else code + '.SZ'
+        get_roe_store(INDICATOR_SQLITE3).upsert(rows=[(stock_code, last_filed, last_roe)])
 
 
     def update_roe_table_from_1991(self, code: str):
@@ -1955,26 +2125,11 @@ class StockData:
         else:  # '年报' in last_report_name:
             last_filed = 'Y'+last_report_name[:4]
 
-        # 获取roe-all-stocks-from-1991 表字段中最新的时间
-        con = sqlite3.connect(INDICATOR_ROE_FROM_1991)
-        with con:
-            sql = """ SELECT * FROM 'roe-all-stocks-from-1991' """
-            df = pd.read_sql_query(sql, con)
-
-            # 如果roe-all-stocks-from-1991 表中未包含最近一期的年度数据,则插入新列
-            contain_last_report = False if (last_filed not in df.columns) else True
-            if not contain_last_report:
-                df.insert(loc=3, column=last_filed, value=0.00)  # 在第四列插入
-                df.to_sql(name='roe-all-stocks-from-1991', con=con, if_exists='replace', index=False)
-
-            # 更新数据
-            last_roe = tmp['data']['list'][0]['avg_roe'][0]
-            stock_code = code + '.SH' if code.startswith('6') else code + '.SZ'
-            sql = f""" UPDATE 'roe-all-stocks-from-1991' SET {last_filed}=? WHERE stockcode=? """
-            try:
-                con.execute(sql, (last_roe, stock_code))
-            except sqlite3.IntegrityError:
-                ...
+        # 新报告期直接插入roe-long长表,不再读出整表插入新列后重写(2026-10-19)
+        last_roe = tmp['data']['list'][0]['avg_roe'][0]
+        stock_code = code + '.SH' if code.startswith('6') else code + '.SZ'
+        get_roe_store(INDICATOR_ROE_FROM_1991).upsert(rows=[(stock_code, last_filed, last_roe)])
+
 
     @staticmethod
     def update_roe_table_1991_copy_from_2012() -> Union[None, str]:
@@ -1985,47 +2140,22 @@ class StockData:
         这种思路是为了节约下载资源,直接从indicator数据库中整体复制数据,快的飞起.
 
         - 本函数按照以下步骤更新indicator_roe_from_1991数据库:
-        - 检查indicator_roe_from_1991数据库中是否已经包含最新的年度数据(上年数),如果没有,则插入新列.
-        - 检查indicator数据库是否bao含最新的年度数据(上年数),如果没有,则报错退出.
-        - 从indicator数据库中逐条复制最新的ROE值到indicator_roe_from_1991数据库对应的股票中.
-        - 保存更新后的indicator_roe_from_1991数据库.
+        - 检查indicator数据库是否包含最新的年度数据(上年数),如果没有,则报错退出.
+        - ATTACH indicator数据库,以一条INSERT...SELECT...ON CONFLICT语句复制最新年度的ROE值,只涉及这一个年度.
+        indicator数据库中有而indicator_roe_from_1991数据库中没有的股票一并加入;反之该年度记为0.
+        原来逐行在DataFrame中筛选股票(全市场规模的平方次比较),再整体重写数据库,缺失的股票还会出错.(2026-10-19)
 
         :return: None or str, None表示更新成功, str表示更新失败(indicator数据库没有最新年度数据).(2023-04-26)
         """
 
-        # 获取indicator_roe_from_1991数据库中最新的年度数据
         last_year_int = datetime.datetime.now().year - 1  # 上年数
-        con_1991 = sqlite3.connect(INDICATOR_ROE_FROM_1991)
-        with con_1991:
-            sql = """ SELECT * FROM 'roe-all-stocks-from-1991' """
-            df_1991 = pd.read_sql_query(sql, con_1991)
-            last_year_in_1991 = [item for item in df_1991.columns if 'stock' not in item][0]  # 最新的年度列名,如'Y2022'
-
-            # 如果roe-all-stocks-from-1991 表中未包含最近一期的年度数据,则插入新列
-            contain_last_year_in_1991 = False if last_year_int != int(last_year_in_1991[1:]) else True
-            if not contain_last_year_in_1991:
-                df_1991.insert(loc=3, column='Y'+str(last_year_int), value=0.00)  # 在第四列插入
-
-        # 获取indicator数据库中最新的年度数据
-        con_2012 = sqlite3.connect(INDICATOR_SQLITE3)
-        with con_2012:
-            sql = """ SELECT * FROM 'roe-all-stocks' """
-            df_2012 = pd.read_sql_query(sql, con_2012)
-            last_year_in_2012 = [item for item in df_2012.columns if 'stock' not in item and 'Q2' not in item][0]  # 最新的年度列名,如'Y2022'
-
-            # 如果roe-all-stocks 表中未包含最近一期的年度数据,则报错返回
-            contain_last_year_in_2012 = False if last_year_int != int(last_year_in_2012[1:]) else True
-            if not contain_last_year_in_2012:
-                return 'indicator数据库中未包含最新的年度数据{last_year_int},请先更新indicator数据库.'
-
-        # 遍历df_1991,以stock_code为纽带,从df_2012中复制最新的ROE值到df_1991中
-        for index, stock_code in enumerate(df_1991['stockcode']):
-            last_roe = df_2012[df_2012['stockcode'] == stock_code][last_year_in_2012].values[0]
-            df_1991.loc[index, last_year_in_1991] = last_roe
-
-        # 保存更新后的indicator_roe_from_1991数据库
-        with con_1991:
-            df_1991.to_sql(name='roe-all-stocks-from-1991', con=con_1991, if_exists='replace', index=False)
+        last_year_filed = 'Y'+str(last_year_int)
+
+        # 如果roe-all-stocks 表中未包含最近一期的年度数据,则报错返回
+        if not get_roe_store(INDICATOR_SQLITE3).has_period(period=last_year_filed):
+            return f'indicator数据库中未包含最新的年度数据{last_year_int},请先更新indicator数据库.'
+
+        get_roe_store(INDICATOR_ROE_FROM_1991).copy_period_from(source_db=INDICATOR_SQLITE3, period=last_year_filed)
 
         
     def update_trade_record_cvs(self, code: str):
@@ -2034,10 +2164,11 @@ class StockData:
         现网站改版无法下载,采用在原下载交易文件基础上每日更新的方式
 
         今日增加了DIVIDEND信息更新内容.(2023-04-23)
+        - 昨日休市或已有昨日数据时不做任何修改,返回'skipped',供BatchJournal记录;更新完成返回None.(2026-10-19)
         """
 
-        if datetime.datetime.now().isoweekday() in [1, 7]:  # 遇周六和七停止
-            return
+        if not self.is_yesterday_trading_day():  # 昨日休市则停止,不发出任何请求
+            return 'skipped'
 
         # 准备插入信息
         yestoday_date = datetime.date.today() + datetime.timedelta(days=-1)
@@ -2055,37 +2186,40 @@ class StockData:
         # 打开原交易数据文件
         trade_csv_path = os.path.join(self.__trade_record_path, f'{stock_class}')
         trade_csv_file = os.path.join(trade_csv_path, f'{code}.csv')
-        df = pd.read_csv(trade_csv_file)
+        df = read_trade_record(trade_csv_file, parse_dates=False)
         df = df.dropna()  # 删除含空的行
         columns = df.columns
 
-        # 插入最新数据
+        # 插入最新数据,已有昨日数据时返回'skipped',供BatchJournal记录
         if yestoday_str != df.iloc[0, 0]:
             df = pd.DataFrame(np.insert(df.values, 0, values=insert_value, axis=0)) # 第一行插入
             df.columns = columns
-            df.to_csv(path_or_buf=trade_csv_file, index=False)
+            write_trade_record(df, trade_csv_file)
+        else:
+            return 'skipped'
 
     def update_trade_record_cvs_at_date_row(self, code: str, date: str):
         """ 
         更新指定日期date所在行的 总市值 PE PB PS PC......(2023-04-04)
         +++++++++++++++++++++++++++++++++++++++++++++++++++++
         今日增加了DIVIDEND信息更新内容.(2023-04-23)
+        - 昨日休市、日期格式错误或文件中没有该日期时不做任何修改,返回'skipped';更新完成返回None.(2026-10-19)
         """
 
-        if datetime.datetime.now().isoweekday() in [1, 7]:  # 上一天为周六和七则停止
-            return
+        if not self.is_yesterday_trading_day():  # 昨日休市则停止,不发出任何请求
+            return 'skipped'
         # 检查参数
         date_regex = re.compile(r"^\d{4}-\d{2}-\d{2}$")
         if not date_regex.match(date):
-            return
+            return 'skipped'
 
         # 打开原交易数据文件定位到行
         stock_class = self.get_name_and_class_by_code(code=code)[1]
         trade_csv_file = os.path.join(self.__trade_record_path, stock_class, f'{code}.csv')
-        df = pd.read_csv(trade_csv_file)
+        df = read_trade_record(trade_csv_file, parse_dates=False)
 
         if date not in df['日期'].values.tolist():
-            return
+            return 'skipped'
         
         condition = (df['日期'] == date)
         row_index = df[condition].index[0]
@@ -2098,13 +2232,13 @@ class StockData:
         df.loc[row_index, 'PC'] = self.get_stock_PC_from_xueqiu_and_sina(code)
         df.loc[row_index, 'DIVIDEND'] = self.get_stock_dividend_rate_from_xueqiu(code)
         
-        df.to_csv(path_or_buf=trade_csv_file, index=False)
+        write_trade_record(df, trade_csv_file)
 
 
     def update_total_value(self, code: str):
         """ 更新股票总市值至昨日最新数据 """
 
-        if datetime.datetime.now().isoweekday() in [1, 7]:  # 遇周六和七停止
+        if not self.is_yesterday_trading_day():  # 昨日休市则停止,不发出任何请求
             return
 
         random.uniform(0.01, 0.15)
@@ -2124,6 +2258,68 @@ class StockData:
             con.execute(sql, update_list)
 
 
+    def extract_latest_values_from_CSV(self, code: str) -> Tuple:
+        """ 
+        读取一次CSV文件,返回(stockcode, 总市值, PE, PB, DIVIDEND, maxPB, minPB, meanPB),
+        前四项取自第一行(昨日数据),后三项与calculate_MAX_MIN_MEAN_pb相同.供update_post_CSV_tables使用.(2026-10-19)
+        """
+
+        stock_class = self.get_name_and_class_by_code(code=code)[1]
+        csv_file = os.path.join(self.__trade_record_path, stock_class, f'{code}.csv')
+        csv_df = read_trade_record(csv_file, usecols=['总市值', 'PB', 'PE', 'DIVIDEND'])
+
+        latest = csv_df.iloc[0]
+        pb = csv_df['PB']
+        stock_code = code + '.SH' if code.startswith('6') else code + '.SZ'
+
+        return (stock_code, float(latest['总市值']), float(latest['PE']), float(latest['PB']), float(latest['DIVIDEND']),
+                round(float(pb.max()), 2), round(float(pb.min()), 2), round(float(pb.mean()), 2))
+
+
+    def update_post_CSV_tables(self, code_list: List[str], executor: Union[BatchExecutor, None] = None) -> Dict[str, int]:
+        """ 
+        - 合并UPDATE-PE-PB、UPDATE-DIVIDEND-RATE、UPDATE-TVALUE和UPDATE-HISTORY-PB四个命令.原来每个命令都要打开全部CSV文件,
+        每只股票的文件被解析四次,每只股票每个数据库还要各打开一次连接.
+        - 本方法对每只股票只读取一次CSV文件(只解析需要的列),然后每个数据库在一个事务中批量写入全部股票.
+        在执行该方法之前,首先应把CSV文件更新至最新数据(至昨日).(2026-10-19)
+
+        :param code_list: 股票代码列表,不含后缀.
+        :param executor: 读取CSV使用的BatchExecutor,默认为进程池.
+        :return: {数据库: 写入的行数},另有'failed'为读取出错的代码个数.
+        """
+
+        if not self.is_yesterday_trading_day():  # 昨日休市则停止
+            return {}
+
+        executor = executor if executor is not None else BatchExecutor(kind=CPU_BOUND)
+        results = executor.map_method(self, 'extract_latest_values_from_CSV', code_list)
+        rows = [result for result in results if not isinstance(result, Exception)]
+
+        targets = [
+            (PE_PB_SQLITE3, 'price-indicator.sql', """ UPDATE 'pe-pb' SET pe=?, pb=? WHERE stockcode=? """, 
+             [(row[2], row[3], row[0]) for row in rows]),
+            (TVALUE_SQLITE3, 'total-value.sql', """ UPDATE 'total-value' SET tvalue=? WHERE stockcode=? """, 
+             [(row[1], row[0]) for row in rows]),
+            (DIVIDEND_RATE_SQLITE3, 'dividend-rate.sql', """ UPDATE 'dividend-rate' SET rate=? WHERE stockcode=? """, 
+             [(row[4], row[0]) for row in rows]),
+            (HISTORY_PB_SQLITE3, 'history-pb.sql', """ UPDATE 'history-pb' SET maxPB=?, minPB=?, meanPB=? WHERE stockcode=? """, 
+             [(row[5], row[6], row[7], row[0]) for row in rows]),
+        ]
+        summary = {}
+        for db_path, sql_name, sql, params in targets:
+            with get_metrics().stage(f'write-{os.path.basename(db_path)}'):
+                con = sqlite3.connect(db_path, timeout=30)
+                with open(os.path.join(self.__sql_path, sql_name), 'r') as file:
+                    con.executescript(file.read())  # 创建表
+                with con:
+                    con.executemany(sql, params)
+                con.close()
+            summary[os.path.basename(db_path)] = len(params)
+        summary['failed'] = len(results) - len(rows)
+
+        return summary
+
+
     def update_total_value_copy_from_CSV(self, code: str):
         """ 
         为了减少重复下载,节约网络资源,从CSV文件中拷贝更新total-value表.
@@ -2133,13 +2329,13 @@ class StockData:
         :param code: 股票代码, 不含后缀.(2023-04-28)
         """
 
-        if datetime.datetime.now().isoweekday() in [1, 7]:  # 遇周六和七停止
+        if not self.is_yesterday_trading_day():  # 昨日休市则停止,不发出任何请求
             return
 
         # 打开CSV文件,获取最新的PE PB数据(第一行昨日数据)
         stock_class = self.get_name_and_class_by_code(code=code)[1]
         csv_file = os.path.join(self.__trade_record_path, stock_class, f'{code}.csv')
-        csv_df = pd.read_csv(csv_file)
+        csv_df = read_trade_record(csv_file, usecols=['总市值'], nrows=1)
 
         total_value = csv_df.iloc[0]['总市值']
 
@@ -2169,112 +2365,209 @@ if __name__ == "__main__":
         for code in stock_list:
             all_stock_list.append(code)
 
+    # 下载和读写数据库使用线程池,逐只股票的pandas处理使用进程池(2026-10-19)
+    io_executor = BatchExecutor(kind=IO_BOUND)
+    cpu_executor = BatchExecutor(kind=CPU_BOUND)
+
+    # 本地只读查询服务,Serve命令启动后在后台运行(2026-10-19)
+    query_service: Union[QueryService, None] = None
+
+    msg, command_start = '', None
     while True:
+        # 上一条命令结束,记录命令耗时并在tmp-file下导出metrics.json和metrics.prom(2026-10-19)
+        if command_start is not None and msg:
+            get_metrics().record_stage(name=msg.upper(), seconds=time.perf_counter() - command_start)
+            get_metrics().export()
+            if PROFILE_MODE:  # 开启性能分析时(STOCK_DATA_PROFILE或--profile)写出方法统计(2026-10-19)
+                get_profiler().stop_command(name=msg)
 
         print('-------------------------操作提示---------------------------' )
         print('Init-Trade-CSV     Update-PE-PB        Update-Dividend-Rate' )
         print('Update-TValue      Update-ROE-Table    Update-ROE-Table-1991')
         print('Update-Curve       Update-History-PB   Update-Trade-CSV'     )
-        print('Check-Fix-CSV                          Quit'                 )
+        print('Check-Fix-CSV      Update-Price        Update-Percentile'    )
+        print('Update-Industry    Update-Post-CSV     Compact-Trade-CSV'    )
+        print('Backup             Restore-Stock       Restore-DB'           )
+        print('Reconcile-List     Scan-Manifest       Backfill-Trade-CSV'   )
+        print('Serve              Quit'                                     )
+        print('Init-Trade-CSV/Update-Trade-CSV/Update-ROE-Table 可附加 --resume 或 --retry-failures')
+        print('Restore-Stock 代码 [快照]  Restore-DB 数据库文件名 [快照]  Reconcile-List 新清单路径  Serve [端口]')
         print('-----------------------------------------------------------' )
 
-        msg = input('>>>> 请选择操作提示 >>>>  ')
+        # 命令后可附加--resume(继续上次未完成的运行)或--retry-failures(只重新运行上次出错的代码)(2026-10-19)
+        tokens = input('>>>> 请选择操作提示 >>>>  ').split()
+        msg = tokens[0] if tokens else ''
+        command_start = time.perf_counter()
+        if PROFILE_MODE and msg:
+            get_profiler().start_command()
+        resume, retry_failures = '--resume' in tokens[1:], '--retry-failures' in tokens[1:]
 
         if msg.upper() == 'INIT-TRADE-CSV':  # 初始化然后调整全部CSV文件
-            error_code = []
-            print('正在初始化历史交易记录文件......')
-            classes = case.get_stock_classes()
-            for clas in classes:
-                code_name_class = case.get_stocks_of_specific_class(clas)
-                for code in code_name_class:
-                    try:
-                        case.init_trade_record_form_IPO(code[0][0:6])
-                        time.sleep(random.uniform(0.05, 0.1))
-                    except:
-                        error_code.append(code[0][0:6])
+            journal = BatchJournal(command=msg)
+            code_list = journal.start(all_stock_list, resume=resume, retry_failures=retry_failures)
+            print(f'正在初始化历史交易记录文件,本次处理{len(code_list)}个代码......')
+            # 初始化要从同花顺和雪球下载数据,在本进程的线程池中运行,各网站的并发数由HostLimitedAdapter统一限制
+            io_executor.map_method(case, 'init_trade_record_form_IPO', code_list, on_result=journal.record)
+            error_code = journal.get_codes(status=BatchJournal.FAILED)
             print(f'历史交易记录文件已经初始化完成,错误代码为{error_code}')
         
         elif msg.upper() == 'UPDATE-TRADE-CSV':
-            print('正在更新历史交易记录文件......')
-            stock_classes = case.get_stock_classes()
-            for clas in stock_classes:
-                tmp = case.get_stocks_of_specific_class(clas)
-                code_list = [item[0][:6] for item in tmp]
-                with ThreadPoolExecutor() as pool:
-                    pool.map(case.update_trade_record_cvs, code_list)
-            print(f'历史交易记录文件已经更新完成.')
+            if not case.is_yesterday_trading_day():
+                print('昨日休市,无需更新.')
+                continue
+            journal = BatchJournal(command=msg)
+            code_list = journal.start(all_stock_list, resume=resume, retry_failures=retry_failures)
+            print(f'正在更新历史交易记录文件,本次处理{len(code_list)}个代码......')
+            io_executor.map_method(case, 'update_trade_record_cvs', code_list, on_result=journal.record)
+            print(f'历史交易记录文件已经更新完成,{journal.summary()}')
+
+        elif msg.upper() == 'UPDATE-POST-CSV':
+            if not case.is_yesterday_trading_day():
+                print('昨日休市,无需更新.')
+                continue
+            print('正在读取CSV历史交易记录文件,一次更新pe-pb、total-value、dividend-rate和history-pb表......')
+            print(f'更新完成,{case.update_post_CSV_tables(all_stock_list, executor=cpu_executor)}')
 
         elif msg.upper() == 'UPDATE-PE-PB':
+            if not case.is_yesterday_trading_day():
+                print('昨日休市,无需更新.')
+                continue
             print('正在从CSV历史交易记录文件中copy update PE PB 表......')
-            stock_classes = case.get_stock_classes()
-            for clas in stock_classes:
-                tmp = case.get_stocks_of_specific_class(clas)
-                code_list = [item[0][:6] for item in tmp]
-                with ThreadPoolExecutor() as pool:
-                    pool.map(case.update_PE_PB_table_copy_from_CSV, code_list)
+            io_executor.map_method(case, 'update_PE_PB_table_copy_from_CSV', all_stock_list)
             print(f'PE PB 表已经更新完成.')
 
         elif msg.upper() == 'UPDATE-DIVIDEND-RATE':
+            if not case.is_yesterday_trading_day():
+                print('昨日休市,无需更新.')
+                continue
             print('正在从CSV历史交易记录文件中copy update DIVIDEND RATE 表......')
-            stock_classes = case.get_stock_classes()
-            for clas in stock_classes:
-                tmp = case.get_stocks_of_specific_class(clas)
-                code_list = [item[0][:6] for item in tmp]
-                with ThreadPoolExecutor() as pool:
-                    pool.map(case.update_dividend_rate_table_copy_from_CSV, code_list)
+            io_executor.map_method(case, 'update_dividend_rate_table_copy_from_CSV', all_stock_list)
             print(f'分红率表已经更新完成.')
 
         elif msg.upper() == 'UPDATE-TVALUE':
+            if not case.is_yesterday_trading_day():
+                print('昨日休市,无需更新.')
+                continue
             print('从CSV历史交易记录文件中copy update总市值表......')
-            stock_classes = case.get_stock_classes()
-            for clas in stock_classes:
-                tmp = case.get_stocks_of_specific_class(clas)
-                code_list = [item[0][:6] for item in tmp]
-                with ThreadPoolExecutor() as pool:
-                    pool.map(case.update_total_value_copy_from_CSV, code_list)
+            io_executor.map_method(case, 'update_total_value_copy_from_CSV', all_stock_list)
             print(f'总市值表已经更新完成.')
             
         elif msg.upper() == 'UPDATE-ROE-TABLE':
             print('正在更新2012以来年度ROE数据库,请稍等......')
-            con = sqlite3.connect(INDICATOR_SQLITE3)
-            with con:
-                # 读取数据
-                df = pd.read_sql('select * from "roe-all-stocks"', con)
-                df.fillna(0, inplace=True)
-                df_col = [col for col in df.columns if 'stock' not in col]
-                df_col.sort(reverse=True)  # 降序排列,排序后年份越大越靠前,且Y2022Q2在Y2022前面
-                # 获取最新的字段
-                if df_col[1] in df_col[0]:  
-                    last_filed = df_col[1]  # 如果Y2022Q2在Y2022前面,则Y2022Q2为最新字段
-                else:
-                    last_filed = df_col[0]  # 否则Y2022为最新字段
-                # 查询数据库中last_filed字段为0的股票代码,并下载数据.
-                code_list_tmp = df[df[last_filed] == 0]['stockcode'].tolist()  # 含有后缀的股票代码
-                code_list = [item[0:6] for item in code_list_tmp]
-                print(f'需要更新的股票代码个数为{len(code_list)}')
-                with ThreadPoolExecutor() as pool:
-                    pool.map(case.update_roe_table, code_list)
-                # 清洗数据,将null值替换为0后保存到数据库中
-                df = pd.read_sql('select * from "roe-all-stocks"', con)
-                df.fillna(0, inplace=True)
-                df.to_sql('roe-all-stocks', con, if_exists='replace', index=False)
-                print(f'更新完成.')
+            # 获取最新的字段:年份最大者,同一年份年度字段Y2022优先于半年字段Y2022Q2
+            store = get_roe_store(INDICATOR_SQLITE3)
+            periods = [period for period in store.get_periods() if ROEMatrix.parse_period(period) is not None]
+            last_filed = max(periods, key=ROEMatrix.parse_period)
+            # 查询last_filed报告期为0或缺失的股票代码,并下载数据.
+            code_list_tmp = store.get_zero_codes(period=last_filed)  # 含有后缀的股票代码
+            journal = BatchJournal(command=msg)
+            code_list = journal.start([item[0:6] for item in code_list_tmp], resume=resume, retry_failures=retry_failures)
+            print(f'需要更新的股票代码个数为{len(code_list)}')
+            io_executor.map_method(case, 'update_roe_table', code_list, on_result=journal.record)
+            print(f'{journal.summary()}')
+            # 清洗数据,将null值替换为0
+            store.fill_null_with_zero()
+            refresh_roe_matrix()
+            print(f'更新完成.')
 
         elif msg.upper() == 'UPDATE-ROE-TABLE-1991':
             print('正在从indicator.sqlite3数据库复制最新年度ROE数据,请稍等......')
             case.update_roe_table_1991_copy_from_2012()
+            refresh_roe_matrix()
             print(f'更新完成.')
         
         elif msg.upper() == 'UPDATE-HISTORY-PB':
+            if not case.is_yesterday_trading_day():
+                print('昨日休市,无需更新.')
+                continue
             print('正在更新history-pb数据库,请稍等......')
-            stock_classes = case.get_stock_classes()
-            for clas in stock_classes:
-                tmp = case.get_stocks_of_specific_class(clas)
-                code_list = [item[0][:6] for item in tmp]
-                with ThreadPoolExecutor() as pool:
-                    pool.map(case.update_history_PB_table, code_list)
+            cpu_executor.map_method(case, 'update_history_PB_table', all_stock_list)
+            print(f'更新完成.')
+
+        elif msg.upper() == 'UPDATE-PRICE':
+            if not case.is_yesterday_trading_day():
+                print('昨日休市,无需更新.')
+                continue
+            print('正在增量更新本地日线价格数据库,请稍等......')
+            io_executor.map_method(case, 'update_price_table', all_stock_list + PriceStore.INDEX_CODES)
+            print(f'更新完成.')
+
+        elif msg.upper() == 'UPDATE-PERCENTILE':
+            print('正在更新历史估值分位,请稍等......')
+            cpu_executor.map_method(case, 'update_valuation_percentile', all_stock_list)
             print(f'更新完成.')
 
+        elif msg.upper() == 'UPDATE-INDUSTRY':
+            print('正在计算申万一级行业每日汇总,请稍等......')
+            result = IndustryAggregate().update()
+            print(f'更新完成,共写入{sum(result.values())}行.')
+
+        elif msg.upper() == 'COMPACT-TRADE-CSV':  # 由CSV生成紧凑格式的交易记录(2026-10-19)
+            print('正在生成紧凑格式交易记录,请稍等......')
+            store = CompactRecordStore()
+            tasks = [(os.path.join(trade_record_path, case.get_name_and_class_by_code(code=code)[1], f'{code}.csv'), store.get_file(code))
+                     for code in all_stock_list]
+            results = cpu_executor.map(compact_trade_record, tasks)
+            sizes = [result for result in results if not isinstance(result, Exception)]
+            print(f'完成{len(sizes)}只,CSV共{sum(item[0] for item in sizes)/2**20:.1f}MB,'
+                  f'紧凑格式共{sum(item[1] for item in sizes)/2**20:.1f}MB,失败{len(results)-len(sizes)}只.')
+
+        elif msg.upper() == 'BACKUP':  # 增量快照备份trade-record和data-package(2026-10-19)
+            print('正在建立快照备份,请稍等......')
+            result = SnapshotBackup().create()
+            print(f'备份完成,共{result["files"]}个文件,其中{result["changed"]}个有变化,新增{result["new_chunks"]}块'
+                  f'({result["new_bytes"]/2**20:.1f}MB).')
+
+        elif msg.upper() in ['RESTORE-STOCK', 'RESTORE-DB']:
+            if len(tokens) < 2:
+                print('请在命令后输入股票代码或数据库文件名.')
+                continue
+            snapshot = tokens[2] if len(tokens) > 2 else None
+            try:
+                if msg.upper() == 'RESTORE-STOCK':
+                    target = SnapshotBackup().restore_stock(code=tokens[1], snapshot=snapshot)
+                else:
+                    target = SnapshotBackup().restore_database(name=tokens[1], snapshot=snapshot)
+                print(f'{target}恢复完成.')
+            except (FileNotFoundError, ValueError) as error:
+                print(error)
+
+        elif msg.upper() == 'RECONCILE-LIST':  # 申万股票清单变化后增量调整(2026-10-19)
+            if len(tokens) < 2 or not os.path.exists(tokens[1]):
+                print('请在命令后输入新清单文件的路径.')
+                continue
+            print('正在比较新旧清单并调整数据,请稍等......')
+            result = case.reconcile_stock_list(new_list_path=tokens[1], executor=io_executor)
+            plan = result['plan']
+            print(f'新上市{len(plan["new"])}只(初始化{result["initialized"]}只),退市{len(plan["delisted"])}只,'
+                  f'行业变化{len(plan["reclassified"])}只,简称变化{len(plan["renamed"])}只.')
+            print(f'移动CSV文件{result["moved"]}个,归档{result["archived"]}个,更新数据行{result["updated_rows"]}行,'
+                  f'归档数据行{result["archived_rows"]}行.')
+            all_stock_list = [item[0][0:6] for clas in case.get_stock_classes() for item in case.get_stocks_of_specific_class(clas)]
+
+        elif msg.upper() == 'SCAN-MANIFEST':  # 登记交易记录数据清单并报告未更新至最新日期的股票(2026-10-19)
+            print('正在扫描交易记录文件,请稍等......')
+            result = get_manifest().scan()
+            stale = get_manifest().get_stale()
+            print(f'共{result["files"]}个文件,重新登记{result["updated"]}个,删除{result["removed"]}个.')
+            print(f'最新日期{get_manifest().get_latest_date()},未更新至该日期的股票{len(stale)}只: {" ".join(stale[:20])}')
+
+        elif msg.upper() == 'BACKFILL-TRADE-CSV':  # 按交易日历补全交易记录CSV文件的缺口(2026-10-19)
+            print('正在检查交易记录缺口并补全,请稍等......')
+            results = io_executor.map_method(case, 'backfill_trade_record', all_stock_list)
+            filled = {code: item for code, item in zip(all_stock_list, results) if isinstance(item, int) and item}
+            error_code = [code for code, item in zip(all_stock_list, results) if isinstance(item, Exception)]
+            print(f'补全{len(filled)}只股票共{sum(filled.values())}行.')
+            if error_code:
+                print('补全失败的代码集合为:', error_code)
+
+        elif msg.upper() == 'SERVE':  # 在后台启动本地只读查询服务,数据更新后自动重新载入(2026-10-19)
+            if query_service is None:
+                print('正在载入查询服务数据,请稍等......')
+                query_service = QueryService(port=int(tokens[1])) if len(tokens) > 1 else QueryService()
+                query_service.start()
+            print(f'查询服务运行于{query_service.get_address()}.')
+
         elif msg.upper() == 'UPDATE-CURVE':
             print('正在更新国债收益率数据库,请稍等......')
             case.update_curve_value_table()
@@ -2282,29 +2575,25 @@ if __name__ == "__main__":
             
         elif msg.upper() == 'CHECK-FIX-CSV':
             print('正在检查交易记录文件格式,请稍等......')
-            error_code = []
-            other_code = []
-            for code in all_stock_list:
-                try:
-                    if case.check_trade_record_csv(code) != 'ok':
-                        error_code.append(code)
-                except:
-                    other_code.append(code)
+            results = cpu_executor.map_method(case, 'check_trade_record_csv', all_stock_list)
+            error_code = [code for code, result in zip(all_stock_list, results) if not isinstance(result, Exception) and result != 'ok']
+            other_code = [code for code, result in zip(all_stock_list, results) if isinstance(result, Exception)]
             if error_code + other_code:
                 print('格式错误的代码集合为:', error_code)
                 print('其他错误的代码集合为:', other_code)
                 print('正在尝试修复错误......')
-                no_fix_code = []
-                for code in error_code + other_code:
-                    try:
-                        case.init_trade_record_form_IPO(code)
-                    except:
-                        no_fix_code.append(code)
+                results = io_executor.map_method(case, 'init_trade_record_form_IPO', error_code + other_code)
+                no_fix_code = [code for code, result in zip(error_code + other_code, results) if isinstance(result, Exception)]
                 print('修复完成,以下代码修复失败,请手动修复:', no_fix_code)
             else:
                 print('交易记录文件格式正确.')
 
         elif msg.upper() == 'QUIT':
+            shutdown_process_pools()
+            if query_service is not None:
+                query_service.stop()
+            if get_metrics().has_data():
+                get_metrics().export()
             break
 
         else:
@@ -0,0 +1,155 @@
+import os
+import math
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Tuple, Union
+
+from scheduler import get_scheduler
+from metrics import get_metrics
+
+IO_BOUND = 'thread'  # 下载、读写数据库等以等待为主的任务
+CPU_BOUND = 'process'  # pandas逐行处理CSV等受GIL限制的任务
+
+_worker_instance: Any = None  # 进程池中每个进程自己的StockData或TradeRecordData实例
+_process_pools: Dict[Tuple, ProcessPoolExecutor] = {}  # 常驻进程池,键为(类, 进程数)
+_process_pools_lock = threading.Lock()
+
+
+def _init_worker(factory: Callable[[], Any]) -> None:
+    """ 进程池初始化函数:每个进程建立一次自己的实例,之后该进程执行的全部任务共用 """
+
+    global _worker_instance
+    _worker_instance = factory()
+
+
+def _run_chunk(func: Callable, items: List, return_exceptions: bool) -> List:
+    """ 依次执行一组任务;return_exceptions为True时以异常对象代替结果,不中断其余任务 """
+
+    results = []
+    for item in items:
+        try:
+            results.append(func(item))
+        except Exception as error:
+            if not return_exceptions:
+                raise
+            results.append(error)
+
+    return results
+
+
+def _call_method_chunk(args) -> List:
+    """ 进程池任务:以本进程的实例执行一组方法调用 """
+
+    method_name, items, return_exceptions = args
+
+    return _run_chunk(getattr(_worker_instance, method_name), items, return_exceptions)
+
+
+def _call_function_chunk(args) -> List:
+    """ 进程池任务:执行一组模块级函数调用 """
+
+    func, items, return_exceptions = args
+
+    return _run_chunk(func, items, return_exceptions)
+
+
+class BatchExecutor:
+    """
+    - 批量命令的执行层.data.py和traderecord.py的__main__原来一律使用ThreadPoolExecutor,而逐只股票的pandas处理
+    (init_trade_record_form_IPO、calculate_MAX_MIN_MEAN_pb、check_trade_record_csv、原始数据清洗)受GIL限制,
+    多线程并不能利用多个CPU核.
+    - kind为CPU_BOUND时使用进程池,每个进程在初始化时建立一次自己的实例(只读取一次股票清单),方法按名称调用,
+    实例本身不需要序列化;kind为IO_BOUND时使用线程池,直接调用传入的实例.
+    - 任务按块提交,每块包含chunksize个代码,减少进程间通信;结果按输入顺序返回,
+    出错的任务默认以异常对象代替结果,与原来pool.map不检查结果时"一只出错不影响其他"的效果相同.(2026-10-19)
+    - 线程模式改由全局WorkScheduler的常驻线程执行,进程池也常驻复用,不再每次命令重建.(2026-10-19)
+    """
+
+
+    def __init__(self, kind: str = IO_BOUND, max_workers: Union[int, None] = None, chunksize: Union[int, None] = None):
+        if kind not in [IO_BOUND, CPU_BOUND]:
+            raise ValueError(f'kind应为{IO_BOUND}或{CPU_BOUND}.')
+        self.kind = kind
+        cpu_count = os.cpu_count() or 1
+        self.max_workers = max_workers or (cpu_count if kind == CPU_BOUND else min(32, cpu_count + 4))
+        self.chunksize = chunksize
+
+
+    def __split(self, items: List) -> List[List]:
+        """ 按chunksize切分任务,未指定时每个worker约分到4块 """
+
+        chunksize = self.chunksize or max(1, math.ceil(len(items) / (self.max_workers * 4)))
+
+        return [items[index:index + chunksize] for index in range(0, len(items), chunksize)]
+
+
+    def map_method(self, target: Any, method_name: str, items: Iterable, return_exceptions: bool = True,
+                   on_result: Union[Callable[[Any, Any], None], None] = None) -> List:
+        """
+        对items中的每一项执行target.method_name(item),按输入顺序返回结果.
+
+        :param target: StockData或TradeRecordData实例;进程模式下只使用它的类,每个进程以无参数构造函数建立自己的实例.
+        :param method_name: 方法名称.
+        :param items: 参数列表,一般为股票代码.
+        :param return_exceptions: 为True时出错的任务以异常对象代替结果.
+        :param on_result: 每项完成后调用on_result(item, 结果或异常对象),一般为BatchJournal.record;
+        进程模式下在本进程中按块调用.
+        :return: 结果列表.
+        """
+
+        items = list(items)
+        with get_metrics().stage(method_name):  # 每次map作为一个阶段计时
+            if self.kind == IO_BOUND:  # 逐项提交给全局调度器,不分块,尾部延迟只取决于最慢的一项
+                return get_scheduler().map(getattr(target, method_name), items, return_exceptions=return_exceptions,
+                                           on_result=on_result)
+
+            chunks = self.__split(items)
+            if not chunks:
+                return []
+            pool = self.__get_process_pool(factory=type(target))
+            results = []
+            for chunk, chunk_results in zip(chunks, pool.map(_call_method_chunk, [(method_name, chunk, return_exceptions) for chunk in chunks])):
+                if on_result is not None:
+                    for item, result in zip(chunk, chunk_results):
+                        on_result(item, result)
+                results.extend(chunk_results)
+
+            return results
+
+
+    def __get_process_pool(self, factory: Union[Callable[[], Any], None] = None) -> ProcessPoolExecutor:
+        """ 返回factory对应的常驻进程池,多个命令之间复用,进程内的实例只建立一次;factory为None时进程不建立实例 """
+
+        key = (factory, self.max_workers)
+        with _process_pools_lock:
+            if key not in _process_pools:
+                if factory is None:
+                    _process_pools[key] = ProcessPoolExecutor(max_workers=self.max_workers)
+                else:
+                    _process_pools[key] = ProcessPoolExecutor(max_workers=self.max_workers, initializer=_init_worker, initargs=(factory,))
+            return _process_pools[key]
+
+
+    def map(self, func: Callable, items: Iterable, return_exceptions: bool = True) -> List:
+        """ 对items中的每一项执行func(item),进程模式下func须为模块级函数 """
+
+        items = list(items)
+        if self.kind == IO_BOUND:
+            return get_scheduler().map(func, items, return_exceptions=return_exceptions)
+
+        chunks = self.__split(items)
+        if not chunks:
+            return []
+        pool = self.__get_process_pool()  # 与map_method一样使用常驻进程池,不再每次调用重建
+        results = pool.map(_call_function_chunk, [(func, chunk, return_exceptions) for chunk in chunks])
+
+        return [result for chunk in results for result in chunk]
+
+
+def shutdown_process_pools() -> None:
+    """ 关闭全部常驻进程池,程序退出前或进程内实例需要重建(如更换股票清单)时调用 """
+
+    with _process_pools_lock:
+        for pool in _process_pools.values():
+            pool.shutdown()
+        _process_pools.clear()
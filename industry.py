@@ -0,0 +1,191 @@
+import os
+import sqlite3
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Tuple, Union
+
+from path import INDUSTRY_SQLITE3, trade_record_path
+from recordschema import read_trade_record
+
+
+HEAD_ROWS = 60  # 增量计算时先读取的CSV行数,不够覆盖新日期时再读取整个文件
+FIELDS = ['count', 'total_value', 'median_pb', 'weighted_pb', 'median_pe', 'weighted_pe',
+          'median_ps', 'weighted_ps', 'median_dividend']
+
+
+def read_industry_records(record_path: str, stock_class: str, since: Union[str, None] = None) -> DataFrame:
+    """
+    读取一个行业目录下全部CSV文件中日期不早于since的行,since为None时读取全部.
+    CSV文件按日期降序排列,先读取开头HEAD_ROWS行,已经早于since时不再读取整个文件.
+    """
+
+    class_path = os.path.join(record_path, stock_class)
+    frames = []
+    for file in sorted(os.listdir(class_path)):
+        if not file.endswith('.csv'):
+            continue
+        csv_file = os.path.join(class_path, file)
+        usecols = ['日期', '总市值', 'PB', 'PE', 'PS', 'DIVIDEND']
+        df = read_trade_record(csv_file, usecols=usecols, nrows=HEAD_ROWS if since else None, parse_dates=False)
+        if since and len(df) == HEAD_ROWS and str(df['日期'].iloc[-1]) >= since:
+            df = read_trade_record(csv_file, usecols=usecols, parse_dates=False)
+        if since:
+            df = df[df['日期'] >= since]
+        frames.append(df)
+
+    if not frames:
+        return DataFrame(columns=['日期', '总市值', 'PB', 'PE', 'PS', 'DIVIDEND'])
+    df = pd.concat(frames, ignore_index=True)  # 指标列读取时已是float64
+
+    return df.dropna(subset=['日期'])
+
+
+def aggregate_industry(df: DataFrame) -> DataFrame:
+    """
+    按日期汇总一个行业的交易记录.市值加权估值 = 总市值之和 / (总市值/估值)之和,即行业总市值除以行业总净资产
+    (总利润、总收入);估值不大于0(亏损或下载失败补0)的股票不参与估值的中位数和加权计算.
+    """
+
+    def summary(group: DataFrame) -> pd.Series:
+        result = {'count': len(group), 'total_value': group['总市值'].sum()}
+        for column in ['PB', 'PE', 'PS']:
+            valid = group[(group[column] > 0) & (group['总市值'] > 0)]
+            result[f'median_{column.lower()}'] = valid[column].median() if len(valid) else np.nan
+            denominator = (valid['总市值'] / valid[column]).sum()
+            result[f'weighted_{column.lower()}'] = valid['总市值'].sum() / denominator if denominator else np.nan
+        result['median_dividend'] = group['DIVIDEND'].median()
+        return pd.Series(result)
+
+    if df.empty:
+        return DataFrame(columns=['date'] + FIELDS)
+    result = df.groupby(df['日期'].astype(str)).apply(summary)
+
+    return result.reset_index().rename(columns={'日期': 'date'})[['date'] + FIELDS]
+
+
+def build_industry_series(args: Tuple[str, str, Union[str, None]]) -> Tuple[str, DataFrame]:
+    """ 进程池任务:计算一个行业自since(含)以来的每日汇总,args为(record_path, stock_class, since) """
+
+    record_path, stock_class, since = args
+    df = aggregate_industry(read_industry_records(record_path=record_path, stock_class=stock_class, since=since))
+
+    return stock_class, df
+
+
+class IndustryAggregate:
+    """
+    - 申万一级行业每日汇总序列.交易记录已经按新版一级行业分目录存放,但没有任何行业层面的数据,
+    行业比较和相对估值筛选每次都要重新读取5000个文件.
+    - 本类计算每个行业每个交易日的总市值、PB/PE/PS的中位数和市值加权值以及股息率中位数,
+    保存在industry.sqlite3的industry-daily表中.计算在进程池中进行,每个进程负责一个行业.
+    - 按日期增量计算:每个行业从库中最后一个日期(含,以便补全当日后来更新的股票)开始,只读取CSV文件开头的新行.(2026-10-19)
+    """
+
+
+    def __init__(self, db_path: str = INDUSTRY_SQLITE3, record_path: str = trade_record_path):
+        self.__db_path = db_path
+        self.__record_path = record_path
+
+        con = sqlite3.connect(self.__db_path, timeout=30)
+        with con:
+            sql = """
+            CREATE TABLE IF NOT EXISTS 'industry-daily' (
+            stockclass TEXT NOT NULL,
+            date TEXT NOT NULL,
+            count INTEGER,
+            total_value REAL,
+            median_pb REAL,
+            weighted_pb REAL,
+            median_pe REAL,
+            weighted_pe REAL,
+            median_ps REAL,
+            weighted_ps REAL,
+            median_dividend REAL,
+            PRIMARY KEY (stockclass, date)
+            ) WITHOUT ROWID
+            """
+            con.execute(sql)
+        con.close()
+
+
+    def get_last_dates(self) -> Dict[str, str]:
+        """ 返回每个行业库中最后一个日期 """
+
+        con = sqlite3.connect(self.__db_path, timeout=30)
+        with con:
+            sql = """ SELECT stockclass, MAX(date) FROM 'industry-daily' GROUP BY stockclass """
+            result = dict(con.execute(sql).fetchall())
+        con.close()
+
+        return result
+
+
+    def update(self, stock_classes: Union[List[str], None] = None, max_workers: Union[int, None] = None,
+               rebuild: bool = False) -> Dict[str, int]:
+        """
+        增量计算各行业的每日汇总并写入数据库.
+
+        :param stock_classes: 行业列表,默认为交易记录目录下的全部行业.
+        :param max_workers: 进程数,默认为CPU核数.
+        :param rebuild: 为True时忽略库中已有日期,整体重算.
+        :return: {行业: 写入的行数}
+        """
+
+        if stock_classes is None:
+            stock_classes = sorted(item for item in os.listdir(self.__record_path)
+                                   if os.path.isdir(os.path.join(self.__record_path, item)))
+        last_dates = {} if rebuild else self.get_last_dates()
+        tasks = [(self.__record_path, stock_class, last_dates.get(stock_class)) for stock_class in stock_classes]
+
+        result = {}
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            for stock_class, df in pool.map(build_industry_series, tasks):
+                self.__save(stock_class=stock_class, df=df)
+                result[stock_class] = len(df)
+
+        return result
+
+
+    def __save(self, stock_class: str, df: DataFrame) -> None:
+        """ 在一个事务中写入一个行业的汇总行,已有日期被覆盖 """
+
+        if df.empty:
+            return
+        rows = [(stock_class,) + tuple(None if pd.isna(item) else item for item in row)
+                for row in df[['date'] + FIELDS].itertuples(index=False, name=None)]
+        con = sqlite3.connect(self.__db_path, timeout=30)
+        with con:
+            sql = """ INSERT OR REPLACE INTO 'industry-daily' VALUES (?,?,?,?,?,?,?,?,?,?,?) """
+            con.executemany(sql, rows)
+        con.close()
+
+
+    def get_series(self, stock_class: str, start_date: Union[str, None] = None) -> DataFrame:
+        """ 返回一个行业按日期升序排列的汇总序列,start_date为yyyy-mm-dd型字符串 """
+
+        con = sqlite3.connect(self.__db_path, timeout=30)
+        with con:
+            sql = """ SELECT * FROM 'industry-daily' WHERE stockclass=? AND date>=? ORDER BY date """
+            df = pd.read_sql_query(sql, con, params=(stock_class, start_date or '0000-00-00'))
+        con.close()
+
+        return df
+
+
+    def get_latest(self) -> DataFrame:
+        """ 返回每个行业最后一个日期的汇总,用于行业横向比较 """
+
+        con = sqlite3.connect(self.__db_path, timeout=30)
+        with con:
+            sql = """
+            SELECT d.* FROM 'industry-daily' d
+            JOIN (SELECT stockclass, MAX(date) AS date FROM 'industry-daily' GROUP BY stockclass) l
+            ON d.stockclass = l.stockclass AND d.date = l.date
+            ORDER BY d.total_value DESC
+            """
+            df = pd.read_sql_query(sql, con)
+        con.close()
+
+        return df
@@ -0,0 +1,109 @@
+import os
+import sqlite3
+import datetime
+import threading
+from typing import Any, Dict, List
+
+from path import JOURNAL_SQLITE3
+
+
+class BatchJournal:
+    """
+    - 批量命令的持久化日志.INIT-TRADE-CSV、UPDATE-TRADE-CSV和UPDATE-ROE-TABLE要对5000只股票运行数小时,
+    中途出错或Ctrl-C只能从头再来;出错的代码或者收集在内存中的error_code列表里,或者因为pool.map的结果没有读取而消失.
+    - 本类在tmp-file/batch-journal.sqlite3中记录每条命令每只股票的状态:pending(待处理)、completed(完成)、
+    failed(出错,附错误原因)和skipped(无需处理),每完成一只股票立即写入.
+    - resume只处理尚未完成的代码,retry_failures只重新运行出错的代码.(2026-10-19)
+    """
+
+    PENDING, COMPLETED, FAILED, SKIPPED = 'pending', 'completed', 'failed', 'skipped'
+
+
+    def __init__(self, command: str, db_path: str = JOURNAL_SQLITE3):
+        self.__command = command.upper()
+        self.__lock = threading.Lock()
+
+        if not os.path.exists(os.path.dirname(db_path)):
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self.__con = sqlite3.connect(db_path, timeout=30, check_same_thread=False)  # 各线程的写入由__lock串行化
+        with self.__con:
+            sql = """
+            CREATE TABLE IF NOT EXISTS 'batch-journal' (
+            command TEXT NOT NULL,
+            code TEXT NOT NULL,
+            status TEXT NOT NULL,
+            reason TEXT,
+            time TEXT,
+            PRIMARY KEY (command, code)
+            ) WITHOUT ROWID
+            """
+            self.__con.execute(sql)
+
+
+    def start(self, codes: List[str], resume: bool = False, retry_failures: bool = False) -> List[str]:
+        """
+        开始一次运行,返回需要处理的代码.
+
+        :param codes: 本命令的全部代码.
+        :param resume: 为True时沿用上次的日志,返回尚未处理的代码(包括本次新增的代码).
+        :param retry_failures: 为True时沿用上次的日志,只返回上次出错的代码.
+        :return: 需要处理的代码列表,保持codes中的顺序.
+        """
+
+        with self.__lock, self.__con:
+            if not (resume or retry_failures):  # 新的运行,清除本命令上次的日志
+                self.__con.execute(""" DELETE FROM 'batch-journal' WHERE command=? """, (self.__command,))
+            sql = """ INSERT OR IGNORE INTO 'batch-journal' VALUES (?, ?, ?, NULL, NULL) """
+            self.__con.executemany(sql, [(self.__command, code, self.PENDING) for code in codes])
+
+        status = self.FAILED if retry_failures else self.PENDING
+        selected = set(self.get_codes(status=status))
+
+        return [code for code in codes if code in selected]
+
+
+    def record(self, code: str, result: Any) -> None:
+        """
+        记录一只股票的结果:异常对象记为failed并保存原因,'skipped'记为skipped,其他(包括None)记为completed.
+        被记录的方法在没有做任何处理就返回时(如昨日休市)应返回'skipped'.可直接作为BatchExecutor.map_method的on_result回调.
+        """
+
+        if isinstance(result, BaseException):
+            status, reason = self.FAILED, f'{type(result).__name__}: {result}'
+        elif isinstance(result, str) and result == self.SKIPPED:
+            status, reason = self.SKIPPED, None
+        else:
+            status, reason = self.COMPLETED, None
+        now = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+        with self.__lock, self.__con:
+            sql = """ INSERT OR REPLACE INTO 'batch-journal' VALUES (?, ?, ?, ?, ?) """
+            self.__con.execute(sql, (self.__command, code, status, reason, now))
+
+
+    def get_codes(self, status: str) -> List[str]:
+        """ 返回指定状态的代码 """
+
+        with self.__lock:
+            sql = """ SELECT code FROM 'batch-journal' WHERE command=? AND status=? """
+            return [row[0] for row in self.__con.execute(sql, (self.__command, status)).fetchall()]
+
+
+    def get_failures(self) -> Dict[str, str]:
+        """ 返回{出错的代码: 错误原因} """
+
+        with self.__lock:
+            sql = """ SELECT code, reason FROM 'batch-journal' WHERE command=? AND status=? """
+            return dict(self.__con.execute(sql, (self.__command, self.FAILED)).fetchall())
+
+
+    def summary(self) -> Dict[str, int]:
+        """ 返回各状态的代码个数 """
+
+        with self.__lock:
+            sql = """ SELECT status, COUNT(*) FROM 'batch-journal' WHERE command=? GROUP BY status """
+            return dict(self.__con.execute(sql, (self.__command,)).fetchall())
+
+
+    def close(self) -> None:
+        self.__con.close()
@@ -0,0 +1,212 @@
+import os
+import sqlite3
+import hashlib
+import datetime
+import threading
+import pandas as pd
+from pandas import DataFrame
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Union
+
+from path import MANIFEST_SQLITE3, trade_record_path
+
+
+class DatasetManifest:
+    """
+    - 交易记录的数据清单.get_latest_record_date原来取os.listdir返回的第一个文件的第一行作为数据日期,
+    没有任何地方记录每只股票的起止日期、行数和完整性,任何检查都要打开全部文件.
+    - 本类在data-package/manifest.sqlite3的trade-record-manifest表中记录每个CSV文件的路径、行业、首末日期、行数、
+    列名、字节数、修改时间和blake2b校验和.write_trade_record每次写入文件后立即登记(校验和由写入的内容计算,不再读取文件),
+    移动、归档和恢复文件时同步更新;scan补登记其他途径写入的文件,大小和修改时间未变的文件不再读取.
+    - 查询只读取清单:get_latest_date、get_stale、get_coverage等不打开数据文件.(2026-10-19)
+    """
+
+
+    def __init__(self, db_path: str = MANIFEST_SQLITE3, record_path: str = trade_record_path):
+        self.__db_path = db_path
+        self.__record_path = os.path.abspath(record_path)
+
+        os.makedirs(os.path.dirname(self.__db_path), exist_ok=True)
+        con = sqlite3.connect(self.__db_path, timeout=30)
+        with con:
+            sql = """
+            CREATE TABLE IF NOT EXISTS 'trade-record-manifest' (
+            code TEXT NOT NULL PRIMARY KEY,
+            stockclass TEXT,
+            path TEXT,
+            first_date TEXT,
+            last_date TEXT,
+            rows INTEGER,
+            columns TEXT,
+            size INTEGER,
+            mtime_ns INTEGER,
+            checksum TEXT,
+            updated TEXT
+            ) WITHOUT ROWID
+            """
+            con.execute(sql)
+            con.execute(""" CREATE INDEX IF NOT EXISTS 'manifest-last-date' ON 'trade-record-manifest' (last_date) """)
+        con.close()
+
+
+    def is_record_file(self, csv_file: str) -> bool:
+        """ 判断csv_file是否为本清单管理的交易记录文件(record_path/<行业>/<代码>.csv) """
+
+        csv_file = os.path.abspath(csv_file)
+
+        return (csv_file.endswith('.csv') and os.path.dirname(os.path.dirname(csv_file)) == self.__record_path)
+
+
+    @staticmethod
+    def describe(content: bytes) -> Dict:
+        """ 由文件内容计算首末日期、行数、列名和校验和,CSV文件按日期降序排列,只解析首行和末行 """
+
+        lines = [line for line in content.decode('utf-8').splitlines() if line.strip()]
+        dates = [lines[1].split(',')[0], lines[-1].split(',')[0]] if len(lines) > 1 else [None, None]
+
+        return {
+            'first_date': min(dates) if dates[0] else None, 'last_date': max(dates) if dates[0] else None,
+            'rows': max(len(lines) - 1, 0), 'columns': lines[0] if lines else '',
+            'checksum': hashlib.blake2b(content, digest_size=20).hexdigest(),
+        }
+
+
+    def record_content(self, csv_file: str, content: bytes) -> None:
+        """ 登记刚写入的文件,content为写入的内容 """
+
+        if not self.is_record_file(csv_file):
+            return
+        status = os.stat(csv_file)
+        info = self.describe(content)
+        code = os.path.basename(csv_file)[:-len('.csv')]
+        stock_class = os.path.basename(os.path.dirname(os.path.abspath(csv_file)))
+        row = (code, stock_class, os.path.abspath(csv_file), info['first_date'], info['last_date'], info['rows'], info['columns'],
+               status.st_size, status.st_mtime_ns, info['checksum'], datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+
+        con = sqlite3.connect(self.__db_path, timeout=30)
+        with con:
+            con.execute(""" INSERT OR REPLACE INTO 'trade-record-manifest' VALUES (?,?,?,?,?,?,?,?,?,?,?) """, row)
+        con.close()
+
+
+    def record_file(self, csv_file: str) -> None:
+        """ 读取文件后登记,用于移动、恢复等不经过write_trade_record的写入 """
+
+        with open(csv_file, 'rb') as file:
+            self.record_content(csv_file, file.read())
+
+
+    def remove(self, code: str) -> None:
+        """ 删除一只股票的登记,用于退市归档 """
+
+        con = sqlite3.connect(self.__db_path, timeout=30)
+        with con:
+            con.execute(""" DELETE FROM 'trade-record-manifest' WHERE code=? """, (code,))
+        con.close()
+
+
+    def scan(self, max_workers: int = 8) -> Dict[str, int]:
+        """
+        扫描record_path下的全部CSV文件,登记大小或修改时间有变化的文件,删除已不存在的文件的登记.
+        返回{'files': 文件数, 'updated': 重新登记数, 'removed': 删除数}.
+        """
+
+        known = {item['path']: item for item in self.get_all().to_dict('records')}
+        files = [os.path.join(root, file) for root, _, names in os.walk(self.__record_path) for file in names
+                 if self.is_record_file(os.path.join(root, file))]
+        changed = []
+        for file in files:
+            status, item = os.stat(file), known.get(os.path.abspath(file))
+            if item is None or item['size'] != status.st_size or item['mtime_ns'] != status.st_mtime_ns:
+                changed.append(file)
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            list(pool.map(self.record_file, changed))
+
+        existing = {os.path.abspath(file) for file in files}
+        removed = [item['code'] for path, item in known.items() if path not in existing]
+        for code in removed:
+            self.remove(code)
+
+        return {'files': len(files), 'updated': len(changed), 'removed': len(removed)}
+
+
+    def get(self, code: str) -> Union[Dict, None]:
+        """ 返回一只股票的登记,没有登记时返回None """
+
+        con = sqlite3.connect(self.__db_path, timeout=30)
+        con.row_factory = sqlite3.Row
+        with con:
+            row = con.execute(""" SELECT * FROM 'trade-record-manifest' WHERE code=? """, (code,)).fetchone()
+        con.close()
+
+        return dict(row) if row else None
+
+
+    def get_all(self) -> DataFrame:
+        """ 返回全部登记 """
+
+        con = sqlite3.connect(self.__db_path, timeout=30)
+        with con:
+            df = pd.read_sql_query(""" SELECT * FROM 'trade-record-manifest' ORDER BY code """, con)
+        con.close()
+
+        return df
+
+
+    def get_latest_date(self) -> Union[str, None]:
+        """ 返回数据集的最新日期(全部股票末日期的最大值),清单为空时返回None """
+
+        con = sqlite3.connect(self.__db_path, timeout=30)
+        with con:
+            result = con.execute(""" SELECT MAX(last_date) FROM 'trade-record-manifest' """).fetchone()[0]
+        con.close()
+
+        return result
+
+
+    def get_stale(self, as_of: Union[str, None] = None) -> List[str]:
+        """ 返回末日期早于as_of(yyyy-mm-dd,默认为数据集最新日期)的股票代码 """
+
+        as_of = as_of or self.get_latest_date()
+        if as_of is None:
+            return []
+        con = sqlite3.connect(self.__db_path, timeout=30)
+        with con:
+            sql = """ SELECT code FROM 'trade-record-manifest' WHERE last_date < ? OR last_date IS NULL ORDER BY code """
+            result = [row[0] for row in con.execute(sql, (as_of,)).fetchall()]
+        con.close()
+
+        return result
+
+
+    def get_coverage(self, stock_class: Union[str, None] = None) -> DataFrame:
+        """ 返回各股票的code、stockclass、first_date、last_date和rows,可按行业筛选 """
+
+        df = self.get_all()[['code', 'stockclass', 'first_date', 'last_date', 'rows']]
+
+        return df if stock_class is None else df[df['stockclass'] == stock_class].reset_index(drop=True)
+
+
+    def verify(self, code: str) -> bool:
+        """ 重新计算文件的校验和并与登记比较,文件不存在或未登记返回False """
+
+        item = self.get(code)
+        if item is None or not os.path.exists(item['path']):
+            return False
+        with open(item['path'], 'rb') as file:
+            return hashlib.blake2b(file.read(), digest_size=20).hexdigest() == item['checksum']
+
+
+_shared_manifest: Union[DatasetManifest, None] = None
+_shared_lock = threading.Lock()
+
+
+def get_manifest() -> DatasetManifest:
+    """ 返回进程内共享的DatasetManifest(默认路径) """
+
+    global _shared_manifest
+    with _shared_lock:
+        if _shared_manifest is None:
+            _shared_manifest = DatasetManifest()
+
+    return _shared_manifest
@@ -0,0 +1,156 @@
+import os
+import json
+import time
+import datetime
+import threading
+from contextlib import contextmanager
+from typing import Dict, List, Union
+
+from path import METRICS_JSON, METRICS_PROM
+
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, float('inf'))  # 请求耗时直方图的上界,单位秒
+
+
+class Metrics:
+    """
+    - 数据源请求和批量命令的计时统计.原来只有多个线程同时写出的print进度行,看不出时间花在哪里.
+    - 按网站记录请求数、状态码、耗时直方图、响应字节数、重试次数和异常次数;按阶段(批量命令中的每次map或合并更新)
+    记录运行次数和耗时.请求由挂载在各session上的HostLimitedAdapter记录,因此覆盖雪球、新浪、gtimg、同花顺、
+    国债信息网、巨潮资讯和网易财经的全部session请求;进程池中发出的请求只在各自进程内统计,不计入.
+    - export在tmp-file下写出JSON摘要(metrics.json)和Prometheus textfile(metrics.prom).(2026-10-19)
+    """
+
+
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.__started = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        self.__hosts: Dict[str, Dict] = {}
+        self.__stages: Dict[str, Dict] = {}
+
+
+    def __get_host(self, host: str) -> Dict:
+        if host not in self.__hosts:
+            self.__hosts[host] = {
+                'requests': 0, 'errors': 0, 'retries': 0, 'bytes': 0, 'seconds': 0.00,
+                'status': {}, 'buckets': [0] * len(LATENCY_BUCKETS),
+            }
+        return self.__hosts[host]
+
+
+    def record_request(self, host: str, seconds: float, status: Union[int, None] = None,
+                       size: int = 0, retries: int = 0) -> None:
+        """ 记录一次请求,status为None表示请求抛出异常 """
+
+        with self.__lock:
+            item = self.__get_host(host)
+            item['requests'] += 1
+            item['seconds'] += seconds
+            item['bytes'] += size
+            item['retries'] += retries
+            if status is None:
+                item['errors'] += 1
+            else:
+                item['status'][str(status)] = item['status'].get(str(status), 0) + 1
+            for index, bound in enumerate(LATENCY_BUCKETS):
+                if seconds <= bound:
+                    item['buckets'][index] += 1
+                    break
+
+
+    @contextmanager
+    def stage(self, name: str):
+        """ 记录一个阶段的耗时,用法: with get_metrics().stage('UPDATE-TRADE-CSV'): ... """
+
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record_stage(name=name, seconds=time.perf_counter() - start)
+
+
+    def record_stage(self, name: str, seconds: float) -> None:
+        """ 记录一个阶段的一次运行耗时 """
+
+        with self.__lock:
+            item = self.__stages.setdefault(name, {'runs': 0, 'seconds': 0.00, 'last_seconds': 0.00})
+            item['runs'] += 1
+            item['seconds'] += seconds
+            item['last_seconds'] = seconds
+
+
+    def has_data(self) -> bool:
+        with self.__lock:
+            return bool(self.__hosts or self.__stages)
+
+
+    def summary(self) -> Dict:
+        """ 返回统计摘要,直方图为各区间的计数(非累计) """
+
+        with self.__lock:
+            hosts = {}
+            for host, item in self.__hosts.items():
+                hosts[host] = dict(item, status=dict(item['status']), buckets=dict(zip([str(b) for b in LATENCY_BUCKETS], item['buckets'])),
+                                   mean_seconds=round(item['seconds'] / item['requests'], 4) if item['requests'] else 0.00)
+            stages = {name: dict(item) for name, item in self.__stages.items()}
+
+        return {'started': self.__started, 'exported': datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                'hosts': hosts, 'stages': stages}
+
+
+    def to_prometheus(self) -> str:
+        """ 生成Prometheus textfile格式的文本 """
+
+        lines: List[str] = []
+        with self.__lock:
+            lines.append('# TYPE stockdata_http_requests_total counter')
+            for host, item in self.__hosts.items():
+                for status, count in item['status'].items():
+                    lines.append(f'stockdata_http_requests_total{{host="{host}",status="{status}"}} {count}')
+                lines.append(f'stockdata_http_requests_total{{host="{host}",status="error"}} {item["errors"]}')
+            lines.append('# TYPE stockdata_http_request_seconds histogram')
+            for host, item in self.__hosts.items():
+                cumulative = 0
+                for bound, count in zip(LATENCY_BUCKETS, item['buckets']):
+                    cumulative += count
+                    le = '+Inf' if bound == float('inf') else str(bound)
+                    lines.append(f'stockdata_http_request_seconds_bucket{{host="{host}",le="{le}"}} {cumulative}')
+                lines.append(f'stockdata_http_request_seconds_sum{{host="{host}"}} {item["seconds"]:.6f}')
+                lines.append(f'stockdata_http_request_seconds_count{{host="{host}"}} {item["requests"]}')
+            lines.append('# TYPE stockdata_http_response_bytes_total counter')
+            for host, item in self.__hosts.items():
+                lines.append(f'stockdata_http_response_bytes_total{{host="{host}"}} {item["bytes"]}')
+            lines.append('# TYPE stockdata_http_retries_total counter')
+            for host, item in self.__hosts.items():
+                lines.append(f'stockdata_http_retries_total{{host="{host}"}} {item["retries"]}')
+            lines.append('# TYPE stockdata_stage_seconds_total counter')
+            for name, item in self.__stages.items():
+                lines.append(f'stockdata_stage_seconds_total{{stage="{name}"}} {item["seconds"]:.6f}')
+            lines.append('# TYPE stockdata_stage_last_seconds gauge')
+            for name, item in self.__stages.items():
+                lines.append(f'stockdata_stage_last_seconds{{stage="{name}"}} {item["last_seconds"]:.6f}')
+            lines.append('# TYPE stockdata_stage_runs_total counter')
+            for name, item in self.__stages.items():
+                lines.append(f'stockdata_stage_runs_total{{stage="{name}"}} {item["runs"]}')
+
+        return '\n'.join(lines) + '\n'
+
+
+    def export(self, json_path: str = METRICS_JSON, prom_path: str = METRICS_PROM) -> None:
+        """ 写出JSON摘要和Prometheus textfile,先写临时文件再改名,采集程序不会读到写了一半的文件 """
+
+        for path, content in [(json_path, json.dumps(self.summary(), ensure_ascii=False, indent=4)),
+                              (prom_path, self.to_prometheus())]:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path + '.tmp', 'w', encoding='utf-8') as file:
+                file.write(content)
+            os.replace(path + '.tmp', path)
+
+
+_shared_metrics = Metrics()
+
+
+def get_metrics() -> Metrics:
+    """ 返回进程内共享的Metrics实例 """
+
+    return _shared_metrics
@@ -0,0 +1,188 @@
+import os
+import sqlite3
+import datetime
+import numpy as np
+from pandas import DataFrame
+from typing import Dict, List, Tuple, Union
+
+from path import PE_PB_SQLITE3, INDICATOR_SQLITE3, CURVE_SQLITE3
+from yieldcurve import get_yield_curve
+from roematrix import get_roe_matrix
+
+
+SOURCE_FILES = [INDICATOR_SQLITE3, CURVE_SQLITE3, PE_PB_SQLITE3]  # 载入数据所用的数据库文件
+
+
+def get_source_signature() -> Tuple:
+    """ 由数据库文件的大小和修改时间以及当天日期组成数据版本,任一文件变化或跨日(国债收益率取昨日)时版本改变 """
+
+    items = []
+    for file in SOURCE_FILES:
+        status = os.stat(file) if os.path.exists(file) else None
+        items.append((status.st_size, status.st_mtime_ns) if status else None)
+
+    return (datetime.date.today(), tuple(items))
+
+
+class StockMOS:
+    """
+    - 批量计算股票安全边际(MOS).calculate_stock_mos每次调用都要打开curve和indicator两个数据库,逐日查询国债收益率,
+    读取表结构后只取一只股票的ROE,PB还要从雪球网页获取.calculate_comprehensive_information对每只股票还要调用三次.
+    - 本类一次性载入ROE矩阵、最近非0的10年期国债收益率和pe-pb表中的最新PB快照,然后以numpy数组运算计算任意股票、
+    任意期间的MOS,全市场的MOS排名因此变得可行.
+    - 计算口径与calculate_stock_mos相同:平均ROE = (最近period个年度ROE + 最新半年ROE) / (period + 0.5),
+    内在PB = 平均ROE / 国债收益率, MOS = 1 - PB / 内在PB.出错代码同样为88888.88和99999.99.(2026-10-19)
+    """
+
+
+    def __init__(self):
+        self.__stock_codes: np.ndarray = np.array([], dtype=object)  # 含后缀的股票代码
+        self.__stock_names: np.ndarray = np.array([], dtype=object)
+        self.__stock_classes: np.ndarray = np.array([], dtype=object)
+        self.__roe_year: np.ndarray = np.empty((0, 0))  # 年度ROE矩阵,列按年份降序排列
+        self.__roe_half: Union[np.ndarray, None] = None  # 最新半年ROE,不存在时为None
+        self.__pb: np.ndarray = np.array([])  # 与股票代码对齐的最新PB快照
+        self.__yield_value: float = 0.00
+        self.__position: Dict[str, int] = {}  # 股票代码(含后缀)到行号的映射
+        self.__signature: Tuple = ()  # 载入时的数据版本
+
+        self.reload()
+
+
+    def reload(self) -> None:
+        """ 重新载入ROE矩阵、国债收益率和PB快照,数据库更新后调用 """
+
+        self.__signature = get_source_signature()  # 先于载入取得版本,载入期间数据库又有变化时下次仍会重新载入
+        if self.__stock_codes.size:  # 首次载入时共享的收益率缓存和ROE矩阵已是最新,无需刷新
+            get_yield_curve().refresh()
+            get_roe_matrix().reload()
+        self.__load_roe_matrix()
+        self.__yield_value = self.__load_latest_yield_value()
+        self.__load_pb_snapshot()
+
+
+    def is_stale(self) -> bool:
+        """ 数据库文件在载入后有变化或已经跨日时返回True """
+
+        return self.__signature != get_source_signature()
+
+
+    def __load_roe_matrix(self) -> None:
+        """ 从共享的ROEMatrix取得年度ROE矩阵和最新半年ROE向量 """
+
+        matrix = get_roe_matrix()
+        stocks = matrix.get_stocks()
+        self.__stock_codes = stocks[:, 0] if len(stocks) else np.array([], dtype=object)
+        self.__stock_names = stocks[:, 1] if len(stocks) else np.array([], dtype=object)
+        self.__stock_classes = stocks[:, 2] if len(stocks) else np.array([], dtype=object)
+        self.__roe_year = matrix.get_annual_matrix()
+        self.__roe_half = matrix.get_half_vector()
+        self.__position = {code: index for index, code in enumerate(self.__stock_codes)}
+
+
+    @staticmethod
+    def __load_latest_yield_value() -> float:
+        """ 从YieldCurve缓存获取昨日起30日内最近的非0国债到期收益率,没有则返回0 """
+
+        yesterday = datetime.date.today() + datetime.timedelta(days=-1)
+
+        return get_yield_curve().get_value_asof(date=yesterday, max_days=30)
+
+
+    def __load_pb_snapshot(self) -> None:
+        """ 从pe-pb表载入最新的PB快照,按ROE矩阵的股票顺序对齐,缺失为NaN """
+
+        con = sqlite3.connect(PE_PB_SQLITE3)
+        with con:
+            tmp = con.execute(""" SELECT stockcode, pb FROM 'pe-pb' """).fetchall()
+
+        self.__pb = np.full(len(self.__stock_codes), np.nan)
+        for stock_code, pb in tmp:
+            index = self.__position.get(stock_code)
+            if index is not None and pb is not None:
+                self.__pb[index] = pb
+
+
+    def get_yield_value(self) -> float:
+        """ 返回计算所用的国债到期收益率 """
+
+        return self.__yield_value
+
+
+    def __calculate_mos_array(self, rows: np.ndarray, period: int) -> np.ndarray:
+        """ 计算rows指定行的MOS数组,rows为-1的行表示数据库中没有该股票 """
+
+        if period > 10 or period <= 0 or period > self.__roe_year.shape[1]:
+            return np.full(len(rows), 99999.99)
+        if self.__roe_year.shape[0] == 0:
+            return np.full(len(rows), 88888.88)
+
+        valid = rows >= 0
+        safe_rows = np.where(valid, rows, 0)
+
+        roe_sum = self.__roe_year[safe_rows, :period].sum(axis=1)
+        count = float(period)
+        if self.__roe_half is not None:
+            roe_sum = roe_sum + self.__roe_half[safe_rows]
+            count += 0.5
+        aver_roe = roe_sum / count
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            inner_pb = aver_roe / self.__yield_value if self.__yield_value else np.full(len(rows), np.nan)
+            mos = np.round(1 - self.__pb[safe_rows] / inner_pb, 2)
+
+        return np.where(valid & np.isfinite(mos), mos, 88888.88)
+
+
+    def calculate_mos(self, codes: Union[List[str], None] = None, periods: Tuple[int, ...] = (3, 5, 7)) -> DataFrame:
+        """
+        批量计算股票的安全边际.
+
+        :param codes: 股票代码列表,不含后缀;为None时计算数据库中的全部股票.
+        :param periods: 计算跨度列表,从最近一个完整年度起算.
+        :return: DataFrame,列为stockcode、stockname、stockclass及每个期间的'{period}_mos'.
+        """
+
+        if codes is None:
+            rows = np.arange(len(self.__stock_codes))
+            stock_codes = self.__stock_codes
+        else:
+            stock_codes = np.array([code + '.SH' if code.startswith('6') else code + '.SZ' for code in codes], dtype=object)
+            rows = np.array([self.__position.get(code, -1) for code in stock_codes], dtype='int64')
+
+        found = rows >= 0
+        stock_names = np.full(len(rows), '错误', dtype=object)
+        stock_classes = np.full(len(rows), '错误', dtype=object)
+        stock_names[found] = self.__stock_names[rows[found]]
+        stock_classes[found] = self.__stock_classes[rows[found]]
+
+        result = DataFrame({'stockcode': stock_codes, 'stockname': stock_names, 'stockclass': stock_classes})
+        for period in periods:
+            result[f'{period}_mos'] = self.__calculate_mos_array(rows=rows, period=period)
+
+        return result
+
+
+    def get_stock_mos(self, code: str, period: int) -> float:
+        """ 计算单只股票的安全边际,code不含后缀,结果与calculate_stock_mos口径一致(PB取自快照) """
+
+        return float(self.calculate_mos(codes=[code], periods=(period,)).loc[0, f'{period}_mos'])
+
+
+    def get_mos_ranks(self, period: int, top_k: Union[int, None] = None) -> List[Tuple]:
+        """
+        返回全部股票指定期间的MOS降序排名,出错的股票不参与排名.
+
+        :param period: 计算跨度.
+        :param top_k: 只返回前top_k名,为None时返回全部.
+        :return: [(stockcode, stockname, stockclass, mos), ...]
+        """
+
+        df = self.calculate_mos(periods=(period,))
+        column = f'{period}_mos'
+        df = df[~df[column].isin([88888.88, 99999.99])]
+        df = df.sort_values(by=column, ascending=False)
+        if top_k is not None:
+            df = df.head(top_k)
+
+        return list(df[['stockcode', 'stockname', 'stockclass', column]].itertuples(index=False, name=None))
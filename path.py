@@ -15,6 +15,7 @@ trade_record_path = os.path.join(BASE, 'trade-record')
 stock_list_path = os.path.join(BASE, 'stock-list')
 TMP_FILE_PATH = os.path.join(BASE, 'tmp-file')
 BACKUP_FILE_PATH = os.path.join(BASE, 'backup-file')
+DELISTED_RECORD_PATH = os.path.join(BASE, 'delisted-record')
 
 # sqlite3数据库路径
 INDICATOR_SQLITE3 = os.path.join(data_package_path, 'indicator.sqlite3')
@@ -26,16 +27,35 @@ PE_PB_SQLITE3 = os.path.join(data_package_path, 'pe-pb.sqlite3')
 SALARY_SQLITE3 = os.path.join(data_package_path, 'salary.sqlite3')
 TVALUE_SQLITE3 = os.path.join(data_package_path, 'total-value.sqlite3')
 INDICATOR_ROE_FROM_1991 = os.path.join(data_package_path, 'indicator-roe-from-1991.sqlite3')
+PRICE_SQLITE3 = os.path.join(data_package_path, 'price.sqlite3')
+INDUSTRY_SQLITE3 = os.path.join(data_package_path, 'industry.sqlite3')
+MANIFEST_SQLITE3 = os.path.join(data_package_path, 'manifest.sqlite3')
+
+# 后复权价格矩阵目录
+ADJUST_PRICE_PATH = os.path.join(data_package_path, 'adjust-price')
+
+# 交易记录紧凑格式目录
+COMPACT_RECORD_PATH = os.path.join(data_package_path, 'compact-record')
+
+# 估值分位窗口状态目录
+VALUATION_WINDOW_PATH = os.path.join(data_package_path, 'valuation-window')
 
 # tmp backup file path
 ALL_PB_PE_SQLITE3 = os.path.join(TMP_FILE_PATH, 'all-pb-pe-indicator.sqlite3')
 COM_RANKS_SQLITE3 = os.path.join(TMP_FILE_PATH, 'stock-comprehensive-ranks.sqlite3')
 TEST_CONDITION_SQLITE3 = os.path.join(TMP_FILE_PATH, 'test-condition.sqlite3')
+JOURNAL_SQLITE3 = os.path.join(TMP_FILE_PATH, 'batch-journal.sqlite3')
+METRICS_JSON = os.path.join(TMP_FILE_PATH, 'metrics.json')
+METRICS_PROM = os.path.join(TMP_FILE_PATH, 'metrics.prom')
+PROFILE_PATH = os.path.join(TMP_FILE_PATH, 'profile')
 
 # xlsx 文件路径
 SW_STOCK_LIST = os.path.join(stock_list_path, 'sw-stock-list.xlsx')
 CNINFO_STOCK_LIST = os.path.join(stock_list_path, 'cninfo_stock_list.xlsx')
 
+# 交易日历文件路径
+TRADE_CALENDAR = os.path.join(stock_list_path, 'trade-calendar.json')
+
 # header file info 
 header_xueqiu = {
     'user-agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/107.0.0.0 Safari/537.36 Edg/107.0.1418.62',   
@@ -0,0 +1,239 @@
+import sqlite3
+import datetime
+import time
+import threading
+import numpy as np
+from typing import Callable, Dict, List, Tuple, Union
+
+from path import PRICE_SQLITE3
+
+
+class PriceStore:
+    """
+    - 股票和常用指数(000300、399006、000905)日线价格的本地存储.download_period_statistic_value_from_xueqiu每次调用都要下载
+    最多5年的日线,get_all_stocks_rising_value_ranks和calculate_comprehensive_information对每只股票都要下载一次,
+    get_closest_date_position还要对整个列表逐项求abs做线性扫描.
+    - 本类把日线保存在price.sqlite3的kline表中,每次只下载最后一个已存日期之后的数据;价格查询在时间戳数组上二分查找,
+    期间涨跌幅在本地数组上计算.
+    - 雪球日线为向前复权价格,除权除息后历史价格会整体变化.增量下载时重叠下载最后一个已存日期,如果该日收盘价与库中不同,
+    说明发生了除权除息,重新下载该股票的全部区间.(2026-10-19)
+    """
+
+    INDEX_CODES = ['000300', '399006', '000905']  # 三个常用指数
+
+
+    def __init__(self, downloader: Callable[..., Dict], db_path: str = PRICE_SQLITE3, years: int = 5):
+        """
+        :param downloader: 日线下载函数,参数为code、begin和end,返回雪球kline.json的内容,
+        一般为StockData.download_period_statistic_value_from_xueqiu.
+        :param db_path: 数据库路径.
+        :param years: 首次下载的年数.
+        """
+
+        self.__downloader = downloader
+        self.__db_path = db_path
+        self.__years = years
+        self.__lock = threading.Lock()
+        self.__cache: Dict[str, Tuple[np.ndarray, np.ndarray, np.ndarray]] = {}  # code: (timestamp, close, percent)
+
+        con = sqlite3.connect(self.__db_path, timeout=30)
+        with con:
+            sql = """
+            CREATE TABLE IF NOT EXISTS 'kline' (
+            code TEXT NOT NULL,
+            timestamp INTEGER NOT NULL,
+            date TEXT NOT NULL,
+            open REAL,
+            high REAL,
+            low REAL,
+            close REAL NOT NULL,
+            percent REAL,
+            volume REAL,
+            PRIMARY KEY (code, timestamp)
+            ) WITHOUT ROWID
+            """
+            con.execute(sql)
+
+            # 记录每个代码已经下载覆盖的最早日期,上市较晚的股票不必每次重复补下载
+            sql = """
+            CREATE TABLE IF NOT EXISTS 'kline-range' (
+            code TEXT NOT NULL PRIMARY KEY,
+            begin TEXT NOT NULL
+            )
+            """
+            con.execute(sql)
+        con.close()
+
+
+    @staticmethod
+    def __date_to_timestamp(date: Union[str, datetime.date]) -> int:
+        """ 将yyyy-mm-dd型字符串或date转换为13位时间戳,与StockData.date_to_timestamp一致 """
+
+        struct_time = time.strptime(str(date)[0:10], '%Y-%m-%d')
+
+        return int(time.mktime(struct_time) * 1000)
+
+
+    @staticmethod
+    def __parse_kline(result: Dict) -> List[Tuple]:
+        """ 将kline.json的内容解析为(timestamp, date, open, high, low, close, percent, volume)元组列表 """
+
+        data = result.get('data') or {}
+        columns = data.get('column') or []
+        position = {name: index for index, name in enumerate(columns)}
+        get = lambda item, name, default: item[position[name]] if name in position else item[default]
+
+        rows = []
+        for item in data.get('item') or []:
+            timestamp = int(get(item, 'timestamp', 0))
+            close = get(item, 'close', 5)
+            if close is None:
+                continue
+            date = datetime.datetime.fromtimestamp(timestamp / 1000).strftime('%Y-%m-%d')
+            rows.append((timestamp, date, get(item, 'open', 2), get(item, 'high', 3), get(item, 'low', 4),
+                         close, get(item, 'percent', 7), get(item, 'volume', 1)))
+
+        return rows
+
+
+    def __save_rows(self, code: str, rows: List[Tuple], begin: str, replace_all: bool = False) -> None:
+        """ 在一个事务中写入日线数据和已覆盖的最早日期begin,replace_all为True时先删除该代码的全部旧数据 """
+
+        con = sqlite3.connect(self.__db_path, timeout=30)
+        with con:
+            if replace_all:
+                con.execute(""" DELETE FROM 'kline' WHERE code=? """, (code,))
+            sql = """ INSERT OR REPLACE INTO 'kline' VALUES (?,?,?,?,?,?,?,?,?) """
+            con.executemany(sql, [(code,) + row for row in rows])
+            sql = """ 
+            INSERT INTO 'kline-range' VALUES (?, ?) 
+            ON CONFLICT(code) DO UPDATE SET begin=MIN(begin, excluded.begin) 
+            """
+            con.execute(sql, (code, begin))
+        con.close()
+
+        with self.__lock:
+            self.__cache.pop(code, None)
+
+
+    def __get_last_row(self, code: str) -> Union[Tuple[int, float, str], None]:
+        """ 返回库中该代码最后一个交易日的时间戳、收盘价和已覆盖的最早日期 """
+
+        con = sqlite3.connect(self.__db_path, timeout=30)
+        with con:
+            sql = """ SELECT timestamp, close FROM 'kline' WHERE code=? ORDER BY timestamp DESC LIMIT 1 """
+            tmp = con.execute(sql, (code,)).fetchone()
+            sql = """ SELECT begin FROM 'kline-range' WHERE code=? """
+            covered = con.execute(sql, (code,)).fetchone()
+        con.close()
+
+        return None if tmp is None else (tmp[0], tmp[1], covered[0] if covered else '9999-12-31')
+
+
+    def update(self, code: str, begin: Union[str, None] = None) -> int:
+        """
+        增量更新一只股票或指数的日线至今天.
+
+        :param code: 不含后缀的股票代码或INDEX_CODES中的指数代码.
+        :param begin: 需要覆盖的最早日期,yyyy-mm-dd型字符串;早于已存数据时补下载之前的区间.默认为years年前.
+        :return: 写入的行数.
+        """
+
+        today = datetime.date.today()
+        begin = begin if begin else str(today + datetime.timedelta(days=-365*self.__years))
+        last_row = self.__get_last_row(code=code)
+
+        # 库中没有该代码,下载全部区间
+        if last_row is None:
+            rows = self.__parse_kline(self.__downloader(code=code, begin=begin, end=str(today)))
+            self.__save_rows(code=code, rows=rows, begin=begin, replace_all=True)
+            return len(rows)
+
+        # 重叠下载最后一个已存日期,检查是否发生除权除息
+        last_timestamp, last_close, covered_begin = last_row
+        last_date = datetime.datetime.fromtimestamp(last_timestamp / 1000).strftime('%Y-%m-%d')
+        rows = self.__parse_kline(self.__downloader(code=code, begin=last_date, end=str(today)))
+        overlap = [row for row in rows if row[0] == last_timestamp]
+        if overlap and round(overlap[0][5], 4) != round(last_close, 4):
+            begin = min(begin, covered_begin)
+            rows = self.__parse_kline(self.__downloader(code=code, begin=begin, end=str(today)))
+            self.__save_rows(code=code, rows=rows, begin=begin, replace_all=True)
+            return len(rows)
+
+        # 需要覆盖的区间早于已下载的区间时,补下载之前的区间
+        if begin < covered_begin:
+            rows += self.__parse_kline(self.__downloader(code=code, begin=begin, end=covered_begin))
+
+        new_rows = [row for row in rows if row[0] != last_timestamp]
+        self.__save_rows(code=code, rows=new_rows, begin=min(begin, covered_begin))
+
+        return len(new_rows)
+
+
+    def get_series(self, code: str) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """ 返回该代码按时间升序排列的时间戳、收盘价和涨跌幅(%)数组,结果缓存在内存中 """
+
+        with self.__lock:
+            if code in self.__cache:
+                return self.__cache[code]
+
+        con = sqlite3.connect(self.__db_path, timeout=30)
+        with con:
+            sql = """ SELECT timestamp, close, percent FROM 'kline' WHERE code=? ORDER BY timestamp """
+            rows = con.execute(sql, (code,)).fetchall()
+        con.close()
+
+        series = (
+            np.array([row[0] for row in rows], dtype='int64'),
+            np.array([row[1] for row in rows], dtype='float64'),
+            np.array([row[2] if row[2] is not None else np.nan for row in rows], dtype='float64'),
+        )
+        with self.__lock:
+            self.__cache[code] = series
+
+        return series
+
+
+    def __get_asof_position(self, timestamps: np.ndarray, date: Union[str, datetime.date]) -> int:
+        """ 返回date当日或之前最近一个交易日的位置;date早于全部数据时返回0 """
+
+        position = int(np.searchsorted(timestamps, self.__date_to_timestamp(date), side='right')) - 1
+
+        return max(position, 0)
+
+
+    def get_price_asof(self, code: str, date: Union[str, datetime.date]) -> Union[float, None]:
+        """ 返回date当日或之前最近一个交易日的收盘价(向前复权),库中没有数据返回None """
+
+        timestamps, close, _ = self.get_series(code=code)
+        if len(timestamps) == 0:
+            return None
+
+        return float(close[self.__get_asof_position(timestamps, date)])
+
+
+    def get_latest(self, code: str) -> Union[Tuple[str, float, float], None]:
+        """ 返回最后一个交易日的日期、收盘价和涨跌幅(%),库中没有数据返回None """
+
+        timestamps, close, percent = self.get_series(code=code)
+        if len(timestamps) == 0:
+            return None
+        date = datetime.datetime.fromtimestamp(timestamps[-1] / 1000).strftime('%Y-%m-%d')
+
+        return date, float(close[-1]), float(percent[-1])
+
+
+    def calculate_period_rising_value(self, code: str, start_date: str, end_date: str) -> float:
+        """
+        计算本地数据中start_date至end_date的涨跌幅,日期为yyyy-mm-dd型字符串,无数据返回0.00
+        开始和结束价格均取当日或之前最近一个交易日的收盘价(as-of),与原来取前后最接近交易日的做法在非交易日时结果不同.
+        """
+
+        timestamps, close, _ = self.get_series(code=code)
+        if len(timestamps) == 0:
+            return 0.00
+
+        start_price = close[self.__get_asof_position(timestamps, start_date)]
+        end_price = close[self.__get_asof_position(timestamps, end_date)]
+
+        return round(float(end_price / start_price - 1), 4) if start_price else 0.00
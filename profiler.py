@@ -0,0 +1,162 @@
+import os
+import sys
+import json
+import time
+import cProfile
+import datetime
+import functools
+import threading
+from typing import Callable, Dict, List, Union
+
+from path import PROFILE_PATH
+
+
+PROFILE_ENV = 'STOCK_DATA_PROFILE'  # 环境变量,1/timing为方法计时,cprofile为方法计时并按命令保存pstats
+
+
+def get_profile_mode() -> str:
+    """
+    读取性能分析模式:环境变量STOCK_DATA_PROFILE或命令行参数--profile/--profile=cprofile,命令行参数优先.
+    返回''(关闭)、'timing'或'cprofile'.
+    """
+
+    value = os.environ.get(PROFILE_ENV, '')
+    for arg in sys.argv[1:]:
+        if arg == '--profile':
+            value = 'timing'
+        elif arg.startswith('--profile='):
+            value = arg.split('=', 1)[1]
+    value = value.strip().lower()
+    if value in ['', '0', 'false', 'off', 'no']:
+        return ''
+
+    return 'cprofile' if value == 'cprofile' else 'timing'
+
+
+PROFILE_MODE = get_profile_mode()  # 导入时确定,关闭时profile_methods原样返回类,不增加任何开销
+
+
+class MethodProfiler:
+    """
+    - 方法级性能分析.运行慢时原来只能手工包一层计时,分不清时间花在pandas、SQLite还是网络上.
+    - 开启后StockData和TradeRecordData的每个公开方法都被包装,按方法统计调用次数、累计时间(含调用的其他公开方法)
+    和自身时间(扣除其中调用的其他公开方法),各线程分别维护调用栈.cprofile模式下另外对每条菜单命令保存一个pstats文件,
+    可用python -m pstats或snakeviz查看;需要火焰图时可用py-spy record --pid附加到运行中的进程.
+    - 进程池中执行的方法在各自进程内计时,不计入本进程的统计.(2026-10-19)
+    """
+
+
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.__local = threading.local()
+        self.__stats: Dict[str, List] = {}  # {方法: [调用次数, 累计时间, 自身时间]}
+        self.__command_profile: Union[cProfile.Profile, None] = None
+
+
+    def __get_stack(self) -> List[float]:
+        """ 当前线程的调用栈,每层记录其中调用的其他公开方法的耗时 """
+
+        stack = getattr(self.__local, 'stack', None)
+        if stack is None:
+            stack = self.__local.stack = []
+        return stack
+
+
+    def wrap(self, name: str, func: Callable) -> Callable:
+        """ 返回计时包装后的func,name为统计中使用的方法名 """
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            stack = self.__get_stack()
+            stack.append(0.00)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                children = stack.pop()
+                if stack:
+                    stack[-1] += elapsed
+                with self.__lock:
+                    item = self.__stats.setdefault(name, [0, 0.00, 0.00])
+                    item[0] += 1
+                    item[1] += elapsed
+                    item[2] += elapsed - children
+
+        return wrapper
+
+
+    def get_stats(self) -> List[Dict]:
+        """ 返回按自身时间降序排列的方法统计 """
+
+        with self.__lock:
+            stats = [{'method': name, 'calls': calls, 'cumulative': round(cumulative, 6), 'self': round(own, 6),
+                      'per_call': round(cumulative / calls, 6)}
+                     for name, (calls, cumulative, own) in self.__stats.items()]
+
+        return sorted(stats, key=lambda item: item['self'], reverse=True)
+
+
+    def report(self, top: int = 30) -> str:
+        """ 返回前top个方法的文本表格 """
+
+        lines = [f'{"method":<60}{"calls":>10}{"cumulative":>14}{"self":>14}{"per_call":>14}']
+        for item in self.get_stats()[:top]:
+            lines.append(f'{item["method"]:<60}{item["calls"]:>10}{item["cumulative"]:>14.4f}{item["self"]:>14.4f}{item["per_call"]:>14.4f}')
+
+        return '\n'.join(lines)
+
+
+    def start_command(self) -> None:
+        """ cprofile模式下开始记录一条菜单命令 """
+
+        if PROFILE_MODE == 'cprofile':
+            self.__command_profile = cProfile.Profile()
+            self.__command_profile.enable()
+
+
+    def stop_command(self, name: str, profile_path: str = PROFILE_PATH) -> None:
+        """ 一条菜单命令结束:写出方法统计methods.json和methods.txt,cprofile模式下另存<命令>-<时间>.pstats """
+
+        os.makedirs(profile_path, exist_ok=True)
+        if self.__command_profile is not None:
+            self.__command_profile.disable()
+            stamp = datetime.datetime.now().strftime('%Y%m%d-%H%M%S')
+            self.__command_profile.dump_stats(os.path.join(profile_path, f'{name.upper()}-{stamp}.pstats'))
+            self.__command_profile = None
+        with open(os.path.join(profile_path, 'methods.json'), 'w', encoding='utf-8') as file:
+            json.dump(self.get_stats(), file, ensure_ascii=False, indent=4)
+        with open(os.path.join(profile_path, 'methods.txt'), 'w', encoding='utf-8') as file:
+            file.write(self.report(top=len(self.get_stats())) + '\n')
+
+
+_shared_profiler = MethodProfiler()
+
+
+def get_profiler() -> MethodProfiler:
+    """ 返回进程内共享的MethodProfiler实例 """
+
+    return _shared_profiler
+
+
+def profile_methods(cls: type) -> type:
+    """
+    类装饰器:性能分析开启时包装cls自身定义的全部公开方法(含staticmethod和classmethod),
+    关闭时原样返回cls.
+    """
+
+    if not PROFILE_MODE:
+        return cls
+
+    for name, attr in list(vars(cls).items()):
+        if name.startswith('_'):
+            continue
+        method_name = f'{cls.__name__}.{name}'
+        if isinstance(attr, staticmethod):
+            setattr(cls, name, staticmethod(_shared_profiler.wrap(method_name, attr.__func__)))
+        elif isinstance(attr, classmethod):
+            setattr(cls, name, classmethod(_shared_profiler.wrap(method_name, attr.__func__)))
+        elif callable(attr) and not isinstance(attr, type):
+            setattr(cls, name, _shared_profiler.wrap(method_name, attr))
+
+    return cls
@@ -0,0 +1,354 @@
+import os
+import sys
+import json
+import math
+import time
+import sqlite3
+import hashlib
+import datetime
+import threading
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+from typing import Dict, List, Tuple, Union
+
+from path import (
+    SW_STOCK_LIST, INDICATOR_SQLITE3, PE_PB_SQLITE3, TVALUE_SQLITE3, DIVIDEND_RATE_SQLITE3,
+    HISTORY_PB_SQLITE3, CURVE_SQLITE3, MANIFEST_SQLITE3,
+)
+from stocklist import read_stock_list
+from roematrix import ROEMatrix
+from yieldcurve import YieldCurve
+
+
+HOST = '127.0.0.1'  # 只监听本机
+PORT = 8900
+WATCH_INTERVAL = 5  # 检查数据文件变化的间隔,单位秒
+CACHE_SIZE = 4096  # 每个数据版本缓存的响应数目
+ROE_YEARS = (3, 5, 7)
+
+# 快照表:(数据库, 表名, {原列名: 快照列名})
+SNAPSHOT_TABLES = [
+    (PE_PB_SQLITE3, 'pe-pb', {'pe': 'pe', 'pb': 'pb'}),
+    (TVALUE_SQLITE3, 'total-value', {'tvalue': 'tvalue'}),
+    (DIVIDEND_RATE_SQLITE3, 'dividend-rate', {'rate': 'dividend_rate'}),
+    (HISTORY_PB_SQLITE3, 'history-pb', {'maxPB': 'max_pb', 'minPB': 'min_pb', 'meanPB': 'mean_pb'}),
+]
+SOURCE_FILES = [SW_STOCK_LIST, INDICATOR_SQLITE3, CURVE_SQLITE3, MANIFEST_SQLITE3] + [item[0] for item in SNAPSHOT_TABLES]
+
+
+def _to_json_value(value):
+    """ NaN、inf和numpy类型转换为JSON可以表示的值 """
+
+    if isinstance(value, (np.floating, float)):
+        return None if not math.isfinite(value) else round(float(value), 4)
+    if isinstance(value, np.integer):
+        return int(value)
+
+    return value
+
+
+def _read_table(db_path: str, table: str, columns: List[str]) -> DataFrame:
+    """ 以只读方式读取数据表的stockcode和columns列,数据库或表不存在时返回空表,不会创建文件 """
+
+    empty = DataFrame(columns=['stockcode'] + columns)
+    if not os.path.exists(db_path):
+        return empty
+    con = sqlite3.connect(f'file:{db_path}?mode=ro', uri=True, timeout=30)
+    try:
+        fields = ', '.join(f'"{column}"' for column in ['stockcode'] + columns)
+        return pd.read_sql_query(f""" SELECT {fields} FROM '{table}' """, con)
+    except (sqlite3.OperationalError, pd.errors.DatabaseError):
+        return empty
+    finally:
+        con.close()
+
+
+def get_signature(files: List[str]) -> str:
+    """ 由数据文件的大小和修改时间计算数据版本,任一文件变化时版本改变 """
+
+    items = []
+    for file in files:
+        status = os.stat(file) if os.path.exists(file) else None
+        items.append(f'{file}:{status.st_size}:{status.st_mtime_ns}' if status else f'{file}:-')
+
+    return hashlib.blake2b('\n'.join(items).encode('utf-8'), digest_size=8).hexdigest()
+
+
+def load_dataset(stock_list_path: str = SW_STOCK_LIST) -> Dict:
+    """
+    载入查询服务使用的全部数据,返回不再修改的数据集:
+    - snapshot: 以6位代码为索引的股票快照,含名称、行业、PE、PB、总市值、股息率、历史PB和最近3/5/7年平均ROE;
+    - roe: ROEMatrix,数据库不存在时为None;curve: YieldCurve,数据库不存在时为None;
+    - version: 数据版本;loaded: 载入时间.
+    """
+
+    version = get_signature([stock_list_path] + SOURCE_FILES[1:])
+    snapshot = read_stock_list(stock_list_path)[['stockcode', 'name', 'stockclass']]
+    for db_path, table, columns in SNAPSHOT_TABLES:
+        df = _read_table(db_path, table, list(columns))
+        df.index = df['stockcode'].astype(str).str[0:6]
+        df = df[~df.index.duplicated()].drop(columns=['stockcode']).rename(columns=columns)
+        snapshot = snapshot.join(df.apply(pd.to_numeric, errors='coerce'))
+
+    # 当前PB在历史PB区间中的位置,0为历史最低,1为历史最高
+    with np.errstate(divide='ignore', invalid='ignore'):
+        snapshot['pb_position'] = (snapshot['pb'] - snapshot['min_pb']) / (snapshot['max_pb'] - snapshot['min_pb'])
+
+    roe = ROEMatrix(db_path=INDICATOR_SQLITE3) if os.path.exists(INDICATOR_SQLITE3) else None
+    rows = roe.get_rows(list(snapshot.index)) if roe is not None else np.full(len(snapshot), -1)
+    for years in ROE_YEARS:
+        average = roe.average_roe(years=years) if roe is not None and roe.get_annual_years() else np.array([])
+        snapshot[f'roe_{years}'] = average[np.maximum(rows, 0)] if len(average) else np.nan
+        snapshot.loc[rows < 0, f'roe_{years}'] = np.nan
+    curve = YieldCurve(db_path=CURVE_SQLITE3) if os.path.exists(CURVE_SQLITE3) else None
+
+    return {'snapshot': snapshot, 'roe': roe, 'curve': curve, 'version': version,
+            'loaded': datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
+
+
+class QueryService:
+    """
+    - 数据包的本地只读HTTP/JSON查询服务.calculate_comprehensive_information用于前端显示,但前端每次请求都要新建StockData,
+    重新读取两个xlsx文件,再打开最多五个SQLite文件.
+    - 本服务启动时一次载入股票清单、PE-PB/总市值/股息率快照、历史PB、ROE矩阵和国债收益率,全部查询在内存中完成;
+    每个响应带ETag(数据版本+请求),客户端以If-None-Match重复请求时返回304,相同请求的响应按数据版本缓存.
+    - 后台线程每WATCH_INTERVAL秒检查数据文件的大小和修改时间(含数据清单manifest.sqlite3),每日流程写入新数据后
+    重新载入并整体替换数据集,替换前的请求仍使用旧数据集;载入失败时保留旧数据集.
+    - 只提供查询,不发出网络请求,也不写任何数据文件.(2026-10-19)
+
+    接口(均为GET):
+    - /health: 数据版本、载入时间和股票数目
+    - /stocks/<code>: 一只股票的快照和全部报告期ROE,code为6位代码
+    - /classes: 各行业的股票数目
+    - /curve?date=yyyy-mm-dd: 当日或之前最近的10年期国债收益率,默认为最新日期
+    - /screen: 筛选股票,参数min_roe、years(默认5)、max_pe、max_pb、max_pb_position、min_dividend、stockclass、
+    sort(默认roe_<years>)、asc(1为升序)、top(默认50),返回满足全部条件的股票
+    """
+
+
+    def __init__(self, host: str = HOST, port: int = PORT, watch_interval: int = WATCH_INTERVAL,
+                 stock_list_path: str = SW_STOCK_LIST):
+        self.__host = host
+        self.__port = port
+        self.__watch_interval = watch_interval
+        self.__stock_list_path = stock_list_path
+        self.__lock = threading.Lock()
+        self.__stopped = threading.Event()
+        self.__server: Union[ThreadingHTTPServer, None] = None
+        self.__dataset = load_dataset(stock_list_path=stock_list_path)
+        self.__responses: Dict[str, Tuple[int, bytes]] = {}  # 当前数据版本的响应缓存
+        self.__pending: Union[str, None] = None  # 上次检查时发现的新版本
+
+
+    def get_dataset(self) -> Dict:
+        with self.__lock:
+            return self.__dataset
+
+
+    def reload(self, force: bool = False) -> bool:
+        """
+        数据文件有变化时重新载入,返回是否载入了新数据集.批量更新期间文件不断变化,
+        只有连续两次检查得到相同的新版本(写入已经停止)时才载入;force为True时立即载入.
+        """
+
+        version = get_signature([self.__stock_list_path] + SOURCE_FILES[1:])
+        if not force and version == self.get_dataset()['version']:
+            return False
+        if not force and version != self.__pending:
+            self.__pending = version
+            return False
+        dataset = load_dataset(stock_list_path=self.__stock_list_path)
+        with self.__lock:
+            self.__dataset, self.__responses = dataset, {}
+
+        return True
+
+
+    def __watch(self) -> None:
+        while not self.__stopped.wait(self.__watch_interval):
+            try:
+                if self.reload():
+                    print(f'查询服务已载入新数据,版本{self.get_dataset()["version"]}.')
+            except Exception as error:  # 写入未完成等原因载入失败,保留旧数据,下次再试
+                print(f'查询服务载入数据失败: {error}')
+
+
+    # 查询
+    def query_stock(self, dataset: Dict, code: str) -> Tuple[int, Dict]:
+        snapshot = dataset['snapshot']
+        if code not in snapshot.index:
+            return 404, {'error': f'没有股票{code}.'}
+        result = {'code': code}
+        result.update({key: _to_json_value(value) for key, value in snapshot.loc[code].items()})
+        result['roe'] = {key: _to_json_value(value) for key, value in dataset['roe'].get_stock_roe(code).items()} if dataset['roe'] else {}
+
+        return 200, result
+
+
+    def query_classes(self, dataset: Dict) -> Tuple[int, Dict]:
+        counts = dataset['snapshot']['stockclass'].value_counts().sort_index()
+
+        return 200, {'classes': [{'stockclass': name, 'count': int(count)} for name, count in counts.items()]}
+
+
+    def query_curve(self, dataset: Dict, params: Dict[str, str]) -> Tuple[int, Dict]:
+        curve = dataset['curve']
+        if curve is None or curve.get_latest_date() is None:
+            return 404, {'error': '没有国债收益率数据.'}
+        date = params.get('date') or curve.get_latest_date()
+
+        return 200, {'date': date, 'value': _to_json_value(curve.get_value_asof(date))}
+
+
+    def query_screen(self, dataset: Dict, params: Dict[str, str]) -> Tuple[int, Dict]:
+        snapshot = dataset['snapshot']
+        years, top = int(params.get('years', 5)), int(params.get('top', 50))
+        if years <= 0 or top <= 0:  # head(-1)会去掉最后一行,不是返回前几名
+            return 400, {'error': 'years和top应为正整数.'}
+        mask = np.ones(len(snapshot), dtype=bool)
+        with np.errstate(invalid='ignore'):
+            if 'min_roe' in params:
+                if dataset['roe'] is None:
+                    return 404, {'error': '没有ROE数据.'}
+                matrix_mask = dataset['roe'].screen(min_roe=float(params['min_roe']), years=years)
+                rows = dataset['roe'].get_rows(list(snapshot.index))
+                mask &= (rows >= 0) & matrix_mask[np.maximum(rows, 0)]
+            for key, column, compare in [('max_pe', 'pe', np.less_equal), ('max_pb', 'pb', np.less_equal),
+                                         ('max_pb_position', 'pb_position', np.less_equal),
+                                         ('min_dividend', 'dividend_rate', np.greater_equal)]:
+                if key in params:
+                    values = snapshot[column].to_numpy(dtype='float64')
+                    mask &= compare(values, float(params[key]))
+                    if key in ['max_pe', 'max_pb']:
+                        mask &= values > 0  # 亏损股票的PE为负数,不应满足PE上限
+        if 'stockclass' in params:
+            mask &= (snapshot['stockclass'] == params['stockclass']).to_numpy()
+
+        sort = params.get('sort', f'roe_{years}' if years in ROE_YEARS else 'roe_5')
+        if sort not in snapshot.columns:
+            return 400, {'error': f'不能按{sort}排序.'}
+        selected = snapshot[mask].sort_values(by=sort, ascending=params.get('asc') == '1', na_position='last')
+        selected = selected.head(top)
+        stocks = [{'code': code, **{key: _to_json_value(value) for key, value in row.items()}}
+                  for code, row in zip(selected.index, selected.to_dict('records'))]
+
+        return 200, {'count': int(mask.sum()), 'stocks': stocks}
+
+
+    def handle(self, target: str) -> Tuple[int, bytes, str]:
+        """ 处理一个GET请求,返回(状态码, 响应内容, ETag) """
+
+        dataset = self.get_dataset()
+        etag = f'"{dataset["version"]}-{hashlib.blake2b(target.encode("utf-8"), digest_size=6).hexdigest()}"'
+        with self.__lock:
+            cached = self.__responses.get(target) if dataset is self.__dataset else None
+        if cached:
+            return cached[0], cached[1], etag
+
+        parts = urlsplit(target)
+        path = [item for item in parts.path.split('/') if item]
+        params = {key: values[-1] for key, values in parse_qs(parts.query).items()}
+        try:
+            if path == ['health']:
+                status, body = 200, {'version': dataset['version'], 'loaded': dataset['loaded'], 'stocks': len(dataset['snapshot'])}
+            elif len(path) == 2 and path[0] == 'stocks':
+                status, body = self.query_stock(dataset, path[1])
+            elif path == ['classes']:
+                status, body = self.query_classes(dataset)
+            elif path == ['curve']:
+                status, body = self.query_curve(dataset, params)
+            elif path == ['screen']:
+                status, body = self.query_screen(dataset, params)
+            else:
+                status, body = 404, {'error': f'没有{parts.path}接口.'}
+        except ValueError as error:  # 参数无法转换为数字
+            status, body = 400, {'error': str(error)}
+        except Exception as error:  # 其他错误也返回JSON,不中断连接
+            status, body = 500, {'error': f'{type(error).__name__}: {error}'}
+
+        content = json.dumps(body, ensure_ascii=False).encode('utf-8')
+        if status == 200:
+            with self.__lock:
+                if dataset is self.__dataset:
+                    if len(self.__responses) >= CACHE_SIZE:
+                        self.__responses.clear()
+                    self.__responses[target] = (status, content)
+
+        return status, content, etag
+
+
+    def __make_handler(self):
+        service = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'  # 保持连接,前端连续请求不必每次重新建立连接
+
+            def do_GET(self):
+                status, content, etag = service.handle(self.path)
+                if status == 200 and self.headers.get('If-None-Match') == etag:
+                    self.send_response(304)
+                    self.send_header('ETag', etag)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json; charset=utf-8')
+                self.send_header('Content-Length', str(len(content)))
+                if status == 200:
+                    self.send_header('ETag', etag)
+                    self.send_header('Cache-Control', 'no-cache')
+                self.end_headers()
+                self.wfile.write(content)
+
+            def log_message(self, format, *args):  # 不逐条打印请求
+                pass
+
+        return Handler
+
+
+    def start(self) -> threading.Thread:
+        """ 在后台线程中启动服务和数据文件检查,返回服务线程 """
+
+        self.__server = ThreadingHTTPServer((self.__host, self.__port), self.__make_handler())
+        self.__server.daemon_threads = True
+        self.__stopped.clear()
+        threading.Thread(target=self.__watch, daemon=True).start()
+        thread = threading.Thread(target=self.__server.serve_forever, daemon=True)
+        thread.start()
+
+        return thread
+
+
+    def serve_forever(self) -> None:
+        """ 在当前线程中运行服务,Ctrl-C结束 """
+
+        thread = self.start()
+        try:
+            while thread.is_alive():
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+
+
+    def stop(self) -> None:
+        self.__stopped.set()
+        if self.__server is not None:
+            self.__server.shutdown()
+            self.__server.server_close()
+            self.__server = None
+
+
+    def get_address(self) -> str:
+        return f'http://{self.__host}:{self.__port}'
+
+
+if __name__ == "__main__":
+    # python queryservice.py [端口]
+    service = QueryService(port=int(sys.argv[1]) if len(sys.argv) > 1 else PORT)
+    print(f'查询服务已启动: {service.get_address()}, Ctrl-C结束.')
+    service.serve_forever()
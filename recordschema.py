@@ -0,0 +1,110 @@
+"""
+交易记录CSV文件的统一列定义和类型,全部读写交易记录的代码共用.(2026-10-19)
+
+- 原来每次pd.read_csv都由pandas推断类型:日期和股票代码是Python字符串对象,名称把同一个字符串重复几千次,
+总市值遇到'None'时整列变成object,init_trade_record_form_IPO要专门修补.
+- read_trade_record按下面的类型读取:日期为datetime64(parse_dates=False时保留字符串,供逐行处理字符串的旧方法使用),
+名称为category,指标列为float64(可选float32),'None'和'--'读作NaN;split_code=True时股票代码转为int32并增加交易所列.
+安装了pyarrow时使用pyarrow引擎解析.
+- write_trade_record把以上类型转换回文件格式:日期yyyy-mm-dd,股票代码'600000,缺失的总市值写回'None',与原文件逐字节相同;
+写入交易记录目录下的文件后在数据清单(manifest.py)中登记.
+- check_trade_record_csv检查的是文件本身的文本格式,仍然按原样读取.
+"""
+import os
+from typing import Dict, List, Union
+
+import pandas as pd
+from pandas import DataFrame
+
+from path import trade_record_path
+from manifest import get_manifest
+
+try:
+    import pyarrow  # noqa: F401
+    CSV_ENGINE = 'pyarrow'
+except ImportError:
+    CSV_ENGINE = 'c'
+
+
+TRADE_RECORD_COLUMNS = ['日期', '股票代码', '名称', '总市值', 'PB', 'PE', 'PS', 'PC', 'DIVIDEND']
+METRIC_COLUMNS = ['总市值', 'PB', 'PE', 'PS', 'PC', 'DIVIDEND']
+NA_VALUES = ['None', '--']  # 数据源缺失值的写法
+DATE_FORMAT = '%Y-%m-%d'
+
+
+def get_dtypes(columns: List[str], metric_dtype: str = 'float64') -> Dict[str, str]:
+    """ 返回columns中各列读取时使用的类型,日期由read_trade_record另行转换 """
+
+    dtypes = {'日期': 'str', '股票代码': 'str', '名称': 'category'}
+    dtypes.update({column: metric_dtype for column in METRIC_COLUMNS})
+
+    return {column: dtypes[column] for column in columns if column in dtypes}
+
+
+def split_code(codes: pd.Series) -> DataFrame:
+    """ 把"'600000"型的股票代码转换为int32代码和交易所(category,SH或SZ)两列 """
+
+    digits = codes.astype(str).str.strip().str.lstrip("'")
+    exchange = digits.str.startswith('6').map({True: 'SH', False: 'SZ'}).astype('category')
+
+    return DataFrame({'股票代码': digits.astype('int32'), '交易所': exchange}, index=codes.index)
+
+
+def read_trade_record(csv_file: str, usecols: Union[List[str], None] = None, nrows: Union[int, None] = None,
+                      parse_dates: bool = True, split_codes: bool = False, metric_dtype: str = 'float64') -> DataFrame:
+    """
+    按统一类型读取交易记录CSV文件.
+
+    :param csv_file: 文件路径.
+    :param usecols: 读取的列,默认为全部列.
+    :param nrows: 只读取开头nrows行(最近的nrows个交易日);pyarrow引擎不支持该参数,此时使用c引擎.
+    :param parse_dates: 为True时日期列转换为datetime64,否则保留yyyy-mm-dd字符串.
+    :param split_codes: 为True时股票代码转换为int32,并在其后增加交易所列.
+    :param metric_dtype: 指标列类型,float64或float32.
+    """
+
+    columns = usecols or pd.read_csv(csv_file, nrows=0).columns.tolist()
+    engine = CSV_ENGINE if nrows is None else 'c'
+    try:
+        df = pd.read_csv(csv_file, usecols=usecols, nrows=nrows, dtype=get_dtypes(columns, metric_dtype=metric_dtype),
+                         na_values=NA_VALUES, engine=engine)
+    except ValueError:  # 个别文件的指标列含有无法解析的文本,按文本读取后转换,无法解析的值为NaN
+        df = pd.read_csv(csv_file, usecols=usecols, nrows=nrows, dtype=get_dtypes(columns, metric_dtype='str'),
+                         na_values=NA_VALUES)
+        for column in [column for column in METRIC_COLUMNS if column in df.columns]:
+            df[column] = pd.to_numeric(df[column], errors='coerce').astype(metric_dtype)
+
+    if parse_dates and '日期' in df.columns:
+        df['日期'] = pd.to_datetime(df['日期'], format=DATE_FORMAT, errors='coerce')
+    if split_codes and '股票代码' in df.columns:
+        codes = split_code(df['股票代码'])
+        df['股票代码'] = codes['股票代码']
+        df.insert(df.columns.get_loc('股票代码') + 1, '交易所', codes['交易所'])
+
+    return df
+
+
+def to_file_format(df: DataFrame) -> DataFrame:
+    """ 把read_trade_record读取的类型转换回文件中的文本格式,去掉交易所列 """
+
+    df = df.drop(columns=['交易所'], errors='ignore').copy()
+    if '日期' in df.columns and pd.api.types.is_datetime64_any_dtype(df['日期']):
+        df['日期'] = df['日期'].dt.strftime(DATE_FORMAT)
+    if '股票代码' in df.columns and pd.api.types.is_integer_dtype(df['股票代码']):
+        df['股票代码'] = "'" + df['股票代码'].astype(str).str.zfill(6)
+    if '名称' in df.columns and isinstance(df['名称'].dtype, pd.CategoricalDtype):
+        df['名称'] = df['名称'].astype(str)
+    if '总市值' in df.columns and df['总市值'].isna().any():  # 原始数据中缺失的总市值写作'None',写回时保持不变
+        df['总市值'] = df['总市值'].astype(object).where(df['总市值'].notna(), 'None')
+
+    return df
+
+
+def write_trade_record(df: DataFrame, csv_file: str) -> None:
+    """ 按文件格式保存交易记录,并在数据清单中登记 """
+
+    content = to_file_format(df).to_csv(index=False).encode('utf-8')
+    with open(csv_file, 'wb') as file:
+        file.write(content)
+    if os.path.abspath(csv_file).startswith(os.path.abspath(trade_record_path) + os.sep):  # 其他目录的文件不登记
+        get_manifest().record_content(csv_file, content)
@@ -0,0 +1,233 @@
+import sqlite3
+import threading
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Tuple, Union
+
+from path import INDICATOR_SQLITE3, INDICATOR_ROE_FROM_1991
+
+
+class ROEMatrix:
+    """
+    - ROE宽表的内存矩阵.get_pushing_message和calculate_stock_mos每次查询都要用PRAGMA table_info读取字段,
+    把字段名当作字符串排序,再拼接WHERE语句,而且只能按固定的"最近N年ROE>=x"筛选.
+    - 本类把roe-all-stocks或roe-all-stocks-from-1991整张表载入为股票×报告期的float64矩阵,报告期标签解析为
+    (年份, 'Q4'/'Q2')的类型化数组,列按报告期降序排列.最近N年ROE>=x、平均ROE、是否计入最新半年ROE和top-k
+    都在整个股票池上一次向量化运算完成.
+    - 宽表(及由长表展开的兼容视图)沿用缺失ROE补0的约定,缺失的报告期读出为0,按0参加比较和平均;
+    只有无法转换为数字的ROE为NaN,任何比较均不成立,与SQL中NULL的行为相同.(2026-10-19)
+    """
+
+    TABLES = {
+        INDICATOR_SQLITE3: 'roe-all-stocks',
+        INDICATOR_ROE_FROM_1991: 'roe-all-stocks-from-1991',
+    }
+
+
+    def __init__(self, db_path: str = INDICATOR_SQLITE3):
+        """ :param db_path: INDICATOR_SQLITE3或INDICATOR_ROE_FROM_1991,表名由TABLES确定. """
+
+        self.__db_path = db_path
+        self.__table = self.TABLES[db_path]
+        self.__lock = threading.Lock()
+        self.__stock_codes: np.ndarray = np.array([], dtype=object)  # 含后缀的股票代码
+        self.__stock_names: np.ndarray = np.array([], dtype=object)
+        self.__stock_classes: np.ndarray = np.array([], dtype=object)
+        self.__period_years: np.ndarray = np.array([], dtype='int32')  # 报告期年份,与矩阵列对齐
+        self.__period_types: np.ndarray = np.array([], dtype='U2')  # 'Q4'为年度,'Q2'为半年
+        self.__roe: np.ndarray = np.empty((0, 0))  # 股票×报告期,列按报告期降序
+        self.__annual: np.ndarray = np.empty((0, 0))  # 仅年度列,按年份降序
+        self.__half: Union[np.ndarray, None] = None  # 最新年度之后一年的半年ROE,不存在为None
+        self.__position: Dict[str, int] = {}  # 股票代码(含后缀)到行号的映射
+
+        self.reload()
+
+
+    @staticmethod
+    def parse_period(field: str) -> Union[Tuple[int, str], None]:
+        """ 将Y2022、Y2023Q2型字段名解析为(2022, 'Q4')、(2023, 'Q2'),不是ROE字段返回None """
+
+        if not field.startswith('Y') or not field[1:5].isdigit():
+            return None
+        if field[5:] in ['', 'Q4']:
+            return int(field[1:5]), 'Q4'
+        if field[5:] == 'Q2':
+            return int(field[1:5]), 'Q2'
+
+        return None
+
+
+    def reload(self) -> None:
+        """ 从数据库重新载入ROE表,表结构或数据更新后调用 """
+
+        con = sqlite3.connect(self.__db_path)
+        with con:
+            df = pd.read_sql_query(f""" SELECT * FROM '{self.__table}' """, con)
+
+        fields = [(self.parse_period(col), col) for col in df.columns]
+        fields = sorted([item for item in fields if item[0] is not None], reverse=True)  # (年份, 类型)降序,同年Q4在Q2前
+        columns = [col for _, col in fields]
+        period_years = np.array([period[0] for period, _ in fields], dtype='int32')
+        period_types = np.array([period[1] for period, _ in fields], dtype='U2')
+        roe = df[columns].apply(pd.to_numeric, errors='coerce').to_numpy(dtype='float64')
+
+        annual = roe[:, period_types == 'Q4']
+        half = None
+        annual_years = period_years[period_types == 'Q4']
+        if annual_years.size:
+            # 与calculate_stock_mos判断半年数据的方法相同:只认最新年度之后一年的Q2
+            selected = (period_years == annual_years[0] + 1) & (period_types == 'Q2')
+            if selected.any():
+                half = roe[:, np.nonzero(selected)[0][0]]
+
+        with self.__lock:
+            self.__stock_codes = df['stockcode'].to_numpy(dtype=object)
+            self.__stock_names = df['stockname'].to_numpy(dtype=object)
+            self.__stock_classes = df['stockclass'].to_numpy(dtype=object)
+            self.__period_years, self.__period_types = period_years, period_types
+            self.__roe, self.__annual, self.__half = roe, annual, half
+            self.__position = {code: index for index, code in enumerate(self.__stock_codes)}
+
+
+    def get_periods(self) -> List[Tuple[int, str]]:
+        """ 返回矩阵各列的报告期,降序排列的(年份, 'Q4'/'Q2')列表 """
+
+        return list(zip(self.__period_years.tolist(), self.__period_types.tolist()))
+
+
+    def get_annual_years(self) -> List[int]:
+        """ 返回年度列的年份,降序排列 """
+
+        return self.__period_years[self.__period_types == 'Q4'].tolist()
+
+
+    def get_half_year(self) -> Union[int, None]:
+        """ 返回参与计算的最新半年ROE所属年份,没有返回None """
+
+        return self.get_annual_years()[0] + 1 if self.__half is not None else None
+
+
+    def get_stocks(self) -> np.ndarray:
+        """ 返回与矩阵行对齐的(stockcode, stockname, stockclass)数组 """
+
+        return np.column_stack([self.__stock_codes, self.__stock_names, self.__stock_classes])
+
+
+    def get_rows(self, codes: List[str]) -> np.ndarray:
+        """ 返回不含后缀的股票代码所在的行号数组,表中没有的股票为-1 """
+
+        stock_codes = [code + '.SH' if code.startswith('6') else code + '.SZ' for code in codes]
+
+        return np.array([self.__position.get(code, -1) for code in stock_codes], dtype='int64')
+
+
+    def get_annual_matrix(self, years: Union[int, None] = None) -> np.ndarray:
+        """ 返回最近years个年度的ROE矩阵(股票×年度,年份降序),years为None时返回全部年度 """
+
+        return self.__annual if years is None else self.__annual[:, :years]
+
+
+    def get_half_vector(self) -> Union[np.ndarray, None]:
+        """ 返回最新半年ROE向量,没有返回None """
+
+        return self.__half
+
+
+    def get_stock_roe(self, code: str) -> Dict[str, float]:
+        """ 返回一只股票全部报告期的ROE,键为Y2022、Y2023Q2型字段名,code不含后缀 """
+
+        row = self.get_rows([code])[0]
+        if row < 0:
+            return {}
+        labels = [f'Y{year}' if kind == 'Q4' else f'Y{year}Q2' for year, kind in self.get_periods()]
+
+        return dict(zip(labels, self.__roe[row].tolist()))
+
+
+    def average_roe(self, years: int, include_half: bool = True) -> np.ndarray:
+        """
+        计算全部股票最近years个年度的平均ROE.include_half为True且存在最新半年ROE时,
+        口径与calculate_stock_mos相同:(年度ROE之和 + 半年ROE) / (years + 0.5).缺失的报告期在表中为0,按0计入;
+        任一期为NaN(无法转换为数字)时结果为NaN.
+        """
+
+        roe_sum = self.__annual[:, :years].sum(axis=1)
+        count = float(years)
+        if include_half and self.__half is not None:
+            roe_sum = roe_sum + self.__half
+            count += 0.5
+
+        return roe_sum / count
+
+
+    def screen(self, min_roe: Union[float, List[float]], years: Union[int, None] = None,
+               half_min_roe: Union[float, None] = None) -> np.ndarray:
+        """
+        返回最近N个年度ROE均不低于门槛的布尔掩码.
+
+        :param min_roe: 门槛;为列表时逐年对应(第一个元素对应最近一年),此时years默认为列表长度,
+        与get_init_roe_condition_value和get_pushing_message的条件列表格式相同.
+        :param years: 年度数目,超过矩阵已有年度时没有股票满足条件.
+        :param half_min_roe: 不为None时,最新半年ROE也须不低于该值;没有半年数据时忽略.
+        :return: 与矩阵行对齐的布尔数组.
+        """
+
+        thresholds = np.atleast_1d(np.asarray(min_roe, dtype='float64'))
+        years = years if years is not None else (len(thresholds) if thresholds.size > 1 else 1)
+        if years > self.__annual.shape[1]:
+            return np.zeros(len(self.__stock_codes), dtype=bool)
+        thresholds = np.broadcast_to(thresholds, (years,)) if thresholds.size == 1 else thresholds[:years]
+
+        with np.errstate(invalid='ignore'):
+            mask = (self.__annual[:, :years] >= thresholds).all(axis=1)
+            if half_min_roe is not None and self.__half is not None:
+                mask &= self.__half >= half_min_roe
+
+        return mask
+
+
+    def select(self, min_roe: Union[float, List[float]], years: Union[int, None] = None,
+               half_min_roe: Union[float, None] = None, top_k: Union[int, None] = None,
+               include_half: bool = True) -> List[Tuple[str, str, str, float]]:
+        """
+        按screen的条件筛选股票,按平均ROE降序返回[(stockcode, stockname, stockclass, aver_roe), ...].
+
+        :param top_k: 只返回平均ROE最高的top_k只股票,为None时返回全部.
+        :param include_half: 平均ROE是否计入最新半年ROE.
+        其余参数与screen相同.
+        """
+
+        mask = self.screen(min_roe=min_roe, years=years, half_min_roe=half_min_roe)
+        years = years if years is not None else max(len(np.atleast_1d(min_roe)), 1)
+        aver_roe = self.average_roe(years=min(years, self.__annual.shape[1]), include_half=include_half)
+
+        rows = np.nonzero(mask & np.isfinite(aver_roe))[0]
+        rows = rows[np.argsort(-aver_roe[rows], kind='stable')]
+        if top_k is not None:
+            rows = rows[:top_k]
+
+        return list(zip(self.__stock_codes[rows].tolist(), self.__stock_names[rows].tolist(),
+                        self.__stock_classes[rows].tolist(), np.round(aver_roe[rows], 4).tolist()))
+
+
+_shared_matrices: Dict[str, ROEMatrix] = {}
+_shared_lock = threading.Lock()
+
+
+def get_roe_matrix(db_path: str = INDICATOR_SQLITE3) -> ROEMatrix:
+    """ 返回进程内共享的ROEMatrix实例,首次调用时载入数据 """
+
+    with _shared_lock:
+        if db_path not in _shared_matrices:
+            _shared_matrices[db_path] = ROEMatrix(db_path=db_path)
+
+    return _shared_matrices[db_path]
+
+
+def refresh_roe_matrix() -> None:
+    """ ROE表写入后调用,刷新已经载入的共享实例,尚未载入则无需处理 """
+
+    with _shared_lock:
+        matrices = list(_shared_matrices.values())
+    for matrix in matrices:
+        matrix.reload()
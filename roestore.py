@@ -0,0 +1,253 @@
+import sqlite3
+import threading
+from typing import Dict, List, Tuple, Union
+
+from path import INDICATOR_SQLITE3, INDICATOR_ROE_FROM_1991
+
+
+class ROEStore:
+    """
+    - ROE数据的长表存储.原来的roe-all-stocks和roe-all-stocks-from-1991是宽表,每出现一个新报告期,
+    update_roe_table和update_roe_table_from_1991就要把整张表读入pandas,插入一列后以to_sql(replace)整体重写.
+    这发生在线程池中,每个首先发现新报告期的线程都会重写一次,还会与其他线程的写入相互覆盖.
+    - 本类把ROE保存在roe-long表中,每行为(stockcode, period, roe),以(stockcode, period)为主键;股票名称和行业
+    保存在roe-stock-info表中.新的报告期只是若干条带索引的INSERT,不需要修改表结构,也不需要重写整张表.
+    - 原来的表名改为同名视图,由长表按报告期展开为宽表,字段顺序和缺失值填0的约定与原宽表相同,
+    所有读取宽表的代码不需要修改.出现新报告期时只重建视图.
+    - 首次打开仍是宽表的数据库时自动迁移.(2026-10-19)
+    """
+
+    VIEWS = {
+        INDICATOR_SQLITE3: 'roe-all-stocks',
+        INDICATOR_ROE_FROM_1991: 'roe-all-stocks-from-1991',
+    }
+
+    __schema_lock = threading.Lock()
+
+
+    def __init__(self, db_path: str = INDICATOR_SQLITE3):
+        """ :param db_path: INDICATOR_SQLITE3或INDICATOR_ROE_FROM_1991,兼容视图的名称由VIEWS确定. """
+
+        self.__db_path = db_path
+        self.__view = self.VIEWS[db_path]
+
+        with self.__schema_lock:
+            con = self.connect()
+            with con:
+                self.__create_tables(con)
+                self.__migrate_wide_table(con)
+            con.close()
+
+
+    def connect(self) -> sqlite3.Connection:
+        """ 返回数据库连接,多个线程同时写入时等待而不是报错 """
+
+        return sqlite3.connect(self.__db_path, timeout=30)
+
+
+    @staticmethod
+    def __create_tables(con: sqlite3.Connection) -> None:
+        """ 建立长表、股票信息表和报告期索引 """
+
+        sql = """
+        CREATE TABLE IF NOT EXISTS 'roe-long' (
+        stockcode TEXT NOT NULL,
+        period TEXT NOT NULL,
+        roe REAL,
+        PRIMARY KEY (stockcode, period)
+        ) WITHOUT ROWID
+        """
+        con.execute(sql)
+        con.execute(""" CREATE INDEX IF NOT EXISTS 'roe-long-period' ON 'roe-long' (period) """)
+        sql = """
+        CREATE TABLE IF NOT EXISTS 'roe-stock-info' (
+        stockcode TEXT NOT NULL PRIMARY KEY,
+        stockname TEXT,
+        stockclass TEXT
+        )
+        """
+        con.execute(sql)
+
+
+    def __migrate_wide_table(self, con: sqlite3.Connection) -> None:
+        """ 原宽表存在时,将数据逐列转入长表,删除宽表后以同名视图代替 """
+
+        sql = """ SELECT type FROM sqlite_master WHERE name=? """
+        tmp = con.execute(sql, (self.__view,)).fetchone()
+        if tmp is None or tmp[0] != 'table':
+            if tmp is None:
+                self.__rebuild_view(con)
+            return
+
+        columns = [row[1] for row in con.execute(f""" PRAGMA table_info('{self.__view}') """).fetchall()]
+        sql = f""" INSERT OR IGNORE INTO 'roe-stock-info' SELECT stockcode, stockname, stockclass FROM '{self.__view}' """
+        con.execute(sql)
+        for column in columns:
+            if 'stock' in column:
+                continue
+            sql = f""" INSERT OR REPLACE INTO 'roe-long' SELECT stockcode, ?, "{column}" FROM '{self.__view}' """
+            con.execute(sql, (column,))
+        con.execute(f""" DROP TABLE '{self.__view}' """)
+        self.__rebuild_view(con)
+
+
+    def get_periods(self, con: Union[sqlite3.Connection, None] = None) -> List[str]:
+        """ 返回长表中已有的报告期字段名,如['Y2023Q2', 'Y2022', ...],按宽表的字段顺序降序排列 """
+
+        own = con is None
+        con = self.connect() if own else con
+        periods = [row[0] for row in con.execute(""" SELECT DISTINCT period FROM 'roe-long' """).fetchall()]
+        if own:
+            con.close()
+
+        return sorted(periods, reverse=True)
+
+
+    def __rebuild_view(self, con: sqlite3.Connection) -> None:
+        """ 按长表中现有的报告期重建宽表视图,缺失的ROE显示为0,与原宽表补0的约定相同 """
+
+        fields = ''.join(f""", IFNULL(MAX(CASE WHEN r.period='{period}' THEN r.roe END), 0) AS {period}"""
+                         for period in self.get_periods(con=con))
+        con.execute(f""" DROP VIEW IF EXISTS '{self.__view}' """)
+        sql = f"""
+        CREATE VIEW '{self.__view}' AS
+        SELECT s.stockcode AS stockcode, s.stockname AS stockname, s.stockclass AS stockclass{fields}
+        FROM 'roe-stock-info' s LEFT JOIN 'roe-long' r ON r.stockcode = s.stockcode
+        GROUP BY s.stockcode
+        ORDER BY s.rowid
+        """
+        con.execute(sql)
+
+
+    @staticmethod
+    def __has_new_period(con: sqlite3.Connection, periods: set) -> bool:
+        """ 判断periods中是否有长表尚未出现的报告期 """
+
+        if not periods:
+            return False
+        placeholder = ','.join('?' * len(periods))
+        sql = f""" SELECT DISTINCT period FROM 'roe-long' WHERE period IN ({placeholder}) """
+
+        return len(con.execute(sql, tuple(periods)).fetchall()) < len(periods)
+
+
+    def has_period(self, period: str) -> bool:
+        """ 判断长表是否已有period报告期的数据 """
+
+        con = self.connect()
+        with con:
+            tmp = con.execute(""" SELECT 1 FROM 'roe-long' WHERE period=? LIMIT 1 """, (period,)).fetchone()
+        con.close()
+
+        return tmp is not None
+
+
+    def upsert(self, rows: List[Tuple[str, str, Union[float, None]]],
+               stock_info: Union[List[Tuple[str, str, str]], None] = None) -> None:
+        """
+        在一个事务中写入ROE,已有的(stockcode, period)被覆盖.只在出现新报告期时重建视图,新股票不需要重建.
+
+        :param rows: [(stockcode, period, roe), ...],stockcode含后缀,period为Y2022、Y2023Q2型字段名.
+        :param stock_info: [(stockcode, stockname, stockclass), ...],新股票须提供,才会出现在视图中.
+        :return: None
+        """
+
+        if not rows and not stock_info:
+            return
+
+        con = self.connect()
+        with con:
+            con.execute(""" BEGIN IMMEDIATE """)  # 先取得写锁,判断新报告期和重建视图不会与其他线程交错
+            # 视图以roe-stock-info为主表,新股票自动出现在视图中,只有报告期集合变化时才需要重建视图
+            new_period = self.__has_new_period(con, {row[1] for row in rows})
+
+            if stock_info:
+                sql = """
+                INSERT INTO 'roe-stock-info' VALUES (?, ?, ?)
+                ON CONFLICT(stockcode) DO UPDATE SET stockname=excluded.stockname, stockclass=excluded.stockclass
+                """
+                con.executemany(sql, stock_info)
+            con.executemany(""" INSERT OR REPLACE INTO 'roe-long' VALUES (?, ?, ?) """, rows)
+
+            if new_period:
+                self.__rebuild_view(con)
+        con.close()
+
+
+    def copy_period_from(self, source_db: str, period: str) -> int:
+        """
+        以一条集合运算从source_db的长表复制period报告期的ROE,只涉及这一个报告期.
+        source_db中有而本库没有的股票同时复制股票信息;本库有而source_db没有的股票该期记为0,与原宽表补0的约定相同.
+
+        :param source_db: 另一个ROE数据库的路径,须已由ROEStore建立长表.
+        :param period: Y2022型字段名.
+        :return: 写入的行数.
+        """
+
+        con = self.connect()
+        con.execute(""" ATTACH DATABASE ? AS source """, (source_db,))  # ATTACH不能在事务中执行
+        try:
+            with con:
+                con.execute(""" BEGIN IMMEDIATE """)
+                new_period = self.__has_new_period(con, {period})
+                sql = """ 
+                INSERT OR IGNORE INTO 'roe-stock-info' 
+                SELECT stockcode, stockname, stockclass FROM source.'roe-stock-info' 
+                """
+                con.execute(sql)
+                sql = """
+                INSERT INTO 'roe-long' (stockcode, period, roe)
+                SELECT s.stockcode, ?, IFNULL(r.roe, 0) FROM 'roe-stock-info' s
+                LEFT JOIN source.'roe-long' r ON r.stockcode = s.stockcode AND r.period = ?
+                WHERE true
+                ON CONFLICT(stockcode, period) DO UPDATE SET roe=excluded.roe
+                """
+                count = con.execute(sql, (period, period)).rowcount
+                if new_period:
+                    self.__rebuild_view(con)
+        finally:
+            con.execute(""" DETACH DATABASE source """)
+            con.close()
+
+        return count
+
+
+    def fill_null_with_zero(self) -> int:
+        """ 将长表中为NULL的ROE替换为0,代替原来读出整表fillna(0)后再to_sql的做法,返回修改的行数 """
+
+        con = self.connect()
+        with con:
+            count = con.execute(""" UPDATE 'roe-long' SET roe=0 WHERE roe IS NULL """).rowcount
+        con.close()
+
+        return count
+
+
+    def get_zero_codes(self, period: str) -> List[str]:
+        """ 返回period报告期ROE为0或缺失的股票代码(含后缀),即需要重新下载的股票 """
+
+        con = self.connect()
+        with con:
+            sql = """
+            SELECT s.stockcode FROM 'roe-stock-info' s
+            LEFT JOIN 'roe-long' r ON r.stockcode = s.stockcode AND r.period = ?
+            WHERE IFNULL(r.roe, 0) = 0
+            """
+            result = [row[0] for row in con.execute(sql, (period,)).fetchall()]
+        con.close()
+
+        return result
+
+
+_shared_stores: Dict[str, ROEStore] = {}
+_shared_lock = threading.Lock()
+
+
+def get_roe_store(db_path: str = INDICATOR_SQLITE3) -> ROEStore:
+    """ 返回进程内共享的ROEStore实例,首次调用时检查表结构并迁移宽表 """
+
+    with _shared_lock:
+        if db_path not in _shared_stores:
+            _shared_stores[db_path] = ROEStore(db_path=db_path)
+
+    return _shared_stores[db_path]
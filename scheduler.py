@@ -0,0 +1,184 @@
+import time
+import queue
+import threading
+from concurrent.futures import Future
+from urllib.parse import urlparse
+from typing import Any, Callable, Dict, Iterable, List, Union
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from metrics import get_metrics
+
+
+# 每个网站同时进行的请求数上限,按域名后缀匹配,未列出的网站使用DEFAULT_HOST_LIMIT
+HOST_LIMITS = {
+    'xueqiu.com': 8,
+    'qt.gtimg.cn': 16,
+    'sina.com.cn': 8,
+    '10jqka.com.cn': 4,
+    'cninfo.com.cn': 4,
+    'chinabond.com.cn': 4,
+    '163.com': 4,
+}
+DEFAULT_HOST_LIMIT = 8
+
+# GET请求在连接失败或网站返回限流、5xx状态码时重试,重试次数由HostLimitedAdapter计入Metrics
+RETRY = Retry(total=2, backoff_factor=0.5, status_forcelist=(429, 500, 502, 503, 504),
+              allowed_methods=frozenset(['GET', 'HEAD']), raise_on_status=False)
+
+
+class HostLimiter:
+    """ 按网站限制同时进行的请求数,全部session共用,超过上限的请求等待 """
+
+    def __init__(self, limits: Dict[str, int] = HOST_LIMITS, default: int = DEFAULT_HOST_LIMIT):
+        self.__limits = limits
+        self.__default = default
+        self.__lock = threading.Lock()
+        self.__semaphores: Dict[str, threading.BoundedSemaphore] = {}
+
+
+    def get_semaphore(self, host: str) -> threading.BoundedSemaphore:
+        """ 返回host对应的信号量,同一域名后缀的子域名共用一个 """
+
+        key = max((suffix for suffix in self.__limits if host == suffix or host.endswith('.' + suffix)), key=len, default=host)
+        with self.__lock:
+            if key not in self.__semaphores:
+                self.__semaphores[key] = threading.BoundedSemaphore(self.__limits.get(key, self.__default))
+            return self.__semaphores[key]
+
+
+_host_limiter = HostLimiter()
+
+
+class HostLimitedAdapter(HTTPAdapter):
+    """ 
+    发送请求前取得所属网站的信号量,保证每个网站的并发数不超过HOST_LIMITS.
+    同时向Metrics记录每次请求的耗时(含读取响应体)、状态码、字节数和重试次数.(2026-10-19)
+    """
+
+    def send(self, request, **kwargs):
+        host = urlparse(request.url).hostname or ''
+        semaphore = _host_limiter.get_semaphore(host)
+        with semaphore:
+            start = time.perf_counter()
+            try:
+                response = super().send(request, **kwargs)
+                size = len(response.content) if not kwargs.get('stream') else int(response.headers.get('Content-Length', 0))
+            except Exception:
+                get_metrics().record_request(host=host, seconds=time.perf_counter() - start)
+                raise
+            retries = getattr(response.raw, 'retries', None)
+            get_metrics().record_request(host=host, seconds=time.perf_counter() - start, status=response.status_code,
+                                         size=size, retries=len(retries.history) if retries is not None else 0)
+            return response
+
+
+def mount_host_limits(session: requests.Session) -> requests.Session:
+    """ 为session挂载HostLimitedAdapter(含RETRY重试策略),返回session本身 """
+
+    adapter = HostLimitedAdapter(pool_connections=16, pool_maxsize=32, max_retries=RETRY)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+
+    return session
+
+
+class WorkScheduler:
+    """
+    - 全局任务调度器.batch命令原来为31个申万行业各建一个线程池,等一个行业全部完成后再开始下一个,
+    每个行业最慢的股票都会拖住整个运行,线程池也要重建31次.
+    - 本类保持一组常驻工作线程,从有界队列中取出任务执行.全部股票一次提交,队列满时提交方阻塞等待(背压),
+    内存中不会堆积全部任务;每个网站的并发数由挂载在session上的HostLimitedAdapter限制.
+    整个运行的尾部延迟只取决于最慢的一只股票.(2026-10-19)
+    - 工作线程中再次调用submit或map(如被调度的方法内部又批量下载)时,任务在当前线程中直接执行,
+    不进入队列,避免全部工作线程都在等待排在队列中的子任务而死锁.(2026-10-19)
+    """
+
+
+    def __init__(self, workers: int = 16, queue_size: int = 256):
+        self.__queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self.__local = threading.local()  # 工作线程中is_worker为True
+        self.__workers = [threading.Thread(target=self.__work, daemon=True, name=f'scheduler-{index}') for index in range(workers)]
+        for worker in self.__workers:
+            worker.start()
+
+
+    def __work(self) -> None:
+        """ 工作线程主循环 """
+
+        self.__local.is_worker = True
+        while True:
+            future, func, args = self.__queue.get()
+            try:
+                self.__run(future, func, args)
+            finally:
+                self.__queue.task_done()
+
+
+    @staticmethod
+    def __run(future: Future, func: Callable, args: tuple) -> None:
+        """ 执行一个任务,结果或异常写入future """
+
+        if future.set_running_or_notify_cancel():
+            try:
+                future.set_result(func(*args))
+            except BaseException as error:
+                future.set_exception(error)
+
+
+    def get_worker_count(self) -> int:
+        return len(self.__workers)
+
+
+    def submit(self, func: Callable, *args) -> Future:
+        """ 提交一个任务,队列已满时阻塞等待;在工作线程中调用时直接在当前线程执行 """
+
+        future = Future()
+        if getattr(self.__local, 'is_worker', False):
+            self.__run(future, func, args)
+        else:
+            self.__queue.put((future, func, args))
+
+        return future
+
+
+    def map(self, func: Callable, items: Iterable, return_exceptions: bool = True,
+            on_result: Union[Callable[[Any, Any], None], None] = None) -> List:
+        """
+        对items中的每一项执行func(item),按输入顺序返回结果.
+
+        :param return_exceptions: 为True时出错的任务以异常对象代替结果,否则抛出第一个异常.
+        :param on_result: 每项完成时在工作线程中调用on_result(item, 结果或异常对象),用于即时记录进度.
+        """
+
+        futures = []
+        for item in items:
+            future = self.submit(func, item)
+            if on_result is not None:
+                future.add_done_callback(lambda done, item=item: on_result(item, done.exception() or done.result()))
+            futures.append(future)
+        results = []
+        for future in futures:
+            error = future.exception()
+            if error is not None and not return_exceptions:
+                raise error
+            results.append(error if error is not None else future.result())
+
+        return results
+
+
+_shared_scheduler: Union[WorkScheduler, None] = None
+_shared_lock = threading.Lock()
+
+
+def get_scheduler() -> WorkScheduler:
+    """ 返回进程内共享的WorkScheduler,首次调用时启动工作线程 """
+
+    global _shared_scheduler
+    with _shared_lock:
+        if _shared_scheduler is None:
+            _shared_scheduler = WorkScheduler()
+
+    return _shared_scheduler
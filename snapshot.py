@@ -0,0 +1,296 @@
+import os
+import gzip
+import json
+import zlib
+import shutil
+import sqlite3
+import hashlib
+import datetime
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Tuple, Union
+
+from path import BACKUP_FILE_PATH, data_package_path, trade_record_path
+from manifest import get_manifest
+
+try:
+    import zstandard
+    CODEC = 'zst'
+except ImportError:  # 没有安装zstandard时使用zlib,两种格式的对象可以并存
+    zstandard = None
+    CODEC = 'zlib'
+
+
+CHUNK_SIZE = 256 * 1024  # 分块大小
+SKIP_SUFFIXES = ('-journal', '-wal', '-shm', '.tmp')  # SQLite临时文件和写了一半的文件不备份
+
+
+def _compress(data: bytes) -> bytes:
+    if CODEC == 'zst':
+        return zstandard.ZstdCompressor(level=3).compress(data)
+    return zlib.compress(data, 6)
+
+
+def _decompress(data: bytes, codec: str) -> bytes:
+    if codec == 'zst':
+        if zstandard is None:
+            raise RuntimeError('该对象以zstd压缩,需要安装zstandard.')
+        return zstandard.ZstdDecompressor().decompress(data)
+    return zlib.decompress(data)
+
+
+def split_chunks(data: bytes, align: str) -> List[bytes]:
+    """
+    按CHUNK_SIZE切分文件内容.交易记录CSV的新数据插在文件开头,align为'end'时从文件末尾起对齐分块,
+    插入新行只改变第一块;SQLite文件在原位置修改页面、在末尾增长,align为'start'时从开头对齐.
+    """
+
+    if align == 'end':
+        head = len(data) % CHUNK_SIZE
+        chunks = [data[:head]] if head else []
+        return chunks + [data[index:index + CHUNK_SIZE] for index in range(head, len(data), CHUNK_SIZE)]
+
+    return [data[index:index + CHUNK_SIZE] for index in range(0, len(data), CHUNK_SIZE)]
+
+
+class SnapshotBackup:
+    """
+    - trade-record和data-package的增量快照备份.path.py定义了BACKUP_FILE_PATH却没有使用;整表to_sql(replace)和
+    整个CSV文件重写意味着一个错误就可能毁掉历史数据,而且无法恢复.
+    - 每个文件切分为256KB的块,以内容的blake2b散列为名保存在backup-file/objects下(安装了zstandard时用zstd压缩,
+    否则用zlib),相同内容只保存一次;每次快照在backup-file/snapshots下写一个清单,记录每个文件的块列表.
+    大小和修改时间与上次快照相同的文件直接沿用上次的块列表,不再读取.
+    - CSV文件从末尾对齐分块,每日在开头插入一行只新增一个块;SQLite文件用backup接口取得一致的副本后分块.
+    - restore_stock恢复一只股票的交易记录,restore_database恢复一个数据库,prune删除旧快照和不再引用的块.(2026-10-19)
+    """
+
+
+    def __init__(self, backup_path: str = BACKUP_FILE_PATH,
+                 sources: Union[Dict[str, str], None] = None, max_workers: int = 8):
+        self.__backup_path = backup_path
+        self.__objects_path = os.path.join(backup_path, 'objects')
+        self.__snapshots_path = os.path.join(backup_path, 'snapshots')
+        self.__sources = sources or {'trade-record': trade_record_path, 'data-package': data_package_path}
+        self.__max_workers = max_workers
+        self.__lock = threading.Lock()
+        os.makedirs(self.__objects_path, exist_ok=True)
+        os.makedirs(self.__snapshots_path, exist_ok=True)
+
+
+    def __object_file(self, digest: str, codec: str) -> str:
+        return os.path.join(self.__objects_path, digest[:2], f'{digest}.{codec}')
+
+
+    def __find_object(self, digest: str) -> Tuple[str, str]:
+        """ 返回(对象文件, 压缩格式),不存在时抛出FileNotFoundError """
+
+        for codec in [CODEC, 'zst', 'zlib']:
+            object_file = self.__object_file(digest, codec)
+            if os.path.exists(object_file):
+                return object_file, codec
+        raise FileNotFoundError(f'备份块{digest}不存在.')
+
+
+    def __store_chunk(self, chunk: bytes) -> Tuple[str, bool]:
+        """ 保存一个块,返回(散列, 是否为新块) """
+
+        digest = hashlib.blake2b(chunk, digest_size=20).hexdigest()
+        try:
+            self.__find_object(digest)
+            return digest, False
+        except FileNotFoundError:
+            pass
+        object_file = self.__object_file(digest, CODEC)
+        os.makedirs(os.path.dirname(object_file), exist_ok=True)
+        temp_file = f'{object_file}.{threading.get_ident()}.tmp'
+        with open(temp_file, 'wb') as file:
+            file.write(_compress(chunk))
+        os.replace(temp_file, object_file)
+
+        return digest, True
+
+
+    def __read_source(self, file: str) -> bytes:
+        """ 读取要备份的文件,SQLite数据库先用backup接口复制一份一致的副本 """
+
+        if not file.endswith('.sqlite3'):
+            with open(file, 'rb') as handle:
+                return handle.read()
+
+        with tempfile.TemporaryDirectory() as temp_path:
+            copy = os.path.join(temp_path, 'copy.sqlite3')
+            source, target = sqlite3.connect(file, timeout=30), sqlite3.connect(copy)
+            with target:
+                source.backup(target)
+            source.close()
+            target.close()
+            with open(copy, 'rb') as handle:
+                return handle.read()
+
+
+    def __list_files(self) -> Dict[str, str]:
+        """ 返回{快照中的相对路径: 文件绝对路径} """
+
+        files = {}
+        for name, root in self.__sources.items():
+            for path, _, file_names in os.walk(root):
+                for file_name in file_names:
+                    if file_name.startswith('.') or file_name.endswith(SKIP_SUFFIXES):
+                        continue
+                    file = os.path.join(path, file_name)
+                    files[os.path.join(name, os.path.relpath(file, root))] = file
+
+        return files
+
+
+    def list_snapshots(self) -> List[str]:
+        """ 返回全部快照名称,按时间升序排列 """
+
+        return sorted(file[:-len('.json.gz')] for file in os.listdir(self.__snapshots_path) if file.endswith('.json.gz'))
+
+
+    def load_manifest(self, snapshot: Union[str, None] = None) -> Dict:
+        """ 读取快照清单,snapshot为None时读取最新的快照,没有快照时返回空清单 """
+
+        snapshots = self.list_snapshots()
+        if snapshot is None:
+            if not snapshots:
+                return {'snapshot': None, 'files': {}}
+            snapshot = snapshots[-1]
+        with gzip.open(os.path.join(self.__snapshots_path, f'{snapshot}.json.gz'), 'rt', encoding='utf-8') as file:
+            return json.load(file)
+
+
+    def create(self) -> Dict[str, int]:
+        """
+        建立一次快照,返回统计:files(文件数)、changed(重新读取的文件数)、new_chunks(新增块数)、new_bytes(新增压缩后字节数).
+        """
+
+        previous = self.load_manifest()['files']
+        snapshot = datetime.datetime.now().strftime('%Y%m%d-%H%M%S')
+        if snapshot in self.list_snapshots():  # 同一秒内的第二次快照
+            snapshot += f'-{len([item for item in self.list_snapshots() if item.startswith(snapshot)])}'
+        entries, stats = {}, {'files': 0, 'changed': 0, 'new_chunks': 0, 'new_bytes': 0}
+
+        def backup_file(item: Tuple[str, str]) -> None:
+            relative, file = item
+            status = os.stat(file)
+            old = previous.get(relative)
+            if old and old['size'] == status.st_size and old['mtime_ns'] == status.st_mtime_ns:
+                entries[relative] = old
+                return
+            align = 'end' if file.endswith('.csv') else 'start'
+            data = self.__read_source(file)
+            chunks, new_chunks, new_bytes = [], 0, 0
+            for chunk in split_chunks(data, align=align):
+                digest, is_new = self.__store_chunk(chunk)
+                chunks.append(digest)
+                if is_new:
+                    new_chunks += 1
+                    new_bytes += os.path.getsize(self.__object_file(digest, CODEC))
+            entries[relative] = {'size': status.st_size, 'mtime_ns': status.st_mtime_ns, 'length': len(data),
+                                 'align': align, 'chunks': chunks}
+            with self.__lock:
+                stats['changed'] += 1
+                stats['new_chunks'] += new_chunks
+                stats['new_bytes'] += new_bytes
+
+        with ThreadPoolExecutor(max_workers=self.__max_workers) as pool:  # 散列和压缩时释放GIL
+            list(pool.map(backup_file, self.__list_files().items()))
+        stats['files'] = len(entries)
+
+        manifest = {'snapshot': snapshot, 'codec': CODEC, 'chunk_size': CHUNK_SIZE, 'files': dict(sorted(entries.items()))}
+        temp_file = os.path.join(self.__snapshots_path, f'{snapshot}.json.gz.tmp')
+        with gzip.open(temp_file, 'wt', encoding='utf-8') as file:
+            json.dump(manifest, file, ensure_ascii=False)
+        os.replace(temp_file, os.path.join(self.__snapshots_path, f'{snapshot}.json.gz'))
+
+        return stats
+
+
+    def __restore_file(self, entry: Dict, target: str) -> None:
+        """ 按清单条目还原一个文件,先写临时文件再改名 """
+
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        temp_file = f'{target}.restore.tmp'
+        with open(temp_file, 'wb') as file:
+            for digest in entry['chunks']:
+                object_file, codec = self.__find_object(digest)
+                with open(object_file, 'rb') as handle:
+                    file.write(_decompress(handle.read(), codec))
+        if os.path.getsize(temp_file) != entry['length']:
+            os.remove(temp_file)
+            raise ValueError(f'{target}还原后的大小与快照记录不符.')
+        os.replace(temp_file, target)
+
+
+    def __source_file(self, relative: str) -> str:
+        name, rest = relative.split(os.sep, 1)
+
+        return os.path.join(self.__sources[name], rest)
+
+
+    def restore_stock(self, code: str, snapshot: Union[str, None] = None, target: Union[str, None] = None) -> str:
+        """
+        从快照恢复一只股票的交易记录CSV文件,返回写入的文件路径.
+
+        :param code: 股票代码,不含后缀.
+        :param snapshot: 快照名称,默认为最新的快照.
+        :param target: 写入的文件路径,默认覆盖原位置.
+        """
+
+        files = self.load_manifest(snapshot)['files']
+        matched = [relative for relative in files
+                   if relative.startswith('trade-record' + os.sep) and os.path.basename(relative) == f'{code}.csv']
+        if not matched:
+            raise FileNotFoundError(f'快照中没有{code}的交易记录.')
+        target = target or self.__source_file(matched[0])
+        self.__restore_file(files[matched[0]], target)
+        if os.path.abspath(target).startswith(os.path.abspath(trade_record_path) + os.sep):  # 恢复到交易记录目录时重新登记
+            get_manifest().record_file(target)
+
+        return target
+
+
+    def restore_database(self, name: str, snapshot: Union[str, None] = None, target: Union[str, None] = None) -> str:
+        """
+        从快照恢复一个数据库(或data-package下的其他文件),返回写入的文件路径.
+
+        :param name: 文件名,如pe-pb.sqlite3,也可以是data-package下的相对路径.
+        """
+
+        files = self.load_manifest(snapshot)['files']
+        matched = [relative for relative in files if relative.startswith('data-package' + os.sep)
+                   and (os.path.basename(relative) == name or relative == os.path.join('data-package', name))]
+        if not matched:
+            raise FileNotFoundError(f'快照中没有{name}.')
+        target = target or self.__source_file(matched[0])
+        self.__restore_file(files[matched[0]], target)
+
+        return target
+
+
+    def prune(self, keep: int = 30) -> Dict[str, int]:
+        """ 只保留最近keep个快照,删除不再被引用的块,返回删除的快照数和块数 """
+
+        snapshots = self.list_snapshots()
+        removed = snapshots[:-keep] if keep > 0 else snapshots
+        for snapshot in removed:
+            os.remove(os.path.join(self.__snapshots_path, f'{snapshot}.json.gz'))
+
+        referenced = set()
+        for snapshot in self.list_snapshots():
+            for entry in self.load_manifest(snapshot)['files'].values():
+                referenced.update(entry['chunks'])
+        removed_chunks = 0
+        for prefix in os.listdir(self.__objects_path):
+            prefix_path = os.path.join(self.__objects_path, prefix)
+            for file in os.listdir(prefix_path):
+                if file.split('.')[0] not in referenced:
+                    os.remove(os.path.join(prefix_path, file))
+                    removed_chunks += 1
+            if not os.listdir(prefix_path):
+                shutil.rmtree(prefix_path)
+
+        return {'snapshots': len(removed), 'chunks': removed_chunks}
@@ -0,0 +1,171 @@
+import os
+import shutil
+import sqlite3
+import pandas as pd
+from pandas import DataFrame
+from typing import Dict, List, Tuple
+
+from path import DELISTED_RECORD_PATH, data_package_path, trade_record_path
+from manifest import DatasetManifest
+
+
+def read_stock_list(stock_list_path: str) -> DataFrame:
+    """
+    读取申万股票清单,只保留上交所和深交所的股票,返回code(6位代码)、stockcode(含后缀)、name和stockclass四列,以code为索引.
+    """
+
+    df = pd.read_excel(io=stock_list_path)
+    df = df[df['股票代码'].map(lambda x: ('.SZ' in x) or ('.SH' in x))]
+    result = DataFrame({
+        'code': df['股票代码'].str[0:6], 'stockcode': df['股票代码'],
+        'name': df['公司简称'], 'stockclass': df['新版一级行业'],
+    })
+
+    return result.drop_duplicates(subset=['code']).set_index('code', drop=False)
+
+
+def diff_stock_lists(old: DataFrame, new: DataFrame) -> Dict[str, List[Tuple]]:
+    """
+    比较新旧两份清单(read_stock_list的返回值),返回变化计划:
+    - new: 新上市(或新纳入)的股票,[(code, name, stockclass)]
+    - delisted: 退市(或移出)的股票,[(code, name, stockclass)]
+    - reclassified: 行业变化的股票,[(code, 原行业, 新行业)]
+    - renamed: 简称变化的股票,[(code, 原简称, 新简称)]
+    """
+
+    old_codes, new_codes = set(old.index), set(new.index)
+    common = sorted(old_codes & new_codes)
+    plan = {
+        'new': [(code, new.at[code, 'name'], new.at[code, 'stockclass']) for code in sorted(new_codes - old_codes)],
+        'delisted': [(code, old.at[code, 'name'], old.at[code, 'stockclass']) for code in sorted(old_codes - new_codes)],
+        'reclassified': [(code, old.at[code, 'stockclass'], new.at[code, 'stockclass']) for code in common
+                         if old.at[code, 'stockclass'] != new.at[code, 'stockclass']],
+        'renamed': [(code, old.at[code, 'name'], new.at[code, 'name']) for code in common
+                    if old.at[code, 'name'] != new.at[code, 'name']],
+    }
+
+    return plan
+
+
+class StockListReconciler:
+    """
+    - 申万股票清单变化时的增量调整,解决StockData文档中"检查当申万股票池清单发生变化时,如何更新数据库的资料"的TODO.
+    原来更换sw-stock-list.xlsx以后只能手工重建目录和数据表.
+    - plan比较新旧清单,得到新上市、退市、行业变化和简称变化四类股票;apply一次完成:
+    行业变化的股票把CSV文件移到新行业目录,并更新全部数据表中的stockclass;简称变化的股票更新全部数据表中的stockname
+    (CSV文件中的名称是当日的历史简称,不改写);退市股票的CSV文件移到delisted-record目录,
+    各数据表中的行移到delisted-record/delisted.sqlite3中的同名表<数据库>-<表名>后删除.
+    - 数据表指data-package下各sqlite3文件中含stockcode列的表(视图除外),stockcode为600000.SH或600000两种写法均可匹配.
+    - 新上市股票由StockData.reconcile_stock_list初始化.(2026-10-19)
+    """
+
+
+    def __init__(self, record_path: str = trade_record_path, db_path: str = data_package_path,
+                 archive_path: str = DELISTED_RECORD_PATH):
+        self.__record_path = record_path
+        self.__db_path = db_path
+        self.__archive_path = archive_path
+
+
+    def plan(self, old_list_path: str, new_list_path: str) -> Dict[str, List[Tuple]]:
+        """ 比较新旧清单文件,返回变化计划 """
+
+        return diff_stock_lists(old=read_stock_list(old_list_path), new=read_stock_list(new_list_path))
+
+
+    def get_tables(self) -> List[Tuple[str, str, List[str]]]:
+        """ 返回含stockcode列的全部数据表[(数据库文件, 表名, 列名)] """
+
+        tables = []
+        for file in sorted(os.listdir(self.__db_path)):
+            if not file.endswith('.sqlite3'):
+                continue
+            db_file = os.path.join(self.__db_path, file)
+            con = sqlite3.connect(db_file, timeout=30)
+            with con:
+                names = [row[0] for row in con.execute(""" SELECT name FROM sqlite_master WHERE type='table' """).fetchall()]
+                for name in names:
+                    columns = [row[1] for row in con.execute(f""" PRAGMA table_info('{name}') """).fetchall()]
+                    if 'stockcode' in columns:
+                        tables.append((db_file, name, columns))
+            con.close()
+
+        return tables
+
+
+    @staticmethod
+    def __stock_codes(code: str) -> Tuple[str, str]:
+        return code + ('.SH' if code.startswith('6') else '.SZ'), code
+
+
+    def __move_csv(self, code: str, source_path: str, target_path: str) -> bool:
+        """ 移动CSV文件并更新数据清单:移到其他行业目录时重新登记,移出交易记录目录时删除登记 """
+
+        source = os.path.join(source_path, f'{code}.csv')
+        if not os.path.exists(source):
+            return False
+        os.makedirs(target_path, exist_ok=True)
+        target = os.path.join(target_path, f'{code}.csv')
+        shutil.move(source, target)
+        manifest = DatasetManifest(record_path=self.__record_path)
+        if manifest.is_record_file(target):
+            manifest.record_file(target)
+        else:
+            manifest.remove(code)
+
+        return True
+
+
+    def apply(self, plan: Dict[str, List[Tuple]]) -> Dict[str, int]:
+        """
+        执行变化计划中的文件移动和数据表调整,新上市股票不在此处理.每个数据库的调整在一个事务中完成.
+
+        :return: 统计{moved: 移动的CSV文件数, archived: 归档的CSV文件数, updated_rows: 更新的行数, archived_rows: 归档的行数}
+        """
+
+        result = {'moved': 0, 'archived': 0, 'updated_rows': 0, 'archived_rows': 0}
+
+        # CSV文件
+        for code, old_class, new_class in plan['reclassified']:
+            result['moved'] += self.__move_csv(code, os.path.join(self.__record_path, old_class),
+                                               os.path.join(self.__record_path, new_class))
+        for code, _, stock_class in plan['delisted']:
+            result['archived'] += self.__move_csv(code, os.path.join(self.__record_path, stock_class),
+                                                  os.path.join(self.__archive_path, stock_class))
+
+        # 数据表
+        os.makedirs(self.__archive_path, exist_ok=True)
+        archive_db = os.path.join(self.__archive_path, 'delisted.sqlite3')
+        for db_file, table, columns in self.get_tables():
+            con = sqlite3.connect(db_file, timeout=30)
+            con.execute(""" ATTACH DATABASE ? AS archive """, (archive_db,))
+            with con:
+                if 'stockclass' in columns:
+                    sql = f""" UPDATE '{table}' SET stockclass=? WHERE stockcode IN (?, ?) """
+                    for code, _, new_class in plan['reclassified']:
+                        result['updated_rows'] += con.execute(sql, (new_class,) + self.__stock_codes(code)).rowcount
+                if 'stockname' in columns:
+                    sql = f""" UPDATE '{table}' SET stockname=? WHERE stockcode IN (?, ?) """
+                    for code, _, new_name in plan['renamed']:
+                        result['updated_rows'] += con.execute(sql, (new_name,) + self.__stock_codes(code)).rowcount
+                if plan['delisted']:
+                    archive_table = f'{os.path.basename(db_file)[:-len(".sqlite3")]}-{table}'
+                    con.execute(f""" CREATE TABLE IF NOT EXISTS archive.'{archive_table}' AS SELECT * FROM main.'{table}' WHERE 0 """)
+                    for code, _, _ in plan['delisted']:
+                        codes = self.__stock_codes(code)
+                        con.execute(f""" INSERT INTO archive.'{archive_table}' SELECT * FROM main.'{table}' WHERE stockcode IN (?, ?) """, codes)
+                        result['archived_rows'] += con.execute(f""" DELETE FROM main.'{table}' WHERE stockcode IN (?, ?) """, codes).rowcount
+            con.execute(""" DETACH DATABASE archive """)
+            con.close()
+
+        return result
+
+
+    def get_affected_classes(self, plan: Dict[str, List[Tuple]]) -> List[str]:
+        """ 返回成分发生变化的行业,这些行业的每日汇总需要重算 """
+
+        classes = {item[2] for item in plan['new'] + plan['delisted']}
+        classes.update(item[1] for item in plan['reclassified'])
+        classes.update(item[2] for item in plan['reclassified'])
+
+        return sorted(classes)
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# 各模块在仓库根目录下平铺,测试时把根目录加入搜索路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,79 @@
+import datetime
+import pytest
+
+from backfill import group_ranges, parse_valuation_kline
+
+
+TRADING_DAYS = [f'2024-01-{day:02d}' for day in range(1, 32)]
+
+
+def stamp(date: str) -> int:
+    """ 雪球kline的timestamp为毫秒,按本地时区换算 """
+
+    return int(datetime.datetime.strptime(date, '%Y-%m-%d').timestamp() * 1000)
+
+
+def test_group_ranges_empty():
+    assert group_ranges([], TRADING_DAYS) == []
+
+
+def test_group_ranges_merges_within_gap_and_sorts_input():
+    missing = ['2024-01-05', '2024-01-02', '2024-01-03']
+    assert group_ranges(missing, TRADING_DAYS, merge_within=2) == [('2024-01-02', '2024-01-05')]
+
+
+def test_group_ranges_splits_beyond_merge_within():
+    missing = ['2024-01-02', '2024-01-05', '2024-01-06', '2024-01-20']
+    assert group_ranges(missing, TRADING_DAYS, merge_within=2) == [
+        ('2024-01-02', '2024-01-06'), ('2024-01-20', '2024-01-20')]
+    assert group_ranges(missing, TRADING_DAYS, merge_within=1) == [
+        ('2024-01-02', '2024-01-02'), ('2024-01-05', '2024-01-06'), ('2024-01-20', '2024-01-20')]
+
+
+def test_parse_valuation_kline_maps_columns_and_drops_missing_market_capital():
+    result = {
+        'error_code': 0,
+        'data': {
+            'column': ['timestamp', 'close', 'pe', 'pb', 'ps', 'pcf', 'market_capital'],
+            'item': [
+                [stamp('2024-01-02'), 10.0, 8.5, 1.2, 2.0, 5.5, 1.0e10],
+                [stamp('2024-01-03'), 10.1, 8.6, 1.3, 2.1, 5.6, None],
+                [stamp('2024-01-04'), 10.2, None, 1.4, 2.2, 5.7, 1.1e10],
+            ],
+        },
+    }
+
+    df = parse_valuation_kline(result)
+
+    assert list(df.columns) == ['日期', '总市值', 'PB', 'PE', 'PS', 'PC']
+    assert list(df['日期']) == ['2024-01-02', '2024-01-04']
+    assert list(df['总市值']) == [1.0e10, 1.1e10]
+    assert list(df['PB']) == [1.2, 1.4]
+    assert df['PE'].iloc[0] == 8.5 and df['PE'].isna().iloc[1]
+    assert list(df['PC']) == [5.5, 5.7]
+
+
+def test_parse_valuation_kline_fills_absent_indicator_with_nan():
+    result = {'data': {'column': ['timestamp', 'market_capital'], 'item': [[stamp('2024-01-02'), 1.0e10]]}}
+
+    df = parse_valuation_kline(result)
+
+    assert list(df['日期']) == ['2024-01-02']
+    assert df[['PB', 'PE', 'PS', 'PC']].isna().all().all()
+
+
+@pytest.mark.parametrize('data', [{'column': ['timestamp', 'market_capital'], 'item': []}, {'column': [], 'item': None}])
+def test_parse_valuation_kline_returns_empty_frame_without_items(data):
+    df = parse_valuation_kline({'error_code': 0, 'data': data})
+
+    assert df.empty
+    assert list(df.columns) == ['日期', '总市值', 'PB', 'PE', 'PS', 'PC']
+
+
+@pytest.mark.parametrize('result', [
+    {'error_code': 400016, 'error_description': '重新登录帐号后再试', 'data': None},
+    {'error_code': 0},
+])
+def test_parse_valuation_kline_raises_on_failed_request(result):
+    with pytest.raises(ValueError):
+        parse_valuation_kline(result)
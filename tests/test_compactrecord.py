@@ -0,0 +1,59 @@
+import numpy as np
+import pandas as pd
+
+from compactrecord import compact_trade_record, decode_trade_record, encode_trade_record
+from recordschema import read_trade_record, write_trade_record
+
+
+def make_record(days: int = 500, seed: int = 0) -> pd.DataFrame:
+    """ 生成按日期降序排列的交易记录,估值由分段不变的分母计算,含缺失、补0和更名 """
+
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range('2021-01-04', periods=days)[::-1]
+    total_value = rng.uniform(1e10, 3e10, days).round(2)
+    df = pd.DataFrame({'日期': dates.strftime('%Y-%m-%d'), '股票代码': "'600000", '名称': '浦发银行', '总市值': total_value})
+    df.loc[days // 2:, '名称'] = 'ST浦发'
+    quarter = np.arange(days) // 60  # 每60个交易日一个报告期
+    for column, scale in [('PB', 2e10), ('PE', 2e9), ('PS', 5e9), ('PC', -1e9)]:
+        denominators = rng.uniform(0.5, 1.5, quarter.max() + 1) * scale
+        df[column] = np.round(total_value / denominators[quarter], 2)
+    df.loc[[3, 100], 'PE'] = 0.0  # 下载失败补0
+    df.loc[7, 'PS'] = np.nan
+    df.loc[11, 'PB'] = 9.99  # 与前后分母不符的值单独成段
+    df['DIVIDEND'] = rng.uniform(0, 0.05, days).round(4)
+
+    return df
+
+
+def test_encode_decode_round_trip(tmp_path):
+    csv_file = tmp_path / '600000.csv'
+    make_record().to_csv(csv_file, index=False)
+    df = read_trade_record(str(csv_file))
+
+    arrays = encode_trade_record(df)
+    decoded = decode_trade_record(arrays)
+    decoded['日期'] = decoded['日期'].astype(df['日期'].dtype)  # 不同pandas版本解析日期的精度不同
+
+    pd.testing.assert_frame_equal(decoded, df, check_categorical=False)
+    assert len(arrays['PB_starts']) < 20  # 500行只需按报告期保存少量分母
+    assert arrays['PE_override_rows'].tolist() == [3, 100]  # 补0的行无法确定分母,按例外值保存
+
+
+def test_compact_file_restores_identical_csv(tmp_path):
+    csv_file, npz_file, restored = tmp_path / '600000.csv', tmp_path / '600000.npz', tmp_path / 'restored.csv'
+    make_record(seed=1).to_csv(csv_file, index=False)
+
+    csv_size, npz_size = compact_trade_record((str(csv_file), str(npz_file)))
+    with np.load(npz_file) as data:
+        write_trade_record(decode_trade_record({key: data[key] for key in data.files}), str(restored))
+
+    assert npz_size < csv_size
+    assert restored.read_bytes() == csv_file.read_bytes()
+
+
+def test_empty_record_round_trip(tmp_path):
+    csv_file = tmp_path / 'empty.csv'
+    make_record().iloc[0:0].to_csv(csv_file, index=False)
+    df = read_trade_record(str(csv_file))
+
+    assert decode_trade_record(encode_trade_record(df)).empty
@@ -0,0 +1,48 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from industry import FIELDS, aggregate_industry, build_industry_series
+
+
+def test_aggregate_industry_weights_by_total_value():
+    df = pd.DataFrame({
+        '日期': ['2024-01-03'] * 3 + ['2024-01-02'],
+        '总市值': [100.0, 300.0, 0.0, 100.0],
+        'PB': [2.0, 1.0, 0.0, 2.0],
+        'PE': [10.0, -5.0, 0.0, 0.0],  # 亏损和补0的PE不参与计算
+        'PS': [1.0, 3.0, 0.0, 1.0],
+        'DIVIDEND': [0.01, 0.03, 0.02, 0.01],
+    })
+
+    result = aggregate_industry(df).set_index('date')
+
+    assert list(result.columns) == FIELDS
+    latest = result.loc['2024-01-03']
+    assert latest['count'] == 3 and latest['total_value'] == 400
+    assert latest['median_pb'] == pytest.approx(1.5)
+    assert latest['weighted_pb'] == pytest.approx(400 / (100 / 2 + 300 / 1))
+    assert latest['median_pe'] == pytest.approx(10) and latest['weighted_pe'] == pytest.approx(10)
+    assert latest['weighted_ps'] == pytest.approx(2)
+    assert latest['median_dividend'] == pytest.approx(0.02)
+    assert np.isnan(result.loc['2024-01-02', 'median_pe']) and np.isnan(result.loc['2024-01-02', 'weighted_pe'])
+
+
+def test_aggregate_industry_empty():
+    assert list(aggregate_industry(pd.DataFrame(columns=['日期', '总市值', 'PB', 'PE', 'PS', 'DIVIDEND'])).columns) == ['date'] + FIELDS
+
+
+def test_build_industry_series_reads_rows_since(tmp_path):
+    class_path = tmp_path / '银行'
+    class_path.mkdir()
+    for code, value in [('600000', 100.0), ('601398', 300.0)]:
+        pd.DataFrame({
+            '日期': ['2024-01-04', '2024-01-03', '2024-01-02'], '股票代码': f"'{code}", '名称': code,
+            '总市值': value, 'PB': 1.0, 'PE': 10.0, 'PS': 2.0, 'PC': 5.0, 'DIVIDEND': 0.01,
+        }).to_csv(class_path / f'{code}.csv', index=False)
+
+    stock_class, df = build_industry_series((str(tmp_path), '银行', '2024-01-03'))
+
+    assert stock_class == '银行'
+    assert df['date'].tolist() == ['2024-01-03', '2024-01-04']
+    assert df['total_value'].tolist() == [400.0, 400.0]
@@ -0,0 +1,55 @@
+import pandas as pd
+
+from recordschema import read_trade_record, write_trade_record, TRADE_RECORD_COLUMNS
+
+
+CONTENT = (
+    "日期,股票代码,名称,总市值,PB,PE,PS,PC,DIVIDEND\n"
+    "2024-01-04,'000001,平安银行,None,0.55,4.3,1.1,2.3,0.065\n"
+    "2024-01-03,'000001,平安银行,179839482391.0,0.5512,4.312345678,1.1,--,0.0\n"
+    "2024-01-02,'000001,平安银行,180000000000.0,0.56,4.35,1.12,2.31,0.0651\n"
+)
+
+
+def test_round_trip_is_byte_identical(tmp_path):
+    source, target = tmp_path / 'source.csv', tmp_path / 'target.csv'
+    source.write_text(CONTENT.replace(',--,', ',2.3,'), encoding='utf-8')
+
+    write_trade_record(read_trade_record(str(source)), str(target))
+
+    assert target.read_bytes() == source.read_bytes()
+
+
+def test_round_trip_with_split_codes_and_string_dates(tmp_path):
+    source, target = tmp_path / 'source.csv', tmp_path / 'target.csv'
+    source.write_text(CONTENT.replace(',--,', ',2.3,'), encoding='utf-8')
+
+    df = read_trade_record(str(source), split_codes=True, parse_dates=False)
+    assert df['股票代码'].tolist() == [1, 1, 1] and df['交易所'].tolist() == ['SZ'] * 3
+    write_trade_record(df, str(target))
+
+    assert target.read_bytes() == source.read_bytes()
+
+
+def test_read_types_and_missing_values(tmp_path):
+    source = tmp_path / 'source.csv'
+    source.write_text(CONTENT, encoding='utf-8')
+
+    df = read_trade_record(str(source))
+
+    assert list(df.columns) == TRADE_RECORD_COLUMNS
+    assert pd.api.types.is_datetime64_any_dtype(df['日期'])
+    assert isinstance(df['名称'].dtype, pd.CategoricalDtype)
+    assert df['总市值'].isna().tolist() == [True, False, False]  # 'None'读作NaN
+    assert df['PC'].isna().tolist() == [False, True, False]  # '--'读作NaN
+    assert str(df['PB'].dtype) == 'float64'
+
+
+def test_usecols_nrows_and_float32(tmp_path):
+    source = tmp_path / 'source.csv'
+    source.write_text(CONTENT, encoding='utf-8')
+
+    df = read_trade_record(str(source), usecols=['日期', 'PB'], nrows=2, parse_dates=False, metric_dtype='float32')
+
+    assert df['日期'].tolist() == ['2024-01-04', '2024-01-03']
+    assert str(df['PB'].dtype) == 'float32'
@@ -0,0 +1,62 @@
+import sqlite3
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from roematrix import ROEMatrix
+
+
+@pytest.fixture
+def matrix(tmp_path, monkeypatch):
+    db_path = str(tmp_path / 'indicator.sqlite3')
+    monkeypatch.setitem(ROEMatrix.TABLES, db_path, 'roe-all-stocks')
+    df = pd.DataFrame({
+        'stockcode': ['000001.SZ', '600000.SH', '000002.SZ'],
+        'stockname': ['平安银行', '浦发银行', '万科A'],
+        'stockclass': ['银行', '银行', '房地产'],
+        'Y2023Q2': [10.0, 5.0, 8.0],
+        'Y2022': [20.0, 12.0, 'abc'],  # 无法转换为数字的ROE读作NaN
+        'Y2021': [18.0, 25.0, 20.0],
+        'Y2020': [16.0, 30.0, 20.0],
+    })
+    con = sqlite3.connect(db_path)
+    df.to_sql('roe-all-stocks', con, index=False)
+    con.close()
+
+    return ROEMatrix(db_path=db_path)
+
+
+def test_periods_are_sorted_descending(matrix):
+    assert matrix.get_periods() == [(2023, 'Q2'), (2022, 'Q4'), (2021, 'Q4'), (2020, 'Q4')]
+    assert matrix.get_annual_years() == [2022, 2021, 2020]
+    assert matrix.get_half_year() == 2023
+
+
+def test_screen_with_single_and_per_year_thresholds(matrix):
+    assert matrix.screen(min_roe=15, years=3).tolist() == [True, False, False]
+    assert matrix.screen(min_roe=10, years=2).tolist() == [True, True, False]
+    assert matrix.screen(min_roe=[15, 10, 10]).tolist() == [True, False, False]
+    assert matrix.screen(min_roe=[10, 20]).tolist() == [False, True, False]
+
+
+def test_screen_with_half_year_threshold_and_too_many_years(matrix):
+    assert matrix.screen(min_roe=10, years=2, half_min_roe=9).tolist() == [True, False, False]
+    assert not matrix.screen(min_roe=0, years=4).any()
+
+
+def test_average_roe_includes_half_year_like_calculate_stock_mos(matrix):
+    with_half = matrix.average_roe(years=3)
+    without_half = matrix.average_roe(years=3, include_half=False)
+
+    assert with_half[0] == pytest.approx((20 + 18 + 16 + 10) / 3.5)
+    assert without_half[1] == pytest.approx((12 + 25 + 30) / 3)
+    assert np.isnan(with_half[2])  # 任一期为NaN时结果为NaN
+
+
+def test_select_orders_by_average_roe(matrix):
+    result = matrix.select(min_roe=10, years=3, include_half=False)
+
+    assert [item[0] for item in result] == ['600000.SH', '000001.SZ']
+    assert result[0][3] == pytest.approx(22.3333)
+    assert matrix.select(min_roe=10, years=2, top_k=1)[0][0] == '000001.SZ'  # (20+18+10)/2.5 > (12+25+5)/2.5
@@ -0,0 +1,85 @@
+import sqlite3
+
+import pytest
+
+import snapshot
+from snapshot import SnapshotBackup, split_chunks
+
+
+def test_split_chunks_alignment(monkeypatch):
+    monkeypatch.setattr(snapshot, 'CHUNK_SIZE', 4)
+    data = b'abcdefghij'
+
+    assert split_chunks(data, align='start') == [b'abcd', b'efgh', b'ij']
+    assert split_chunks(data, align='end') == [b'ab', b'cdef', b'ghij']
+    assert split_chunks(b'', align='end') == []
+    assert b''.join(split_chunks(data, align='end')) == data
+
+
+def test_prepending_to_end_aligned_data_keeps_later_chunks(monkeypatch):
+    monkeypatch.setattr(snapshot, 'CHUNK_SIZE', 4)
+    before = split_chunks(b'abcdefghij', align='end')
+    after = split_chunks(b'XYZ' + b'abcdefghij', align='end')
+
+    assert after[-2:] == before[-2:]
+
+
+@pytest.fixture
+def sources(tmp_path, monkeypatch):
+    monkeypatch.setattr(snapshot, 'CHUNK_SIZE', 64)
+    record_path, package_path = tmp_path / 'trade-record', tmp_path / 'data-package'
+    (record_path / '银行').mkdir(parents=True)
+    package_path.mkdir()
+    lines = [f"2024-01-{day:02d},'600000,浦发银行,1{day}0000000.0,0.5,4.1,1.2,2.3,0.05\n" for day in range(31, 0, -1)]
+    (record_path / '银行' / '600000.csv').write_text('日期,股票代码,名称,总市值,PB,PE,PS,PC,DIVIDEND\n' + ''.join(lines), encoding='utf-8')
+    con = sqlite3.connect(package_path / 'pe-pb.sqlite3')
+    with con:
+        con.execute(""" CREATE TABLE 'pe-pb' (stockcode TEXT, pe REAL, pb REAL) """)
+        con.execute(""" INSERT INTO 'pe-pb' VALUES ('600000.SH', 4.1, 0.5) """)
+    con.close()
+
+    return {'trade-record': str(record_path), 'data-package': str(package_path)}
+
+
+def test_snapshot_restores_stock_and_database(tmp_path, sources):
+    backup = SnapshotBackup(backup_path=str(tmp_path / 'backup-file'), sources=sources)
+    csv_file = tmp_path / 'trade-record' / '银行' / '600000.csv'
+    original = csv_file.read_bytes()
+
+    first = backup.create()
+    assert first['files'] == 2 and first['changed'] == 2
+
+    header, body = original.split(b'\n', 1)
+    new_line = "2024-02-01,'600000,浦发银行,120000000000.0,0.5,4.1,1.2,2.3,0.05\n".encode('utf-8')
+    csv_file.write_bytes(header + b'\n' + new_line + body)
+    second = backup.create()
+    assert second['changed'] == 1  # 数据库没有变化,沿用上次的块列表
+    total_chunks = len(split_chunks(csv_file.read_bytes(), align='end'))
+    assert total_chunks > 30 and second['new_chunks'] <= 3  # 开头插入一行只改变开头的几个块
+
+    oldest = backup.list_snapshots()[0]
+    restored = backup.restore_stock('600000', snapshot=oldest, target=str(tmp_path / 'restored.csv'))
+    assert open(restored, 'rb').read() == original
+    assert backup.restore_stock('600000', target=str(tmp_path / 'latest.csv')) and \
+        (tmp_path / 'latest.csv').read_bytes() == csv_file.read_bytes()
+
+    database = backup.restore_database('pe-pb.sqlite3', target=str(tmp_path / 'pe-pb.sqlite3'))
+    con = sqlite3.connect(database)
+    assert con.execute(""" SELECT pb FROM 'pe-pb' """).fetchone() == (0.5,)
+    con.close()
+    with pytest.raises(FileNotFoundError):
+        backup.restore_stock('000001', target=str(tmp_path / 'missing.csv'))
+
+
+def test_prune_keeps_latest_snapshot_restorable(tmp_path, sources):
+    backup = SnapshotBackup(backup_path=str(tmp_path / 'backup-file'), sources=sources)
+    csv_file = tmp_path / 'trade-record' / '银行' / '600000.csv'
+    backup.create()
+    csv_file.write_bytes(b'rewritten\n' * 50)
+    backup.create()
+
+    result = backup.prune(keep=1)
+
+    assert result['snapshots'] == 1 and result['chunks'] > 0
+    backup.restore_stock('600000', target=str(tmp_path / 'restored.csv'))
+    assert (tmp_path / 'restored.csv').read_bytes() == csv_file.read_bytes()
@@ -0,0 +1,51 @@
+import pandas as pd
+import pytest
+
+from stocklist import diff_stock_lists, read_stock_list
+
+
+def make_list(rows) -> pd.DataFrame:
+    """ 构造与read_stock_list返回值相同结构的清单,rows为[(code, name, stockclass)] """
+
+    df = pd.DataFrame(rows, columns=['code', 'name', 'stockclass'])
+    df['stockcode'] = df['code'].map(lambda code: code + ('.SH' if code.startswith('6') else '.SZ'))
+
+    return df[['code', 'stockcode', 'name', 'stockclass']].set_index('code', drop=False)
+
+
+def test_diff_stock_lists_reports_every_kind_of_change():
+    old = make_list([('000001', '平安银行', '银行'), ('000002', '万科A', '房地产'),
+                     ('600000', '浦发银行', '银行'), ('600001', '邯郸钢铁', '钢铁')])
+    new = make_list([('000001', '平安银行', '银行'), ('000002', '万科A', '建筑装饰'),
+                     ('600000', 'ST浦发', '银行'), ('688001', '华兴源创', '机械设备')])
+
+    plan = diff_stock_lists(old, new)
+
+    assert plan == {
+        'new': [('688001', '华兴源创', '机械设备')],
+        'delisted': [('600001', '邯郸钢铁', '钢铁')],
+        'reclassified': [('000002', '房地产', '建筑装饰')],
+        'renamed': [('600000', '浦发银行', 'ST浦发')],
+    }
+
+
+def test_diff_of_identical_lists_is_empty():
+    stock_list = make_list([('000001', '平安银行', '银行')])
+
+    assert diff_stock_lists(stock_list, stock_list.copy()) == {'new': [], 'delisted': [], 'reclassified': [], 'renamed': []}
+
+
+def test_read_stock_list_keeps_sh_and_sz_only(tmp_path):
+    pytest.importorskip('openpyxl')
+    excel_file = tmp_path / 'sw-stock-list.xlsx'
+    pd.DataFrame({
+        '股票代码': ['000001.SZ', '600000.SH', '830799.BJ', '600000.SH'],
+        '公司简称': ['平安银行', '浦发银行', '艾融软件', '浦发银行'],
+        '新版一级行业': ['银行', '银行', '计算机', '银行'],
+    }).to_excel(excel_file, index=False)
+
+    stock_list = read_stock_list(str(excel_file))
+
+    assert stock_list.index.tolist() == ['000001', '600000']
+    assert stock_list.loc['600000', 'stockcode'] == '600000.SH'
+    assert diff_stock_lists(stock_list, make_list([('000001', '平安银行', '银行'), ('600000', '浦发银行', '银行')]))['new'] == []
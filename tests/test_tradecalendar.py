@@ -0,0 +1,50 @@
+import json
+
+import pytest
+
+from tradecalendar import TradeCalendar
+
+
+@pytest.fixture
+def calendar(tmp_path):
+    calendar_file = tmp_path / 'trade-calendar.json'
+    holidays = {'2024': ['2024-10-01', '2024-10-02', '2024-10-03', '2024-10-04', '2024-10-07']}
+    calendar_file.write_text(json.dumps(holidays), encoding='utf-8')
+
+    return TradeCalendar(calendar_file=str(calendar_file))
+
+
+def test_holidays_and_weekends_are_not_trading_days(calendar):
+    assert not calendar.is_trading_day('2024-10-01')  # 国庆休市
+    assert not calendar.is_trading_day('2024-10-05')  # 周六
+    assert calendar.is_trading_day('2024-09-30')
+    assert calendar.is_trading_day('2024-10-08')
+
+
+def test_previous_and_next_trading_day_skip_the_holiday(calendar):
+    assert calendar.get_previous_trading_day('2024-10-08') == '2024-09-30'
+    assert calendar.get_previous_trading_day('2024-10-03') == '2024-09-30'
+    assert calendar.get_next_trading_day('2024-09-30') == '2024-10-08'
+    assert calendar.get_next_trading_day('2024-10-05') == '2024-10-08'
+
+
+def test_trading_days_in_range(calendar):
+    days = calendar.get_trading_days('2024-09-27', '2024-10-08')
+
+    assert days == ['2024-09-27', '2024-09-30', '2024-10-08']
+    assert calendar.count_trading_days('2024-09-27', '2024-10-08') == len(days)
+
+
+def test_years_without_schedule_open_on_weekdays(calendar):
+    assert calendar.get_covered_years() == [2024]
+    assert calendar.is_trading_day('2025-10-01')  # 文件中没有2025年,周三按开市处理
+
+
+def test_add_year_holidays_persists_and_validates(calendar, tmp_path):
+    calendar.add_year_holidays(2025, ['2025-10-01', '2025-10-02'])
+
+    assert not calendar.is_trading_day('2025-10-01')
+    reloaded = TradeCalendar(calendar_file=str(tmp_path / 'trade-calendar.json'))
+    assert reloaded.get_covered_years() == [2024, 2025]
+    with pytest.raises(ValueError):
+        calendar.add_year_holidays(2026, ['2025-12-31'])
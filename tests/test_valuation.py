@@ -0,0 +1,80 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from valuation import ValuationPercentile
+
+
+CODE, STOCK_CLASS = '600000', '银行'
+
+
+def make_record(days: int, seed: int = 0) -> pd.DataFrame:
+    """ 生成按日期降序排列的交易记录,含少量不大于0和缺失的指标值 """
+
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range('2019-01-02', periods=days)[::-1]
+    df = pd.DataFrame({'日期': dates.strftime('%Y-%m-%d'), '股票代码': f"'{CODE}", '名称': '浦发银行'})
+    df['总市值'] = rng.uniform(1e10, 3e10, days).round(2)
+    for indicator in ValuationPercentile.INDICATORS:
+        values = rng.uniform(0.5, 20, days).round(4)
+        values[rng.choice(days, 20, replace=False)] = -1.0  # 亏损
+        df[indicator] = values
+    df.loc[rng.choice(days, 5, replace=False), 'PE'] = np.nan
+    df['DIVIDEND'] = 0.01
+
+    return df
+
+
+def make_engine(tmp_path, name: str) -> ValuationPercentile:
+    return ValuationPercentile(db_path=str(tmp_path / f'{name}.sqlite3'), state_path=str(tmp_path / f'{name}-window'),
+                               record_path=str(tmp_path / 'trade-record'))
+
+
+@pytest.fixture
+def csv_file(tmp_path):
+    path = tmp_path / 'trade-record' / STOCK_CLASS
+    path.mkdir(parents=True)
+
+    return path / f'{CODE}.csv'
+
+
+def test_incremental_update_matches_rebuild(tmp_path, csv_file):
+    full = make_record(days=1100)  # 超过3年,3y窗口需要移出旧值
+    new_rows = 30
+
+    incremental = make_engine(tmp_path, 'incremental')
+    full.iloc[new_rows:].to_csv(csv_file, index=False)
+    assert incremental.update(code=CODE, stock_class=STOCK_CLASS) == -1  # 没有状态文件时整体重建
+    full.to_csv(csv_file, index=False)
+    assert incremental.update(code=CODE, stock_class=STOCK_CLASS) == new_rows
+    assert incremental.update(code=CODE, stock_class=STOCK_CLASS) == 0
+
+    rebuilt = make_engine(tmp_path, 'rebuilt')
+    rebuilt.rebuild(code=CODE, stock_class=STOCK_CLASS)
+
+    for window in ValuationPercentile.WINDOWS:
+        for indicator in ValuationPercentile.INDICATORS:
+            expected = rebuilt.get_percentile(code=CODE, indicator=indicator, window=window)
+            assert incremental.get_percentile(code=CODE, indicator=indicator, window=window) == expected
+    assert np.load(tmp_path / 'incremental-window' / f'{CODE}.npz')['PE-3y'].tolist() == \
+        np.load(tmp_path / 'rebuilt-window' / f'{CODE}.npz')['PE-3y'].tolist()
+
+
+def test_update_rebuilds_when_processed_rows_change(tmp_path, csv_file):
+    engine = make_engine(tmp_path, 'engine')
+    full = make_record(days=300)
+    full.to_csv(csv_file, index=False)
+    engine.rebuild(code=CODE, stock_class=STOCK_CLASS)
+
+    make_record(days=200, seed=1).to_csv(csv_file, index=False)  # 文件被重建,已处理的最后一天不在开头
+    assert engine.update(code=CODE, stock_class=STOCK_CLASS) == -1
+
+
+def test_calculate_percentile_and_invalid_current(tmp_path):
+    engine = make_engine(tmp_path, 'engine')
+    sorted_values = np.array([1.0, 2.0, 3.0, 4.0])
+
+    result = engine.calculate(sorted_values, 2.0)
+    assert result[1] == 0.5 and result[-1] == 4
+    assert engine.calculate(sorted_values, -1.0)[1] is None
+    assert engine.calculate(np.array([]), 2.0)[1:] == (None,) * 6 + (0,)
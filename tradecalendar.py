@@ -0,0 +1,119 @@
+import json
+import datetime
+import threading
+import numpy as np
+from typing import Dict, List, Union
+
+from path import TRADE_CALENDAR
+
+
+class TradeCalendar:
+    """
+    - 上交所/深交所交易日历.休市安排保存在stock-list/trade-calendar.json中,按年份记录周一至周五的休市日期,
+    周六周日一律休市.每年交易所公布次年休市安排后,用add_year_holidays追加一年即可.
+    - 文件中没有记载的年份按周一至周五全部开市处理.
+    - 每日任务据此判断是否需要运行,非交易日不发出任何网络请求;国债收益率回补也只请求交易日.(2026-10-19)
+    """
+
+
+    def __init__(self, calendar_file: str = TRADE_CALENDAR):
+        self.__calendar_file = calendar_file
+        self.__lock = threading.Lock()
+        with open(calendar_file, 'r', encoding='utf-8') as file:
+            self.__holidays: Dict[str, List[str]] = json.load(file)
+        self.__holiday_array = self.__build_holiday_array()
+
+
+    def __build_holiday_array(self) -> np.ndarray:
+        """ 将全部休市日期整理为numpy日期数组,供np.busday系列函数使用 """
+
+        dates = [date for days in self.__holidays.values() for date in days]
+
+        return np.array(sorted(dates), dtype='datetime64[D]')
+
+
+    @staticmethod
+    def __to_datetime64(date: Union[str, datetime.date]) -> np.datetime64:
+        """ 将yyyy-mm-dd型字符串或date转换为numpy日期 """
+
+        return np.datetime64(str(date)[0:10], 'D')
+
+
+    def get_covered_years(self) -> List[int]:
+        """ 返回日历文件已经记载休市安排的年份 """
+
+        return sorted(int(year) for year in self.__holidays)
+
+
+    def is_trading_day(self, date: Union[str, datetime.date]) -> bool:
+        """ 判断date是否为交易日,date为yyyy-mm-dd型字符串或date """
+
+        return bool(np.is_busday(self.__to_datetime64(date), holidays=self.__holiday_array))
+
+
+    def get_previous_trading_day(self, date: Union[str, datetime.date, None] = None) -> str:
+        """ 返回date之前(不含date)最近的交易日,date默认为今天,返回yyyy-mm-dd型字符串 """
+
+        date = datetime.date.today() if date is None else date
+        target = np.busday_offset(self.__to_datetime64(date), -1, roll='forward', holidays=self.__holiday_array)
+
+        return str(target)
+
+
+    def get_next_trading_day(self, date: Union[str, datetime.date, None] = None) -> str:
+        """ 返回date之后(不含date)最近的交易日,date默认为今天,返回yyyy-mm-dd型字符串 """
+
+        date = datetime.date.today() if date is None else date
+        target = np.busday_offset(self.__to_datetime64(date), 1, roll='backward', holidays=self.__holiday_array)
+
+        return str(target)
+
+
+    def get_trading_days(self, begin: Union[str, datetime.date], end: Union[str, datetime.date]) -> List[str]:
+        """ 返回begin至end(均包含)之间的全部交易日,升序排列的yyyy-mm-dd型字符串列表 """
+
+        dates = np.arange(self.__to_datetime64(begin), self.__to_datetime64(end) + 1, dtype='datetime64[D]')
+        dates = dates[np.is_busday(dates, holidays=self.__holiday_array)]
+
+        return [str(date) for date in dates]
+
+
+    def count_trading_days(self, begin: Union[str, datetime.date], end: Union[str, datetime.date]) -> int:
+        """ 返回begin至end(均包含)之间的交易日数目 """
+
+        return int(np.busday_count(self.__to_datetime64(begin), self.__to_datetime64(end) + 1, holidays=self.__holiday_array))
+
+
+    def add_year_holidays(self, year: int, holidays: List[str]) -> None:
+        """
+        追加或替换某一年的休市安排,并写回日历文件.
+
+        :param year: 年份.
+        :param holidays: 该年周一至周五的休市日期,yyyy-mm-dd型字符串列表,周末无需列出.
+        """
+
+        for date in holidays:
+            if not date.startswith(str(year)):
+                raise ValueError(f'{date}不属于{year}年.')
+
+        with self.__lock:
+            self.__holidays[str(year)] = sorted(set(holidays))
+            self.__holidays = dict(sorted(self.__holidays.items()))
+            self.__holiday_array = self.__build_holiday_array()
+            with open(self.__calendar_file, 'w', encoding='utf-8') as file:
+                json.dump(self.__holidays, file, ensure_ascii=False, indent=4)
+
+
+_shared_calendar: Union[TradeCalendar, None] = None
+_shared_lock = threading.Lock()
+
+
+def get_trade_calendar() -> TradeCalendar:
+    """ 返回进程内共享的TradeCalendar实例,首次调用时读取日历文件 """
+
+    global _shared_calendar
+    with _shared_lock:
+        if _shared_calendar is None:
+            _shared_calendar = TradeCalendar()
+
+    return _shared_calendar
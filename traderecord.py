@@ -5,10 +5,49 @@ import pandas as pd
 from pandas import DataFrame
 import requests
 from typing import Dict, List, Tuple, Union
-from concurrent.futures import ThreadPoolExecutor
 from path import trade_record_path, headers_10jqka, SW_STOCK_LIST, CNINFO_STOCK_LIST
+from adjustprice import AdjustPriceMatrix
+from executor import BatchExecutor, IO_BOUND, CPU_BOUND
+from scheduler import mount_host_limits
+from profiler import PROFILE_MODE, get_profiler, profile_methods
+from manifest import DatasetManifest
+from recordschema import read_trade_record, write_trade_record, TRADE_RECORD_COLUMNS, METRIC_COLUMNS
     
 
+def clean_raw_trade_record(args: Tuple[str, str]) -> None:
+    """
+    清洗一个已经移动到行业文件夹的原始数据文件,转换为交易记录CSV文件格式.
+    为进程池任务,args为(文件路径, 股票名称).原为move_raw_data_to_target_path中的循环体.
+    """
+
+    csv_file, stock_name = args
+
+    # pandas读取文件
+    df = pd.read_csv(csv_file)
+
+    # 保留code、date、market_value、PE_TTM、PS_TTM、PC_TTM、PB列
+    ndf = df[['date', 'code', 'market_value', 'PB', 'PE_TTM', 'PS_TTM', 'PC_TTM']].copy()
+
+    # 替换columns为日期,股票代码,总市值,PB,PE,PS,PC
+    ndf.columns = ['日期', '股票代码', '总市值', 'PB', 'PE', 'PS', 'PC']
+
+    # 将股票代码列前两个字符sh或sz去掉,在股票代码前加上“'“
+    ndf['股票代码'] = "'" + ndf['股票代码'].astype(str).str[2:]
+
+    # 获取股票名称后插入到股票代码列后面
+    ndf.insert(2, '名称', stock_name)
+
+    # 将日期列转换成字符串格式
+    ndf['日期'] = ndf['日期'].astype(str)
+
+    # 按照日期降序排列
+    ndf = ndf.sort_values(by='日期', ascending=False)
+
+    # 保存文件
+    write_trade_record(ndf, csv_file)
+
+
+@profile_methods
 class TradeRecordData:
     """
     从预测者网站下载历史日线初始数据后进一步处理, 生成WIN-STOCK系统所需格式交易记录CSV文件。
@@ -24,7 +63,7 @@ class TradeRecordData:
         self.__trade_record_path = trade_record_path
 
         # 标志cookies状态
-        self.__10jqka_session = requests.Session()
+        self.__10jqka_session = mount_host_limits(requests.Session())
         self.__10jqka_cookie_existed = False
 
         # 选取EDGE浏览器数据即可
@@ -185,13 +224,18 @@ class TradeRecordData:
         return self.__sw_stock_list['新版一级行业'].unique().tolist()
         
 
-    def get_latest_record_date(self):
-        """ 从历史交易记录文件查找最新的日期,查找的位置为self.__trade_record_path下第一个文件夹中的第一个文件 """
-        target_path = os.path.join(self.__trade_record_path, self.get_stock_classes()[0])
-        target_file = os.path.join(target_path, os.listdir(target_path)[0])
-        tmp_df = pd.read_csv(target_file, usecols=['日期'])
+    def get_latest_record_date(self) -> Union[str, None]:
+        """ 
+        返回历史交易记录的最新日期.
+        - 原来取self.__trade_record_path下第一个文件夹中os.listdir返回的第一个文件,结果取决于碰巧读到哪只股票.
+        改为数据清单中全部股票末日期的最大值,清单为空时先扫描登记一次.(2026-10-19)
+        """
 
-        return tmp_df.loc[0, '日期']
+        manifest = DatasetManifest(record_path=self.__trade_record_path)
+        if manifest.get_latest_date() is None:
+            manifest.scan()
+
+        return manifest.get_latest_date()
 
 
     def get_name_and_class_by_code(self, code: str) -> List:
@@ -226,13 +270,11 @@ class TradeRecordData:
         stock_class = self.get_name_and_class_by_code(code=code)[1]
         trade_csv_path = os.path.join(self.__trade_record_path, f'{stock_class}')
         trade_csv_file = os.path.join(trade_csv_path, f'{code}.csv')
-        trade_record_df = pd.read_csv(trade_csv_file)
+        trade_record_df = read_trade_record(trade_csv_file, parse_dates=False)
 
-        # 预处理 删除空行 格式转换
-        trade_record_df = trade_record_df.dropna()
-        if trade_record_df['总市值'].dtype == 'object':
-            trade_record_df['总市值'].replace(to_replace='None', value='0', inplace=True)
-            trade_record_df['总市值'] = trade_record_df['总市值'].astype('float64')
+        # 预处理 删除空行 总市值缺失('None')记为0,读取时已是float64,不再需要格式转换(2026-10-19)
+        trade_record_df = trade_record_df.dropna(subset=[column for column in trade_record_df.columns if column != '总市值'])
+        trade_record_df['总市值'] = trade_record_df['总市值'].fillna(0.00)
 
         # 计算从1991-01-01至今天需要下载的期数
         today = datetime.datetime.now().today()
@@ -249,14 +291,13 @@ class TradeRecordData:
             trade_record_df['DIVIDEND'] = 0.00
 
         # 保留需要的列,其余删除
-        standard_columns = ['日期', '股票代码', '名称', '总市值', 'PB', 'PE', 'PS', 'PC', 'DIVIDEND']
-        ndf = trade_record_df[standard_columns]
+        ndf = trade_record_df[TRADE_RECORD_COLUMNS].copy()
 
         # ['总市值', 'PB', 'PE', 'PS', 'PC', 'DIVIDEND'] 数字列保留两位小数
-        ndf[['总市值', 'PB', 'PE', 'PS', 'PC', 'DIVIDEND']] = ndf[['总市值', 'PB', 'PE', 'PS', 'PC', 'DIVIDEND']].round(2)
+        ndf[METRIC_COLUMNS] = ndf[METRIC_COLUMNS].round(2)
 
         # 保存文件
-        ndf.to_csv(trade_csv_file, index=False)
+        write_trade_record(ndf, trade_csv_file)
 
 
     def move_raw_data_to_target_path(self, raw_data: str, target_path: str) -> None:
@@ -271,6 +312,9 @@ class TradeRecordData:
         原始数据下载之后,首先创建StockData类的实例.执行本方法,将原始数据按照申万行业分类后移动到目标目录下。
         然后执行init_trade_record_from_IPO方法,补齐交易记录CSV文件中的缺失数据。
 
+        交易记录CSV文件不保留的adjust_price和close两列,另外整理为AdjustPriceMatrix后复权价格矩阵,
+        用于离线计算全部股票的期间涨跌幅排名.(2026-10-19)
+
         :param raw_data: 原始数据文件夹路径,为绝对路径.
         :param target_path: 目标文件夹路径,为绝对路径.
         :return: None
@@ -284,6 +328,10 @@ class TradeRecordData:
         if not os.path.exists(target_path):
             os.mkdir(target_path)
 
+        # 保留原始数据中的后复权价格和收盘价
+        AdjustPriceMatrix().build_from_raw_data(raw_data=raw_data)
+        print('后复权价格矩阵已经建立.')
+
         # 获取申万行业股票分类清单,获取每个行业的全部股票代码,将原始数据移动到目标文件夹.
         classes = self.get_stock_classes()
         for class_ in classes:
@@ -309,39 +357,16 @@ class TradeRecordData:
             for file in os.listdir(class_path):
                 os.rename(f'{class_path}/{file}', f'{class_path}/{file[2:]}')
             
-            """以下完成对目标文件数据清洗工作"""
-            for file in os.listdir(class_path):
-                # pandas读取文件
-                df = pd.read_csv(f'{class_path}/{file}')
-
-                # 保留code、date、market_value、PE_TTM、PS_TTM、PC_TTM、PB列
-                ndf = df[['date', 'code', 'market_value', 'PB', 'PE_TTM', 'PS_TTM', 'PC_TTM']]
-
-                # 替换columns为日期,股票代码,总市值,PB,PE,PS,PC
-                ndf.columns = ['日期', '股票代码', '总市值', 'PB', 'PE', 'PS', 'PC']
-
-                # 将股票代码列前两个字符sh或sz去掉,在股票代码前加上“'“
-                for index, item in ndf['股票代码'].items():
-                    ndf.loc[index, '股票代码'] = "'" + item[2:]
-
-                # 获取股票名称后插入到股票代码列后面
-                stock_name = self.get_name_and_class_by_code(code=file[:6])[0]
-                ndf.insert(2, '名称', stock_name)
-
-                # 将日期列转换成字符串格式
-                for index, item in ndf['日期'].items():
-                    ndf.loc[index, '日期'] = str(item)
-
-                # 按照日期降序排列
-                ndf = ndf.sort_values(by='日期', ascending=False)
-
-                # 保存文件
-                ndf.to_csv(f'{class_path}/{file}', index=False)
+            """以下完成对目标文件数据清洗工作,每个文件一个任务,在进程池中执行(2026-10-19)"""
+            tasks = [(f'{class_path}/{file}', self.get_name_and_class_by_code(code=file[:6])[0]) for file in os.listdir(class_path)]
+            BatchExecutor(kind=CPU_BOUND).map(clean_raw_trade_record, tasks, return_exceptions=False)
 
             print(f'{class_}行业数据移动完成.')
     
 
 if __name__ == "__main__":
+    if PROFILE_MODE:
+        get_profiler().start_command()
     case = TradeRecordData()
 
     # 数据迁移
@@ -351,19 +376,21 @@ if __name__ == "__main__":
 
     classes = case.get_stock_classes()
 
+    code_name_list = [code for clas in classes for code in case.get_stocks_of_specific_class(clas)]
+    code_list = [code[0][0:6] for code in code_name_list]
+    cpu_executor = BatchExecutor(kind=CPU_BOUND)  # 逐只股票的pandas处理在进程池中执行(2026-10-19)
+    io_executor = BatchExecutor(kind=IO_BOUND)  # 初始化要从同花顺下载分红数据,在线程池中执行
+
     print('正在初始化历史交易记录文件......')
-    for clas in classes:
-        code_name_class = case.get_stocks_of_specific_class(clas)
-        with ThreadPoolExecutor() as pool:
-            pool.map(case.init_trade_record_form_IPO, [code[0][0:6] for code in code_name_class])
+    io_executor.map_method(case, 'init_trade_record_form_IPO', code_list)
 
     print('正在检查历史交易记录文件......')
-    for clas in classes:
-        code_name_class = case.get_stocks_of_specific_class(clas)
-        for code in code_name_class:
-            result = case.check_trade_record_csv(code=code[0][0:6])
-            if result != 'ok':
-                print(f'{code[0]} {code[1]} {result}')
+    results = cpu_executor.map_method(case, 'check_trade_record_csv', code_list)
+    for code, result in zip(code_name_list, results):
+        if result != 'ok':
+            print(f'{code[0]} {code[1]} {result}')
 
     print('初始化历史交易记录文件完成.')
+    if PROFILE_MODE:
+        get_profiler().stop_command(name='init-trade-record')
 
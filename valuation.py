@@ -0,0 +1,217 @@
+import os
+import sqlite3
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Tuple, Union
+
+from path import HISTORY_PB_SQLITE3, VALUATION_WINDOW_PATH, trade_record_path
+from recordschema import read_trade_record
+
+
+class ValuationPercentile:
+    """
+    - 历史估值分位引擎.history-pb表只保存最大、最小和平均PB,"今天的PE处于5年分布的什么位置"这类问题
+    每次都要读取CSV文件并排序.
+    - 本类对每只股票的PB、PE、PS、PC计算3年、5年、10年和上市以来四个窗口的当前分位(窗口内不高于当前值的比例)
+    和10%、25%、50%、75%、90%分位值,结果保存在history-pb.sqlite3的valuation-percentile表中,按主键直接查询.
+    - 每个窗口的已排序数组保存在data-package/valuation-window目录.每日更新只读取CSV文件开头的新行(文件按日期降序),
+    以二分查找插入新值、删除移出窗口的旧值,不再整体排序.CSV文件被重建或修改了已处理的行时调用rebuild.
+    - 不大于0的值(亏损或下载失败补0)不参与分位计算.(2026-10-19)
+    """
+
+    INDICATORS = ['PB', 'PE', 'PS', 'PC']
+    WINDOWS = {'3y': 3, '5y': 5, '10y': 10, 'all': None}
+    QUANTILES = (0.1, 0.25, 0.5, 0.75, 0.9)
+    HEAD_ROWS = 60  # 增量更新时读取的CSV行数,新行超过此数时整体重建
+
+
+    def __init__(self, db_path: str = HISTORY_PB_SQLITE3, state_path: str = VALUATION_WINDOW_PATH,
+                 record_path: str = trade_record_path):
+        self.__db_path = db_path
+        self.__state_path = state_path
+        self.__record_path = record_path
+
+        con = sqlite3.connect(self.__db_path, timeout=30)
+        with con:
+            sql = """
+            CREATE TABLE IF NOT EXISTS 'valuation-percentile' (
+            stockcode TEXT NOT NULL,
+            indicator TEXT NOT NULL,
+            window TEXT NOT NULL,
+            date TEXT NOT NULL,
+            current REAL,
+            percentile REAL,
+            q10 REAL,
+            q25 REAL,
+            q50 REAL,
+            q75 REAL,
+            q90 REAL,
+            count INTEGER,
+            PRIMARY KEY (stockcode, indicator, window)
+            ) WITHOUT ROWID
+            """
+            con.execute(sql)
+        con.close()
+
+
+    def __read_csv(self, code: str, stock_class: str, nrows: Union[int, None] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """ 读取交易记录CSV,返回按日期升序排列的日期数组和 日期×指标 数组 """
+
+        csv_file = os.path.join(self.__record_path, stock_class, f'{code}.csv')
+        df = read_trade_record(csv_file, usecols=['日期'] + self.INDICATORS, nrows=nrows)
+        df = df.dropna(subset=['日期']).drop_duplicates(subset=['日期'])
+        dates = df['日期'].to_numpy().astype('datetime64[D]')
+        values = df[self.INDICATORS].to_numpy(dtype='float64')
+        order = np.argsort(dates, kind='stable')
+
+        return dates[order], values[order]
+
+
+    def __state_file(self, code: str) -> str:
+        return os.path.join(self.__state_path, f'{code}.npz')
+
+
+    def __window_start(self, latest: np.datetime64, years: Union[int, None]) -> np.datetime64:
+        """ 窗口起点(含),为None时不限制 """
+
+        if years is None:
+            return np.datetime64('1900-01-01', 'D')
+        latest_date = pd.Timestamp(latest)
+
+        return np.datetime64((latest_date - pd.DateOffset(years=years)).date(), 'D') + 1
+
+
+    @staticmethod
+    def __valid(values: np.ndarray) -> np.ndarray:
+        return values[np.isfinite(values) & (values > 0)]
+
+
+    def rebuild(self, code: str, stock_class: str) -> None:
+        """ 读取完整的CSV文件,重新建立该股票全部窗口的已排序数组并计算分位 """
+
+        dates, values = self.__read_csv(code=code, stock_class=stock_class)
+        state = {'dates': dates, 'values': values}
+        if len(dates):
+            for window, years in self.WINDOWS.items():
+                selected = dates >= self.__window_start(dates[-1], years)
+                for column, indicator in enumerate(self.INDICATORS):
+                    state[f'{indicator}-{window}'] = np.sort(self.__valid(values[selected, column]))
+        self.__save_state(code=code, state=state)
+
+
+    def update(self, code: str, stock_class: str) -> int:
+        """
+        把CSV中尚未处理的新交易日并入各窗口,返回并入的行数.没有状态文件、新行过多或已处理的最后一行
+        不在CSV开头时整体重建.
+        """
+
+        state = self.__load_state(code=code)
+        if state is None or len(state['dates']) == 0:
+            self.rebuild(code=code, stock_class=stock_class)
+            return -1
+
+        dates, values = self.__read_csv(code=code, stock_class=stock_class, nrows=self.HEAD_ROWS)
+        last_date = state['dates'][-1]
+        if last_date not in dates:
+            self.rebuild(code=code, stock_class=stock_class)
+            return -1
+
+        new = dates > last_date
+        new_dates, new_values = dates[new], values[new]
+        if len(new_dates) == 0:
+            return 0
+
+        all_dates = np.concatenate([state['dates'], new_dates])
+        all_values = np.concatenate([state['values'], new_values])
+        for window, years in self.WINDOWS.items():
+            old_start = self.__window_start(last_date, years)
+            new_start = self.__window_start(all_dates[-1], years)
+            evicted = (state['dates'] >= old_start) & (state['dates'] < new_start)
+            added = new_dates >= new_start
+            for column, indicator in enumerate(self.INDICATORS):
+                key = f'{indicator}-{window}'
+                window_values = state[key]
+                for value in self.__valid(state['values'][evicted, column]):  # 删除移出窗口的旧值
+                    position = np.searchsorted(window_values, value)
+                    window_values = np.delete(window_values, position)
+                insert = np.sort(self.__valid(new_values[added, column]))
+                window_values = np.insert(window_values, np.searchsorted(window_values, insert), insert)
+                state[key] = window_values
+
+        state['dates'], state['values'] = all_dates, all_values
+        self.__save_state(code=code, state=state)
+
+        return len(new_dates)
+
+
+    def __load_state(self, code: str) -> Union[Dict[str, np.ndarray], None]:
+        state_file = self.__state_file(code=code)
+        if not os.path.exists(state_file):
+            return None
+        with np.load(state_file) as data:
+            return {key: data[key] for key in data.files}
+
+
+    def __save_state(self, code: str, state: Dict[str, np.ndarray]) -> None:
+        """ 保存已排序数组,同时计算当前分位写入valuation-percentile表 """
+
+        if not os.path.exists(self.__state_path):
+            os.makedirs(self.__state_path, exist_ok=True)
+        np.savez(self.__state_file(code=code), **state)
+
+        if len(state['dates']) == 0:
+            return
+        stock_code = code + '.SH' if code.startswith('6') else code + '.SZ'
+        date = str(state['dates'][-1])
+        rows = []
+        for window in self.WINDOWS:
+            for column, indicator in enumerate(self.INDICATORS):
+                window_values = state[f'{indicator}-{window}']
+                current = float(state['values'][-1, column])
+                rows.append((stock_code, indicator, window, date) + self.calculate(window_values, current))
+
+        con = sqlite3.connect(self.__db_path, timeout=30)
+        with con:
+            sql = """ INSERT OR REPLACE INTO 'valuation-percentile' VALUES (?,?,?,?,?,?,?,?,?,?,?,?) """
+            con.executemany(sql, rows)
+        con.close()
+
+
+    def calculate(self, sorted_values: np.ndarray, current: float) -> Tuple:
+        """ 由已排序数组计算(current, percentile, q10, q25, q50, q75, q90, count),当前值无效时分位为None """
+
+        count = len(sorted_values)
+        if count == 0:
+            return (current, None) + (None,) * len(self.QUANTILES) + (0,)
+        quantiles = tuple(round(float(np.quantile(sorted_values, q)), 4) for q in self.QUANTILES)
+        if not np.isfinite(current) or current <= 0:
+            return (current, None) + quantiles + (count,)
+        percentile = np.searchsorted(sorted_values, current, side='right') / count
+
+        return (current, round(float(percentile), 4)) + quantiles + (count,)
+
+
+    def get_percentile(self, code: str, indicator: str = 'PB', window: str = '5y') -> Dict:
+        """ 按主键查询一只股票某个指标某个窗口的分位结果,没有返回空字典,code不含后缀 """
+
+        stock_code = code + '.SH' if code.startswith('6') else code + '.SZ'
+        con = sqlite3.connect(self.__db_path, timeout=30)
+        con.row_factory = sqlite3.Row
+        with con:
+            sql = """ SELECT * FROM 'valuation-percentile' WHERE stockcode=? AND indicator=? AND window=? """
+            tmp = con.execute(sql, (stock_code, indicator.upper(), window)).fetchone()
+        con.close()
+
+        return dict(tmp) if tmp is not None else {}
+
+
+    def get_percentile_table(self, indicator: str = 'PB', window: str = '5y') -> pd.DataFrame:
+        """ 返回全部股票某个指标某个窗口的分位结果 """
+
+        con = sqlite3.connect(self.__db_path, timeout=30)
+        with con:
+            sql = """ SELECT * FROM 'valuation-percentile' WHERE indicator=? AND window=? """
+            df = pd.read_sql_query(sql, con, params=(indicator.upper(), window))
+        con.close()
+
+        return df
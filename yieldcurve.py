@@ -0,0 +1,140 @@
+import sqlite3
+import datetime
+import threading
+import numpy as np
+import pandas as pd
+from typing import Union
+
+from path import CURVE_SQLITE3
+
+
+class YieldCurve:
+    """
+    - 10年期国债到期收益率的内存查询缓存.yield-curve表由init_curve_value_table以to_sql(replace)重建,date1字段没有索引,
+    calculate_stock_mos查找"最近的非0收益率"时要逐日发出最多30条SELECT语句.
+    - 本类一次性把整张表载入按日期排序的numpy数组,并另存一份剔除0值后的数组,as-of查询用二分查找完成,
+    同时支持对日期列做向量化的as-of连接.
+    - update_curve_value_table写入新数据后调用refresh刷新缓存.(2026-10-19)
+    """
+
+
+    def __init__(self, db_path: str = CURVE_SQLITE3):
+        self.__db_path = db_path
+        self.__lock = threading.Lock()
+        self.__dates: np.ndarray = np.array([], dtype='datetime64[D]')  # 全部日期,升序
+        self.__values: np.ndarray = np.array([], dtype='float64')
+        self.__nonzero_dates: np.ndarray = np.array([], dtype='datetime64[D]')  # 剔除0值后的日期,升序
+        self.__nonzero_values: np.ndarray = np.array([], dtype='float64')
+
+        self.refresh()
+
+
+    def refresh(self) -> None:
+        """ 从数据库重新载入收益率序列 """
+
+        con = sqlite3.connect(self.__db_path)
+        with con:
+            rows = con.execute(""" SELECT date1, value1 FROM 'yield-curve' """).fetchall()
+
+        dates = np.array([row[0] for row in rows], dtype='datetime64[D]')
+        values = np.array([row[1] if row[1] is not None else 0.00 for row in rows], dtype='float64')
+        order = np.argsort(dates, kind='stable')
+        dates, values = dates[order], values[order]
+        nonzero = values != 0
+
+        with self.__lock:
+            self.__dates, self.__values = dates, values
+            self.__nonzero_dates, self.__nonzero_values = dates[nonzero], values[nonzero]
+
+
+    @staticmethod
+    def __to_datetime64(date: Union[str, datetime.date]) -> np.datetime64:
+        """ 将yyyy-mm-dd型字符串或date转换为numpy日期 """
+
+        return np.datetime64(str(date)[0:10], 'D')
+
+
+    def get_latest_date(self) -> Union[str, None]:
+        """ 返回缓存中最新的日期,缓存为空返回None """
+
+        with self.__lock:
+            return str(self.__dates[-1]) if len(self.__dates) else None
+
+
+    def get_value_at(self, date: Union[str, datetime.date]) -> Union[float, None]:
+        """ 返回指定日期的收益率(可能为0),表中没有该日期返回None """
+
+        target = self.__to_datetime64(date)
+        with self.__lock:
+            position = np.searchsorted(self.__dates, target)
+            if position < len(self.__dates) and self.__dates[position] == target:
+                return float(self.__values[position])
+
+        return None
+
+
+    def get_value_asof(self, date: Union[str, datetime.date], max_days: Union[int, None] = None) -> float:
+        """
+        返回date当日或之前最近的非0收益率.
+
+        :param date: yyyy-mm-dd型字符串或date.
+        :param max_days: 最多向前查找的天数,为None时不限制.
+        :return: 收益率,找不到返回0.00,与calculate_stock_mos原有的约定一致.
+        """
+
+        target = self.__to_datetime64(date)
+        with self.__lock:
+            position = np.searchsorted(self.__nonzero_dates, target, side='right') - 1
+            if position < 0:
+                return 0.00
+            if max_days is not None and (target - self.__nonzero_dates[position]).astype(int) > max_days:
+                return 0.00
+            return float(self.__nonzero_values[position])
+
+
+    def asof_join(self, dates, max_days: Union[int, None] = None) -> np.ndarray:
+        """
+        向量化的as-of连接:为dates中的每个日期返回当日或之前最近的非0收益率.
+
+        :param dates: 日期序列,可以是yyyy-mm-dd字符串列表、pandas日期列或numpy日期数组,无需排序.
+        :param max_days: 最多向前查找的天数,为None时不限制.
+        :return: 与dates等长的float64数组,找不到的位置为0.00.
+        """
+
+        targets = pd.to_datetime(pd.Series(dates)).to_numpy().astype('datetime64[D]')
+        with self.__lock:
+            positions = np.searchsorted(self.__nonzero_dates, targets, side='right') - 1
+            found = positions >= 0
+            safe = np.where(found, positions, 0)
+            if len(self.__nonzero_values) == 0:
+                return np.zeros(len(targets))
+            result = np.where(found, self.__nonzero_values[safe], 0.00)
+            if max_days is not None:
+                gaps = (targets - self.__nonzero_dates[safe]).astype(int)
+                result = np.where(gaps > max_days, 0.00, result)
+
+        return result
+
+
+_shared_curve: Union[YieldCurve, None] = None
+_shared_lock = threading.Lock()
+
+
+def get_yield_curve() -> YieldCurve:
+    """ 返回进程内共享的YieldCurve实例,首次调用时载入数据 """
+
+    global _shared_curve
+    with _shared_lock:
+        if _shared_curve is None:
+            _shared_curve = YieldCurve()
+
+    return _shared_curve
+
+
+def refresh_yield_curve() -> None:
+    """ yield-curve表写入后调用,刷新已经载入的共享实例,尚未载入则无需处理 """
+
+    with _shared_lock:
+        curve = _shared_curve
+    if curve is not None:
+        curve.refresh()